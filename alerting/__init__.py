@@ -1,2 +1,5 @@
 from .alert_manager import AlertManager, Alert, AlertType
-from .notification import TelegramNotifier
+from .notification import TelegramNotifier, PermanentSendError
+from .dispatcher import NotificationDispatcher
+from .coalescer import AlertCoalescer, TokenBucket
+from .fanout import FanoutNotifier
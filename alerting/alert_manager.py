@@ -9,6 +9,7 @@ import logging
 from enum import Enum
 from dataclasses import dataclass
 from datetime import datetime
+from typing import Optional
 
 from config.patterns import Pattern, VIP_PATTERNS
 from core.database import Database
@@ -29,39 +30,136 @@ class Alert:
     timestamp: datetime
     details: dict
 
+    @property
+    def idempotency_key(self) -> str:
+        """Identifica la alerta de forma estable: mismo tiro + mismo evento = misma clave."""
+        return f"{self.type.value}:{self.pattern_id}:{self.details.get('spin_id')}:{self.value}"
+
+    def to_payload(self) -> dict:
+        return {
+            "type": self.type.value,
+            "pattern_id": self.pattern_id,
+            "pattern_name": self.pattern_name,
+            "value": self.value,
+            "spin_count": self.spin_count,
+            "timestamp": self.timestamp.isoformat(),
+            "details": self.details,
+        }
+
+    @classmethod
+    def from_payload(cls, payload: dict) -> "Alert":
+        return cls(
+            type=AlertType(payload["type"]),
+            pattern_id=payload["pattern_id"],
+            pattern_name=payload["pattern_name"],
+            value=payload["value"],
+            spin_count=payload["spin_count"],
+            timestamp=datetime.fromisoformat(payload["timestamp"]),
+            details=payload.get("details", {}),
+        )
+
 class AlertManager:
     """Gestor de alertas basado en SQLite."""
 
-    def __init__(self, db_path: str = "data/db.sqlite3"):
+    def __init__(self, db_path: str = "data/db.sqlite3", outbox: bool = False):
         self.db = Database(db_path)
+        # Con outbox, cada alerta se encola en alert_outbox en la misma transacción que el estado
+        self.outbox = outbox
+        # Patrones con alertas; el scheduler los sustituye al recargar el registro de patrones
+        self.vip_patterns: list[Pattern] = list(VIP_PATTERNS)
         self.state = self._load_state()
+        self._spins_by_id: dict = {}
 
     def _load_state(self) -> dict:
         """Carga la memoria de alertas enviadas desde BD."""
         return self.db.get_state("alert_manager", "main_state", {})
 
-    def _save_state(self):
-        """Guarda la memoria de alertas enviadas en BD."""
-        self.db.set_state("alert_manager", "main_state", self.state)
+    def _save_state(self, alerts: list[Alert] = (), hold_seconds: float = 0):
+        """Guarda la memoria de alertas enviadas en BD (y encola las alertas si hay outbox)."""
+        if not self.outbox:
+            self.db.set_state("alert_manager", "main_state", self.state)
+            return
+        entries = [{"idempotency_key": a.idempotency_key, "kind": a.type.value, "payload": a.to_payload()}
+                   for a in alerts]
+        self.db.set_state_with_outbox("alert_manager", "main_state", self.state, entries, hold_seconds)
 
-    def check_all_patterns(self) -> list[Alert]:
-        """Revisa todos los patrones VIP y genera alertas si corresponde."""
-        all_alerts = []
-        current_max_id = self.db.get_max_id()
+    def check_all_patterns(self, tracker_states: Optional[dict] = None,
+                           spins_by_id: Optional[dict] = None,
+                           current_max_id: Optional[int] = None,
+                           occurrences: Optional[list[dict]] = None,
+                           hold_seconds: float = 0) -> list[Alert]:
+        """
+        Revisa todos los patrones VIP y genera alertas si corresponde.
+
+        La evaluación es por tiro: cada aparición VIP del lote (`occurrences`,
+        en orden) se evalúa como un hit con su propia distancia (umbrales de la
+        racha cerrada + salida) y al final se evalúa la racha abierta del
+        tracker. Así dos salidas en el mismo lote, o un umbral cruzado y una
+        salida, generan sus alertas exactas. El estado se guarda una vez.
+
+        Args:
+            tracker_states: Estado en memoria del tracker por patrón (evita releer system_state)
+            spins_by_id: Tiros ya cargados en memoria, indexados por ID
+            current_max_id: Último ID conocido (evita MAX(id))
+            occurrences: Apariciones del lote según el tracker [{"pattern_id", "spin", "distance"}]
+            hold_seconds: Con outbox, retrasa la entrega de las alertas encoladas
+        """
+        if current_max_id is None:
+            current_max_id = self.db.get_max_id()
         if not current_max_id:
             return []
 
-        for pattern in VIP_PATTERNS:
-            # Leer estado del pattern_tracker desde BD
-            tracker_data = self.db.get_state("pattern_tracker", pattern.id,
-                                           {"last_id": None, "last_distance": 0, "prev_distance": 0})
-
+        vip_by_id = {p.id: p for p in self.vip_patterns}
+        events = [(vip_by_id[occ["pattern_id"]], {
+            "last_id": occ["spin"]["id"], "last_distance": 0, "prev_distance": occ["distance"]
+        }) for occ in occurrences or [] if occ["pattern_id"] in vip_by_id]
+        for pattern in self.vip_patterns:
+            if tracker_states is not None and pattern.id in tracker_states:
+                tracker_data = tracker_states[pattern.id]
+            else:
+                # Leer estado del pattern_tracker desde BD
+                tracker_data = self.db.get_state("pattern_tracker", pattern.id,
+                                               {"last_id": None, "last_distance": 0, "prev_distance": 0})
             if tracker_data["last_id"]:
-                alerts = self.check_pattern(pattern, current_max_id, tracker_data)
-                all_alerts.extend(alerts)
+                events.append((pattern, tracker_data))
+
+        self._spins_by_id = self._prefetch_spins(events, spins_by_id or {})
+        alerts = []
+        for pattern, tracker_data in events:
+            alerts.extend(self.check_pattern(pattern, current_max_id, tracker_data))
+        self._save_state(alerts, hold_seconds)
+        return alerts
+
+    def replay_backlog(self, occurrences: list[dict], tracker_states: dict,
+                       spins_by_id: dict, current_max_id: int) -> list[Alert]:
+        """Reproduce las alertas de un backlog completo (recuperación) en una sola pasada."""
+        return self.check_all_patterns(tracker_states, spins_by_id, current_max_id, occurrences)
+
+    def _prefetch_spins(self, events: list[tuple[Pattern, dict]], spins_by_id: dict) -> dict:
+        """
+        Reúne los tiros que la evaluación puede necesitar (hits y cruces de
+        umbral) y trae de la BD, en una sola consulta, los que no estén en memoria.
+        """
+        needed = set()
+        for pattern, data in events:
+            last_id = data["last_id"]
+            needed.add(last_id)
+            for threshold in pattern.warning_thresholds:
+                if data.get("prev_distance", 0) >= threshold:
+                    needed.add(last_id - data["prev_distance"] + threshold)
+                if data.get("last_distance", 0) >= threshold:
+                    needed.add(last_id + threshold)
+        missing = [spin_id for spin_id in needed if spin_id not in spins_by_id]
+        if not missing:
+            return spins_by_id
+        return {**spins_by_id, **self.db.get_spins_by_ids(missing)}
 
-        self._save_state()
-        return all_alerts
+    def _get_spin(self, spin_id: int) -> Optional[dict]:
+        """Busca el tiro en memoria (precargado por _prefetch_spins) y solo si falta consulta la BD."""
+        spin = self._spins_by_id.get(spin_id)
+        if spin is not None:
+            return spin
+        return self.db.get_spin_by_id(spin_id)
 
     def check_pattern(self, pattern: Pattern, current_max_id: int, tracker_data: dict) -> list[Alert]:
         """Revisa un patrón específico y genera alertas de umbrales y hits."""
@@ -101,7 +199,7 @@ class AlertManager:
                 threshold_spin_id = start_id + threshold
                 
                 # Buscar timestamp del tiro en BD
-                spin_data = self.db.get_spin_by_id(threshold_spin_id)
+                spin_data = self._get_spin(threshold_spin_id)
                 
                 if spin_data and spin_data.get("timestamp"):
                     try:
@@ -122,7 +220,7 @@ class AlertManager:
                     value=threshold,
                     spin_count=distance_for_thresholds,
                     timestamp=alert_time,
-                    details={}
+                    details={"spin_id": threshold_spin_id}
                 ))
                 logger.info(f"🔔 [{pattern.name}] UMBRAL {threshold} alcanzado (Distancia: {distance_for_thresholds})")
                 p_state["alerts_sent"][t_key] = True
@@ -137,7 +235,7 @@ class AlertManager:
                 
                 if prev_distance >= start_game_zone:
                     # Buscar datos del hit en BD
-                    spin_data = self.db.get_spin_by_id(tracker_last_id)
+                    spin_data = self._get_spin(tracker_last_id)
                     
                     # Extraer hora y detalles
                     if spin_data and spin_data.get("timestamp"):
@@ -149,7 +247,10 @@ class AlertManager:
                         hit_time = datetime.now()
                     
                     # Construir detalles según el patrón
-                    details = {"resultado": spin_data.get("resultado", "Unknown") if spin_data else "Unknown"}
+                    details = {
+                        "resultado": spin_data.get("resultado", "Unknown") if spin_data else "Unknown",
+                        "spin_id": tracker_last_id
+                    }
                     
                     if spin_data:
                         if pattern.id == "pachinko":
@@ -0,0 +1,75 @@
+"""
+alerting/coalescer.py - Agrupación de alertas en ráfaga y presupuesto de envío por chat.
+
+Tras una recuperación, o cuando varios patrones cruzan umbrales a la vez, las
+alertas llegan juntas al outbox. En lugar de un mensaje por alerta se agrupan
+las creadas dentro de una ventana corta (un mensaje compuesto o un álbum), y
+cada chat tiene un token bucket que respeta el límite de Telegram (~1 msg/s).
+"""
+
+import time
+import threading
+from datetime import datetime
+from typing import Optional
+
+class TokenBucket:
+    """Token bucket con deuda: `reserve()` devuelve cuántos segundos esperar antes de enviar."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: float = 1) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= tokens
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def block(self, seconds: float):
+        """Vacía el bucket para que nada salga antes de `seconds` (p.ej. tras un 429 con retry_after)."""
+        with self._lock:
+            self._tokens = min(self._tokens, -seconds * self.rate + 1)
+            self._last = time.monotonic()
+
+
+class AlertCoalescer:
+    """Agrupa entradas de alerta del outbox creadas dentro de `window_s`."""
+
+    def __init__(self, window_s: float = 5.0, max_group: int = 10):
+        self.window_s = window_s
+        # Telegram admite álbumes de hasta 10 fotos
+        self.max_group = max_group
+
+    def group(self, entries: list[dict]) -> list[list[dict]]:
+        """
+        Parte las entradas (en orden de creación) en grupos.
+
+        Solo se agrupan alertas; los mensajes de texto (p.ej. resúmenes de
+        recuperación) se envían solos y cortan el grupo en curso para
+        conservar el orden.
+        """
+        groups, current = [], []
+        group_start: Optional[datetime] = None
+        for entry in entries:
+            if "text" in entry["payload"]:
+                if current:
+                    groups.append(current)
+                    current = []
+                groups.append([entry])
+                continue
+            created = datetime.fromisoformat(entry["created_at"])
+            if current and ((created - group_start).total_seconds() > self.window_s
+                            or len(current) >= self.max_group):
+                groups.append(current)
+                current = []
+            if not current:
+                group_start = created
+            current.append(entry)
+        if current:
+            groups.append(current)
+        return groups
@@ -0,0 +1,260 @@
+"""
+alerting/dispatcher.py - Envío de notificaciones en segundo plano.
+
+El scheduler encola y sigue: un hilo dedicado entrega a Telegram, de modo que
+una API lenta (o sus reintentos) nunca alarga el ciclo ni retrasa el siguiente
+poll. La cola es acotada; si se llena se descarta lo nuevo y se contabiliza.
+
+Las alertas no pasan por la cola en memoria: se leen de la tabla alert_outbox
+(escrita junto con el estado del AlertManager) y se marcan como entregadas solo
+tras un envío exitoso, con reintentos espaciados. Entrega al-menos-una-vez.
+Un rechazo definitivo de Telegram (400/403) no se reintenta: la entrada pasa
+a 'dead' en el primer intento.
+"""
+
+import queue
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from alerting.alert_manager import Alert
+from alerting.coalescer import AlertCoalescer
+from alerting.notification import PermanentSendError
+from core.database import Database
+from core.telemetry import (ALERT_DISPATCH_SECONDS, NOTIFY_LAG_SECONDS, NOTIFY_DROPPED,
+                            NOTIFY_QUEUE_DEPTH, register_outbox_gauges)
+
+logger = logging.getLogger(__name__)
+
+_DRAIN = object()
+_POLL = object()  # Venció el sondeo sin nada en la cola
+
+class NotificationDispatcher:
+    """Cola acotada + hilo de entrega para el notificador (y drenado del outbox)."""
+
+    OUTBOX_BATCH = 20
+    OUTBOX_MAX_ATTEMPTS = 8
+    OUTBOX_BASE_BACKOFF_S = 30
+    OUTBOX_MAX_BACKOFF_S = 3600
+    OUTBOX_PRUNE_INTERVAL_S = 3600
+
+    def __init__(self, notifier, maxsize: int = 200, db: Optional[Database] = None,
+                 poll_interval: float = 5.0, coalescer: Optional[AlertCoalescer] = None):
+        self.notifier = notifier
+        self.db = db
+        # Ráfagas del outbox -> un mensaje compuesto por grupo (None = una llamada por alerta)
+        self.coalescer = coalescer
+        self.poll_interval = poll_interval
+        self._last_prune = 0.0
+        self.queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self.submitted = 0
+        self.delivered = 0
+        self.failed = 0
+        self.dropped = 0
+        self.last_lag: Optional[float] = None
+        NOTIFY_QUEUE_DEPTH.set_function(self.queue.qsize)
+        if db is not None:
+            register_outbox_gauges(db)
+
+    def start(self) -> "NotificationDispatcher":
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._worker, name="notification-dispatcher", daemon=True)
+            self._thread.start()
+        return self
+
+    # ============== API de encolado (no bloquea) ==============
+
+    def submit(self, kind: str, func: Callable, *args, **kwargs) -> bool:
+        """Encola una llamada al notificador. Devuelve False si se descartó."""
+        if self._stopping.is_set():
+            logger.warning(f"⚠️ Dispatcher detenido, notificación '{kind}' descartada")
+            return False
+        try:
+            self.queue.put_nowait((kind, func, args, kwargs, time.monotonic()))
+        except queue.Full:
+            self.dropped += 1
+            NOTIFY_DROPPED.inc(type=kind)
+            logger.error(f"❌ Cola de notificaciones llena ({self.queue.maxsize}), '{kind}' descartada")
+            return False
+        self.submitted += 1
+        return True
+
+    def submit_alert(self, alert: Alert) -> bool:
+        return self.submit(alert.type.value, self.notifier.send_alert, alert)
+
+    def submit_message(self, mensaje: str, kind: str = "message") -> bool:
+        return self.submit(kind, self.notifier.send_message, mensaje)
+
+    def wake(self):
+        """Pide al hilo que drene el outbox ya (sin esperar al siguiente sondeo)."""
+        if self.db is None:
+            return
+        try:
+            self.queue.put_nowait(_DRAIN)
+        except queue.Full:
+            pass  # El hilo está ocupado; drenará al vaciar la cola
+
+    # ============== Hilo de entrega ==============
+
+    def _worker(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=self.poll_interval if self.db is not None else None)
+            except queue.Empty:
+                item = _POLL
+            if item is _POLL:
+                self._safe_drain_outbox()
+                continue
+            if item is None:
+                self.queue.task_done()
+                return
+            if item is _DRAIN:
+                try:
+                    self._safe_drain_outbox()
+                finally:
+                    self.queue.task_done()
+                continue
+            kind, func, args, kwargs, enqueued_at = item
+            try:
+                with ALERT_DISPATCH_SECONDS.time(type=kind):
+                    ok = func(*args, **kwargs)
+                if ok is False:
+                    self.failed += 1
+                else:
+                    self.delivered += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"❌ Error entregando notificación '{kind}': {e}")
+            finally:
+                self.last_lag = time.monotonic() - enqueued_at
+                NOTIFY_LAG_SECONDS.observe(self.last_lag, type=kind)
+                self.queue.task_done()
+
+    def _safe_drain_outbox(self):
+        """Un error al drenar no puede matar el hilo: se registra y se reintenta en el siguiente sondeo."""
+        try:
+            self._drain_outbox()
+        except Exception as e:
+            logger.error(f"❌ Error drenando el outbox: {e}", exc_info=True)
+
+    def _drain_outbox(self):
+        """Entrega en lotes las entradas vencidas del outbox hasta vaciarlo."""
+        if self.db is None:
+            return
+        while True:
+            entries = self.db.fetch_due_outbox(self.OUTBOX_BATCH)
+            groups = self.coalescer.group(entries) if self.coalescer else [[e] for e in entries]
+            for group in groups:
+                self._deliver_outbox_group(group)
+            if len(entries) < self.OUTBOX_BATCH:
+                break
+        if time.monotonic() - self._last_prune > self.OUTBOX_PRUNE_INTERVAL_S:
+            self._last_prune = time.monotonic()
+            self.db.prune_outbox()
+
+    def _deliver_outbox_group(self, group: list[dict]):
+        """Entrega una entrada (o un grupo coalescido en una sola llamada) y registra el resultado."""
+        kind = group[0]["kind"] if len(group) == 1 else "alert_group"
+        error, permanent = None, False
+        try:
+            with ALERT_DISPATCH_SECONDS.time(type=kind):
+                payload = group[0]["payload"]
+                if "text" in payload:
+                    ok = self.notifier.send_message(payload["text"])
+                elif len(group) == 1:
+                    ok = self.notifier.send_alert(Alert.from_payload(payload))
+                else:
+                    ok = self.notifier.send_alert_group([Alert.from_payload(e["payload"]) for e in group])
+            if not ok:
+                error = "envío fallido tras los reintentos"
+        except PermanentSendError as e:
+            error, permanent = str(e), True
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+
+        if permanent and len(group) > 1:
+            # Un grupo rechazado se reparte: solo la entrada que lo provoca queda como 'dead'
+            logger.warning(f"⚠️ Grupo de {len(group)} alertas rechazado ({error}), se envían por separado")
+            for entry in group:
+                self._deliver_outbox_group([entry])
+            return
+        for entry in group:
+            self._record_outbox_result(entry, error, permanent)
+
+    def _record_outbox_result(self, entry: dict, error: Optional[str], permanent: bool = False):
+        kind = entry["kind"]
+        if error is None:
+            self.db.mark_outbox_delivered(entry["id"])
+            self.delivered += 1
+            lag = (datetime.now() - datetime.fromisoformat(entry["created_at"])).total_seconds()
+            self.last_lag = lag
+            NOTIFY_LAG_SECONDS.observe(lag, type=kind)
+            return
+
+        self.failed += 1
+        attempts = entry["attempts"] + 1
+        if permanent:
+            logger.error(f"❌ Outbox #{entry['id']} ({kind}) rechazado por Telegram, sin reintento: {error}")
+            self.db.mark_outbox_failed(entry["id"], error, None)
+            return
+        if attempts >= self.OUTBOX_MAX_ATTEMPTS:
+            logger.error(f"❌ Outbox #{entry['id']} ({kind}) descartado tras {attempts} intentos: {error}")
+            self.db.mark_outbox_failed(entry["id"], error, None)
+            return
+        backoff = min(self.OUTBOX_MAX_BACKOFF_S, self.OUTBOX_BASE_BACKOFF_S * 2 ** (attempts - 1))
+        next_attempt = (datetime.now() + timedelta(seconds=backoff)).isoformat()
+        logger.warning(f"⚠️ Outbox #{entry['id']} ({kind}) falló (intento {attempts}): {error}. "
+                       f"Reintento en {backoff}s")
+        self.db.mark_outbox_failed(entry["id"], error, next_attempt)
+
+    def flush(self, timeout: float = 30.0) -> bool:
+        """Espera a que la cola se vacíe. Devuelve False si venció el timeout."""
+        deadline = time.monotonic() + timeout
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.queue.all_tasks_done.wait(remaining)
+        return True
+
+    def stop(self, timeout: float = 30.0) -> bool:
+        """Deja de aceptar envíos, vacía lo pendiente y detiene el hilo."""
+        self._stopping.set()
+        if self._thread is None or not self._thread.is_alive():
+            return self.queue.empty()
+        pending = self.queue.qsize()
+        if pending:
+            logger.info(f"📬 Vaciando {pending} notificaciones pendientes...")
+        if self.db is not None:
+            # Último drenado del outbox; lo que falle queda persistido para el próximo arranque
+            try:
+                self.queue.put(_DRAIN, timeout=timeout)
+            except queue.Full:
+                pass
+        flushed = self.flush(timeout)
+        if not flushed:
+            logger.warning(f"⚠️ Timeout vaciando notificaciones: {self.queue.qsize()} sin entregar")
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            return False
+        self._thread.join(timeout=5)
+        return flushed
+
+    def stats(self) -> dict:
+        outbox = self.db.get_outbox_stats() if self.db is not None else {}
+        return {
+            "outbox_pending": outbox.get("pending", 0),
+            "depth": self.queue.qsize(),
+            "submitted": self.submitted,
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "last_lag_s": round(self.last_lag, 3) if self.last_lag is not None else None,
+        }
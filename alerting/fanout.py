@@ -0,0 +1,147 @@
+"""
+alerting/fanout.py - Reparto de alertas a múltiples suscriptores.
+
+Cada suscriptor (tabla subscribers) elige patrones y tipos de alerta. Cada
+contenido distinto se renderiza una sola vez y se entrega a todos sus chats
+en paralelo sobre el loop del notificador, con un semáforo que acota los
+envíos en vuelo y el token bucket por chat del propio notificador.
+
+Los chats ya servidos de cada alerta se guardan en system_state (módulo
+"fanout"), así un reintento del outbox, incluso tras reiniciar, no repite
+envíos. Un rechazo definitivo de Telegram a un suscriptor no se reintenta, y si
+el chat ya no admite envíos (bloqueó al bot, chat inexistente) se desactiva.
+"""
+
+import time
+import asyncio
+import logging
+
+from alerting.alert_manager import Alert
+from alerting.notification import PermanentSendError, TelegramNotifier
+from core.database import Database
+
+logger = logging.getLogger(__name__)
+
+class FanoutNotifier:
+    """
+    Envoltorio de TelegramNotifier con la misma interfaz para el dispatcher.
+
+    Las alertas van al chat principal (TELEGRAM_CHAT_ID, recibe todo) y a cada
+    suscriptor activo cuyo filtro las incluya. El resto de mensajes del sistema
+    (resúmenes, errores, arranque) solo van al chat principal.
+
+    El envío cuenta como entregado cuando lo recibe el chat principal: un fallo
+    transitorio de un suscriptor se registra pero no reabre la entrada del outbox.
+    """
+
+    def __init__(self, notifier: TelegramNotifier, db: Database, max_parallel: int = 16,
+                 refresh_s: float = 60.0):
+        self.notifier = notifier
+        self.db = db
+        self.max_parallel = max_parallel
+        self.refresh_s = refresh_s
+        self._subscribers: list[dict] = []
+        self._loaded_at = 0.0
+
+    def __getattr__(self, name):
+        # send_message, enviar_resumen_diario, close, ... -> chat principal
+        return getattr(self.notifier, name)
+
+    # ============== Suscriptores ==============
+
+    def subscribers(self) -> list[dict]:
+        if time.monotonic() - self._loaded_at > self.refresh_s:
+            self._subscribers = self.db.get_subscribers()
+            self._loaded_at = time.monotonic()
+        return self._subscribers
+
+    @staticmethod
+    def _matches(sub: dict, alert: Alert) -> bool:
+        return ((sub["patterns"] is None or alert.pattern_id in sub["patterns"]) and
+                (sub["alert_types"] is None or alert.type.value in sub["alert_types"]))
+
+    def recipients(self, alerts: list[Alert]) -> dict[str, list[Alert]]:
+        """chat_id -> alertas que le corresponden (en orden), sin las ya entregadas."""
+        by_chat = {str(self.notifier.chat_id): list(alerts)}
+        for sub in self.subscribers():
+            chat = str(sub["chat_id"])
+            if chat not in by_chat:
+                by_chat[chat] = [a for a in alerts if self._matches(sub, a)]
+        delivered = self.db.get_fanout_deliveries([a.idempotency_key for a in alerts])
+        for chat in list(by_chat):
+            pending = [a for a in by_chat[chat] if chat not in delivered.get(a.idempotency_key, ())]
+            if pending:
+                by_chat[chat] = pending
+            else:
+                del by_chat[chat]
+        return by_chat
+
+    # ============== Envío ==============
+
+    def send_alert(self, alert: Alert) -> bool:
+        return self.send_alert_group([alert])
+
+    def send_alert_group(self, alerts: list[Alert]) -> bool:
+        """
+        Renderiza cada subconjunto distinto una vez y lo entrega a sus chats en paralelo.
+
+        Devuelve True si el chat principal tiene el grupo (ahora o en un intento previo)
+        y propaga PermanentSendError si Telegram lo rechazó de forma definitiva.
+        """
+        main_chat = str(self.notifier.chat_id)
+        by_chat = self.recipients(alerts)
+        rendered, jobs = {}, []
+        for chat, subset in by_chat.items():
+            key = tuple(a.idempotency_key for a in subset)
+            if key not in rendered:
+                rendered[key] = self.notifier.render_alert_group(subset)
+            jobs.append((chat, key))
+        if not jobs:
+            return True
+
+        future = self.notifier.submit_coroutine(self._deliver(jobs, rendered))
+        try:
+            results = future.result(timeout=self.notifier.SEND_TIMEOUT)
+        except Exception as e:
+            future.cancel()
+            logger.error(f"❌ Fan-out de {len(alerts)} alertas sin completar: {type(e).__name__}: {e}")
+            return False
+
+        # Resultado por chat: True (entregado), False (fallo transitorio) o PermanentSendError
+        delivered, outcomes = {}, {}
+        for (chat, key), result in zip(jobs, results):
+            outcomes[chat] = result
+            if result is True:
+                for alert_key in key:
+                    delivered.setdefault(alert_key, set()).add(chat)
+            elif isinstance(result, PermanentSendError) and result.chat_unreachable and chat != main_chat:
+                self._deactivate(chat)
+        self.db.add_fanout_deliveries(delivered)
+
+        failed = sum(1 for r in outcomes.values() if r is not True)
+        if len(jobs) > 1:
+            logger.info(f"📣 Fan-out: {len(alerts)} alertas -> {len(jobs) - failed}/{len(jobs)} chats "
+                        f"({len(rendered)} contenidos distintos)")
+        main_result = outcomes.get(main_chat, True)
+        if isinstance(main_result, PermanentSendError):
+            raise main_result
+        return main_result
+
+    def _deactivate(self, chat: str):
+        """El chat ya no admite envíos (403 bloqueado, 400 chat inexistente): se da de baja."""
+        logger.warning(f"🚫 Suscriptor {chat} rechaza los envíos, se desactiva")
+        self.db.deactivate_subscriber(chat)
+        self._subscribers = [s for s in self._subscribers if str(s["chat_id"]) != chat]
+
+    async def _deliver(self, jobs: list[tuple[str, tuple]], rendered: dict) -> list:
+        semaphore = asyncio.Semaphore(self.max_parallel)
+
+        async def deliver_one(chat: str, key: tuple):
+            mensaje, imagen, imagenes = rendered[key]
+            async with semaphore:
+                try:
+                    return await self.notifier._send_message_async(mensaje, "HTML", imagen, imagenes, chat)
+                except PermanentSendError as e:
+                    return e
+
+        return await asyncio.gather(*(deliver_one(chat, key) for chat, key in jobs))
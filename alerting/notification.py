@@ -3,32 +3,123 @@ alerting/notification.py - Notificador de Telegram con soporte de imágenes.
 """
 
 import os
+import hashlib
 import logging
 import asyncio
+import threading
+import warnings
+from concurrent.futures import Future
+from contextlib import ExitStack
 from datetime import datetime, timedelta
 from typing import Optional
 
-from telegram import Bot
-from telegram.error import TelegramError
+from telegram import Bot, InputMediaPhoto
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
 from telegram.request import HTTPXRequest
 
 from alerting.alert_manager import Alert, AlertType
+from alerting.coalescer import TokenBucket
 from config.patterns import get_pattern_image, get_window_range
+from core.database import Database
+from core.telemetry import NOTIFY_RETRIES
 
 logger = logging.getLogger(__name__)
 
-class TelegramNotifier:
-    """Notificador de Telegram con soporte de imágenes y reintentos."""
+class PermanentSendError(Exception):
+    """Telegram rechazó el envío de forma definitiva (400/403): reintentarlo no cambia el resultado."""
+
+    def __init__(self, message: str, chat_unreachable: bool = False):
+        super().__init__(message)
+        # El chat no admite envíos (bloqueó al bot, no existe), no solo este mensaje
+        self.chat_unreachable = chat_unreachable
 
-    def __init__(self, token: str, chat_id: str, assets_dir: str = "assets"):
+class TelegramNotifier:
+    """
+    Notificador de Telegram con soporte de imágenes y reintentos.
+
+    El bot vive en un event loop propio (hilo dedicado) con un pool HTTPX
+    inicializado una sola vez; las llamadas síncronas se encolan en ese loop
+    con `submit_message` y esperan su resultado.
+
+    Las imágenes de `assets/` se suben una sola vez: el file_id que devuelve
+    Telegram se guarda en system_state (módulo "notifier", clave por hash del
+    archivo) y los envíos siguientes lo referencian en lugar de re-subir.
+    """
+
+    SEND_TIMEOUT = 180  # Cubre los 3 intentos con timeouts de 30s, sus esperas y MAX_FLOOD_WAIT_S
+    CAPTION_LIMIT = 1024  # Límite de Telegram para captions de foto/álbum
+    MAX_FLOOD_WAIT_S = 60  # Espera máxima acumulada por 429; más allá decide el backoff del outbox
+
+    def __init__(self, token: str, chat_id: str, assets_dir: str = "assets",
+                 base_url: Optional[str] = None, pool_size: int = 8, db: Optional[Database] = None,
+                 chat_rate: Optional[float] = 1.0, chat_burst: int = 3,
+                 global_rate: Optional[float] = 30.0):
         self.token = token
         self.chat_id = chat_id
         # Configurar timeouts robustos (30s) para evitar ReadError
-        request = HTTPXRequest(connect_timeout=30, read_timeout=30)
-        self.bot = Bot(token=self.token, request=request)
+        request = HTTPXRequest(connect_timeout=30, read_timeout=30, connection_pool_size=pool_size)
+        # TELEGRAM_API_URL permite apuntar a un stand-in local (simulation/telegram_server.py)
+        base_url = (base_url or os.getenv("TELEGRAM_API_URL") or "").rstrip("/")
+        urls = {"base_url": f"{base_url}/bot", "base_file_url": f"{base_url}/file/bot"} if base_url else {}
+        self.bot = Bot(token=self.token, request=request, **urls)
         self.assets_dir = assets_dir
+        self.db = db
+        self._file_hashes: dict = {}  # ruta -> (mtime, tamaño, sha256)
+        self._file_ids: dict = {}     # sha256 -> file_id
+        self._upload_locks: dict = {} # sha256 -> asyncio.Lock (una sola subida concurrente por archivo)
+        # Presupuesto por chat (Telegram recomienda ~1 msg/s por chat) y global del bot
+        # (~30 msg/s en difusión); None = sin límite
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self._buckets: dict = {}
+        self._global_bucket = TokenBucket(global_rate, global_rate) if global_rate else None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._loop_lock = threading.Lock()
         logger.info("✅ Bot de Telegram inicializado con timeouts robustos")
 
+    # ============== Event loop persistente ==============
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        """Arranca (una vez) el hilo con el event loop del bot e inicializa su cliente HTTP."""
+        with self._loop_lock:
+            if self._loop is not None and self._thread.is_alive():
+                return self._loop
+            loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=loop.run_forever, name="telegram-loop", daemon=True)
+            self._thread.start()
+            self._loop = loop
+            try:
+                asyncio.run_coroutine_threadsafe(self.bot.initialize(), loop).result(timeout=60)
+            except Exception as e:
+                # Sin getMe el bot sigue pudiendo enviar; se reintentará en el próximo arranque
+                logger.warning(f"⚠️ No se pudo inicializar el bot (se continúa): {e}")
+            return loop
+
+    def submit_message(self, mensaje: str, imagen_path: str = None, parse_mode: str = "HTML",
+                       imagenes: Optional[list[str]] = None, chat_id: Optional[str] = None) -> Future:
+        """Encola el envío en el loop del bot sin bloquear; devuelve un Future con el resultado."""
+        return self.submit_coroutine(self._send_message_async(mensaje, parse_mode, imagen_path, imagenes, chat_id))
+
+    def submit_coroutine(self, coro) -> Future:
+        """Ejecuta una corrutina en el loop del bot (p.ej. un fan-out con varios envíos)."""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    def close(self, timeout: float = 10):
+        """Cierra el cliente HTTP del bot y detiene su event loop."""
+        with self._loop_lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self.bot.shutdown(), loop).result(timeout=timeout)
+        except Exception as e:
+            logger.warning(f"⚠️ Error cerrando el bot: {e}")
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=timeout)
+        loop.close()
+
     def send_alert(self, alert: Alert) -> bool:
         if alert.type == AlertType.THRESHOLD_REACHED:
             return self.send_threshold_alert(alert)
@@ -48,7 +139,60 @@ class TelegramNotifier:
             return full_path
         return None
 
+    def render_alert(self, alert: Alert) -> tuple[str, Optional[str]]:
+        """Texto HTML e imagen de una alerta individual."""
+        if alert.type == AlertType.THRESHOLD_REACHED:
+            return self._render_threshold_alert(alert)
+        return self._render_hit_alert(alert)
+
+    def send_alert_group(self, alerts: list[Alert]) -> bool:
+        """Envía varias alertas en una sola llamada a Telegram."""
+        mensaje, imagen, imagenes = self.render_alert_group(alerts)
+        return self.send_message(mensaje, imagen_path=imagen, imagenes=imagenes)
+
+    def render_alert_group(self, alerts: list[Alert]) -> tuple[str, Optional[str], Optional[list[str]]]:
+        """
+        (texto, imagen, álbum) de un grupo de alertas.
+
+        Una línea compacta por alerta; si llevan imágenes distintas se usa un
+        álbum con el texto como caption, si comparten imagen una sola foto. Si el
+        texto no cabe en un caption se envía como mensaje sin imagen.
+        """
+        if len(alerts) == 1:
+            mensaje, imagen = self.render_alert(alerts[0])
+            return mensaje, imagen, None
+        mensaje = f"📦 <b>{len(alerts)} ALERTAS</b>\n\n" + "\n".join(self._render_alert_line(a) for a in alerts)
+        imagenes = list(dict.fromkeys(
+            img for img in (self._get_image_path(a.pattern_id) for a in alerts) if img
+        ))
+        if len(mensaje) > self.CAPTION_LIMIT or not imagenes:
+            return mensaje, None, None
+        if len(imagenes) == 1:
+            return mensaje, imagenes[0], None
+        return mensaje, None, imagenes
+
+    def _render_alert_line(self, alert: Alert) -> str:
+        hora = alert.timestamp.strftime("%H:%M:%S")
+        if alert.type == AlertType.THRESHOLD_REACHED:
+            return f"🟡 <b>{alert.pattern_name}</b> • umbral {alert.value} alcanzado • 🕐 {hora}"
+        details = alert.details
+        linea = f"🎉 <b>{alert.pattern_name}</b> • salió a {alert.spin_count} tiros"
+        if alert.pattern_id == "pachinko" and details.get("bonus_multiplier"):
+            linea += f" • 💰 {details['bonus_multiplier']}x"
+        elif alert.pattern_id == "crazytime":
+            linea += (f" • 🔵{details.get('flapper_blue', '?')}x 🟢{details.get('flapper_green', '?')}x "
+                      f"🟡{details.get('flapper_yellow', '?')}x")
+        if details.get("top_slot_matched"):
+            linea += f" • 🎁 x{details.get('top_slot_multiplier', 1)}"
+        return f"{linea} • 🕐 {hora}"
+
     def send_threshold_alert(self, alert: Alert) -> bool:
+        return self.send_message(*self._render_threshold_alert(alert))
+
+    def send_hit_alert(self, alert: Alert) -> bool:
+        return self.send_message(*self._render_hit_alert(alert))
+
+    def _render_threshold_alert(self, alert: Alert) -> tuple[str, Optional[str]]:
         hora = alert.timestamp.strftime("%H:%M:%S")
         mensaje = f"""🟡🎰 <b>¡{alert.pattern_name.upper()} ENTRANDO EN CALOR!</b>
 
@@ -61,9 +205,9 @@ Aún no es apuesta — la oportunidad se acerca.
 🕐 <b>{hora}</b>
 """
         imagen = self._get_image_path(alert.pattern_id)
-        return self.send_message(mensaje.strip(), imagen_path=imagen)
+        return mensaje.strip(), imagen
 
-    def send_hit_alert(self, alert: Alert) -> bool:
+    def _render_hit_alert(self, alert: Alert) -> tuple[str, Optional[str]]:
         details = alert.details
         hora_juego = details.get("timestamp", "")
         if "T" in hora_juego:
@@ -105,54 +249,187 @@ Aún no es apuesta — la oportunidad se acerca.
         mensaje += f"\n🕐 <b>Hora:</b> {hora_juego}"
         
         imagen = self._get_image_path(alert.pattern_id)
-        return self.send_message(mensaje.strip(), imagen_path=imagen)
+        return mensaje.strip(), imagen
 
-    def send_message(self, mensaje: str, imagen_path: str = None, parse_mode: str = "HTML") -> bool:
+    def send_message(self, mensaje: str, imagen_path: str = None, parse_mode: str = "HTML",
+                     imagenes: Optional[list[str]] = None) -> bool:
+        """False si el envío falló tras los reintentos; un rechazo definitivo se propaga (PermanentSendError)."""
         try:
-            try:
-                loop = asyncio.get_event_loop()
-                if loop.is_closed():
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-            except RuntimeError:
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-            result = loop.run_until_complete(self._send_message_async(mensaje, parse_mode, imagen_path))
-            return result
+            return self.submit_message(mensaje, imagen_path, parse_mode, imagenes).result(timeout=self.SEND_TIMEOUT)
+        except PermanentSendError:
+            raise
         except Exception as e:
             logger.error(f"❌ Error en wrapper síncrono: {e}")
             return False
 
-    async def _send_message_async(self, mensaje: str, parse_mode: str, imagen_path: str = None) -> bool:
+    # ============== Caché de file_id ==============
+
+    def _file_hash(self, path: str) -> str:
+        """SHA-256 del archivo, recalculado solo si cambia su mtime o tamaño."""
+        st = os.stat(path)
+        cached = self._file_hashes.get(path)
+        if cached and cached[:2] == (st.st_mtime, st.st_size):
+            return cached[2]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        self._file_hashes[path] = (st.st_mtime, st.st_size, digest)
+        return digest
+
+    def _get_file_id(self, digest: str) -> Optional[str]:
+        if digest not in self._file_ids and self.db is not None:
+            self._file_ids[digest] = self.db.get_state("notifier", f"file_id:{digest}")
+        return self._file_ids.get(digest)
+
+    def _set_file_id(self, digest: str, file_id: Optional[str]):
+        self._file_ids[digest] = file_id
+        if self.db is not None:
+            self.db.set_state("notifier", f"file_id:{digest}", file_id)
+
+    async def _send_photo(self, imagen_path: str, mensaje: str, parse_mode: str, chat_id: str):
+        """Envía la foto por file_id si ya se subió; si el id dejó de ser válido, re-sube."""
+        digest = self._file_hash(imagen_path)
+        if not self._get_file_id(digest):
+            # Envíos concurrentes de la misma imagen esperan a la primera subida
+            lock = self._upload_locks.setdefault(digest, asyncio.Lock())
+            async with lock:
+                if not self._get_file_id(digest):
+                    await self._upload_photo(imagen_path, digest, mensaje, parse_mode, chat_id)
+                    return
+
+        try:
+            await self.bot.send_photo(chat_id=chat_id, photo=self._get_file_id(digest),
+                                      caption=mensaje, parse_mode=parse_mode)
+            logger.info(f"📤 Foto enviada a Telegram (file_id en caché): {imagen_path}")
+        except BadRequest as e:
+            logger.warning(f"⚠️ file_id inválido para {imagen_path} ({e}), se vuelve a subir")
+            self._set_file_id(digest, None)
+            await self._upload_photo(imagen_path, digest, mensaje, parse_mode, chat_id)
+
+    async def _upload_photo(self, imagen_path: str, digest: str, mensaje: str, parse_mode: str, chat_id: str):
+        with open(imagen_path, "rb") as f:
+            message = await self.bot.send_photo(
+                chat_id=chat_id,
+                photo=f,
+                caption=mensaje,
+                parse_mode=parse_mode
+            )
+        if message and message.photo:
+            # La última variante es la de mayor resolución
+            self._set_file_id(digest, message.photo[-1].file_id)
+        logger.info(f"📤 Foto enviada a Telegram: {imagen_path}")
+
+    async def _send_media_group(self, imagenes: list[str], mensaje: str, parse_mode: str, chat_id: str):
+        """Álbum con caption en la primera foto; usa file_id en caché y re-sube si alguno caducó."""
+        digests = [self._file_hash(path) for path in imagenes]
+        use_cache = True
+        while True:
+            with ExitStack() as stack:
+                media = []
+                for i, (path, digest) in enumerate(zip(imagenes, digests)):
+                    source = (self._get_file_id(digest) if use_cache else None) or \
+                        stack.enter_context(open(path, "rb"))
+                    media.append(InputMediaPhoto(
+                        media=source,
+                        caption=mensaje if i == 0 else None,
+                        parse_mode=parse_mode if i == 0 else None
+                    ))
+                try:
+                    messages = await self.bot.send_media_group(chat_id=chat_id, media=media)
+                    break
+                except BadRequest as e:
+                    if not use_cache or not any(self._get_file_id(d) for d in digests):
+                        raise
+                    logger.warning(f"⚠️ file_id inválido en álbum ({e}), se vuelven a subir las fotos")
+                    for digest in digests:
+                        self._set_file_id(digest, None)
+                    use_cache = False
+        for digest, message in zip(digests, messages):
+            if message.photo and not self._get_file_id(digest):
+                self._set_file_id(digest, message.photo[-1].file_id)
+        logger.info(f"📤 Álbum de {len(imagenes)} fotos enviado a Telegram")
+
+    def _chat_bucket(self, chat_id: str) -> Optional[TokenBucket]:
+        if not self.chat_rate:
+            return None
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    async def _throttle(self, chat_id: str):
+        """Espera lo necesario para respetar el presupuesto del chat y el global del bot."""
+        bucket = self._chat_bucket(chat_id)
+        wait = bucket.reserve() if bucket is not None else 0.0
+        if self._global_bucket is not None:
+            wait = max(wait, self._global_bucket.reserve())
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    @staticmethod
+    def _retry_after_seconds(error: RetryAfter) -> float:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")  # PTB 22 avisa de que retry_after pasará a timedelta
+            delay = error.retry_after
+        return delay.total_seconds() if isinstance(delay, timedelta) else float(delay)
+
+    async def _send_message_async(self, mensaje: str, parse_mode: str, imagen_path: str = None,
+                                  imagenes: Optional[list[str]] = None, chat_id: Optional[str] = None) -> bool:
+        """
+        Envía con reintentos. Un 429 espera exactamente el retry_after indicado
+        (sin consumir intentos, hasta MAX_FLOOD_WAIT_S) y frena al resto de envíos
+        al mismo chat; los errores permanentes (400/403) no se reintentan y se
+        propagan como PermanentSendError.
+        """
+        chat_id = chat_id or self.chat_id
         max_retries = 3
-        for attempt in range(max_retries):
+        attempt = 0
+        flood_waited = 0.0
+        while True:
             try:
-                if imagen_path and os.path.exists(imagen_path):
-                    with open(imagen_path, "rb") as f:
-                        await self.bot.send_photo(
-                            chat_id=self.chat_id,
-                            photo=f,
-                            caption=mensaje,
-                            parse_mode=parse_mode
-                        )
-                    logger.info(f"📤 Foto enviada a Telegram: {imagen_path}")
+                await self._throttle(chat_id)
+                if imagenes:
+                    await self._send_media_group(imagenes, mensaje, parse_mode, chat_id)
+                elif imagen_path and os.path.exists(imagen_path):
+                    await self._send_photo(imagen_path, mensaje, parse_mode, chat_id)
                 else:
                     await self.bot.send_message(
-                        chat_id=self.chat_id,
+                        chat_id=chat_id,
                         text=mensaje,
                         parse_mode=parse_mode
                     )
                     logger.info(f"📤 Mensaje enviado a Telegram")
                 return True
+            except RetryAfter as e:
+                delay = self._retry_after_seconds(e)
+                if flood_waited + delay > self.MAX_FLOOD_WAIT_S:
+                    logger.error(f"❌ Flood control de Telegram en chat {chat_id}: retry_after={delay:.0f}s "
+                                 f"tras {flood_waited:.0f}s de espera, se abandona el envío")
+                    return False
+                flood_waited += delay
+                NOTIFY_RETRIES.inc(reason="flood")
+                logger.warning(f"⏳ Flood control de Telegram en chat {chat_id}: reintento en {delay:.0f}s")
+                bucket = self._chat_bucket(chat_id)
+                if bucket is not None:
+                    bucket.block(delay)  # _throttle espera; también frena los envíos concurrentes al chat
+                else:
+                    await asyncio.sleep(delay)
+            except (BadRequest, Forbidden) as e:
+                logger.error(f"❌ Telegram rechazó el envío a {chat_id} (sin reintento): {e}")
+                unreachable = isinstance(e, Forbidden) or "chat not found" in str(e).lower()
+                raise PermanentSendError(str(e), unreachable) from e
             except Exception as e:
-                wait_time = (attempt + 1) * 2
-                if attempt < max_retries - 1:
-                    logger.warning(f"⚠️ Intento {attempt + 1} fallido: {e}. Reintentando en {wait_time}s...")
+                attempt += 1
+                wait_time = attempt * 2
+                if attempt < max_retries:
+                    NOTIFY_RETRIES.inc(reason="error")
+                    logger.warning(f"⚠️ Intento {attempt} fallido: {e}. Reintentando en {wait_time}s...")
                     await asyncio.sleep(wait_time)
                 else:
                     logger.error(f"❌ Error final de Telegram tras {max_retries} intentos: {e}")
                     return False
-        return False
 
     def enviar_resumen_diario(self, data: dict) -> bool:
         try:
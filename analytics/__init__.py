@@ -1,2 +1,3 @@
 from .pattern_tracker import PatternTracker
 from .window_analyzer import WindowAnalyzer
+from .pattern_matcher import PatternMatcher
@@ -0,0 +1,364 @@
+"""
+analytics/analysis_executor.py - Análisis en paralelo fuera del hilo de recolección.
+
+Los tiros se vuelcan a un fichero binario por columna en
+data/cache/spin_arrays, añadiendo al final solo los tiros nuevos; los
+workers de un pool de procesos los abren con mmap en solo lectura, así que
+todos comparten las mismas páginas del sistema operativo en vez de copiar
+el historial o consultar SQLite.
+
+El trabajo se reparte por tarea (patrón × periodo) y los resultados se
+combinan en el orden de las tareas, no en el de finalización: el resultado
+es el mismo con 1 o N workers.
+
+El scheduler encola los análisis con `submit()`: corren en un hilo aparte
+(uno a la vez, y un trabajo del mismo nombre no se encola dos veces), así
+que el análisis nunca retrasa el siguiente sondeo de la API.
+"""
+
+import os
+import logging
+import operator
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Iterable, Optional
+
+from analytics.bootstrap import attach_confidence_intervals
+from analytics.pattern_matcher import pattern_symbols
+from analytics.payouts import calculate_payout
+from analytics.pattern_registry import pattern_from_dict, pattern_to_dict
+from analytics.predicates import predicate_columns
+from analytics.tracker_rebuild import find_occurrences
+from analytics.window_analyzer import WindowAnalyzer
+from config.patterns import Pattern, get_window_range
+from core.database import Database
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+logger = logging.getLogger(__name__)
+
+# Columnas volcadas: texto -> códigos int16 (alfabeto propio, -1 = NULL), numéricas -> float con NaN para NULL
+TEXT_COLUMNS = ("resultado", "top_slot_result")
+NUMERIC_COLUMNS = ("top_slot_multiplier", "is_top_slot_matched", "bonus_multiplier",
+                   "ct_flapper_blue", "ct_flapper_green", "ct_flapper_yellow", "latido")
+DETAIL_COLUMNS = ("bonus_multiplier", "top_slot_multiplier", "is_top_slot_matched",
+                  "ct_flapper_blue", "ct_flapper_green", "ct_flapper_yellow")
+# dtype de cada fichero de columna; "id" va al final porque se escribe el último
+COLUMN_DTYPES = {"timestamp": "datetime64[s]", **{c: "int16" for c in TEXT_COLUMNS},
+                 **{c: "float64" for c in NUMERIC_COLUMNS}, "id": "int64"}
+
+# ============== Volcado de arrays ==============
+
+def _array_path(directory: str, name: str) -> str:
+    return os.path.join(directory, f"{name}.npy")
+
+def _column_path(directory: str, name: str) -> str:
+    return os.path.join(directory, f"{name}.bin")
+
+def _save_array(directory: str, name: str, array):
+    """Escritura atómica: los lectores ven el array anterior o el nuevo, nunca uno a medias."""
+    tmp = _array_path(directory, f"{name}.tmp")
+    with open(tmp, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp, _array_path(directory, name))
+
+def _trim_column(directory: str, name: str, size: int):
+    """
+    Deja la columna en sus primeros `size` bytes sin truncar el fichero en sitio:
+    un worker que la tenga mapeada sigue leyendo el fichero anterior (truncarlo
+    bajo su mmap acabaría en SIGBUS).
+    """
+    tmp = _column_path(directory, f"{name}.tmp")
+    with open(_column_path(directory, name), "rb") as src, open(tmp, "wb") as dst:
+        dst.write(src.read(size))
+    os.replace(tmp, _column_path(directory, name))
+
+def _column_rows(directory: str, name: str) -> int:
+    return os.path.getsize(_column_path(directory, name)) // np.dtype(COLUMN_DTYPES[name]).itemsize
+
+def _open_column(directory: str, name: str, rows: int):
+    """Primeras `rows` filas de una columna, mapeadas en memoria en solo lectura."""
+    dtype = np.dtype(COLUMN_DTYPES[name])
+    if rows == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(_column_path(directory, name), dtype=dtype, mode="r", shape=(rows,))
+
+def _committed_rows(directory: str) -> Optional[int]:
+    """
+    Filas confirmadas del volcado (las de id.bin), o None si hay que volcar de cero.
+
+    Un volcado interrumpido deja columnas con filas de más (se recortan); si
+    falta alguna columna o alguna tiene menos filas que id.bin, no es fiable.
+    """
+    names = list(COLUMN_DTYPES) + [f"{c}_alphabet" for c in TEXT_COLUMNS]
+    paths = [_column_path(directory, n) if n in COLUMN_DTYPES else _array_path(directory, n) for n in names]
+    if not all(os.path.exists(p) for p in paths):
+        return None
+    rows = _column_rows(directory, "id")
+    for name, dtype in COLUMN_DTYPES.items():
+        n = _column_rows(directory, name)
+        if n < rows:
+            logger.warning(f"⚠️ Columna '{name}' con {n} filas de {rows}: se vuelcan de nuevo los arrays")
+            return None
+        size = rows * np.dtype(dtype).itemsize
+        if os.path.getsize(_column_path(directory, name)) != size:
+            _trim_column(directory, name, size)
+    return rows
+
+def _chunk_arrays(chunk: list[dict], alphabets: dict, codes: dict) -> dict:
+    """Convierte un bloque de tiros en un array por columna (amplía los alfabetos si hace falta)."""
+    arrays = {
+        "id": np.fromiter((spin["id"] for spin in chunk), dtype=np.int64, count=len(chunk)),
+        "timestamp": np.asarray([spin["timestamp"] for spin in chunk], dtype="datetime64[s]"),
+    }
+    for c in TEXT_COLUMNS:
+        values = np.empty(len(chunk), dtype=np.int16)
+        for i, spin in enumerate(chunk):
+            value = spin[c]
+            if value is None:
+                values[i] = -1
+                continue
+            if value not in codes[c]:
+                codes[c][value] = len(alphabets[c])
+                alphabets[c].append(value)
+            values[i] = codes[c][value]
+        arrays[c] = values
+    for c in NUMERIC_COLUMNS:
+        arrays[c] = np.fromiter((np.nan if spin[c] is None else float(spin[c]) for spin in chunk),
+                                dtype=np.float64, count=len(chunk))
+    return arrays
+
+def export_spin_arrays(db: Database, directory: str) -> int:
+    """
+    Añade a las columnas los tiros nuevos desde el último volcado (o las crea).
+
+    Cada bloque de `iter_spins` se convierte a arrays y se añade al final de
+    su fichero; id.bin se escribe el último, así que sus filas marcan lo
+    confirmado. Devuelve el último ID volcado.
+    """
+    os.makedirs(directory, exist_ok=True)
+    rows = _committed_rows(directory)
+    if rows is None:
+        for name in COLUMN_DTYPES:
+            # Un volcado incompleto (o del formato .npy anterior) se descarta
+            for path in (_column_path(directory, name), _array_path(directory, name)):
+                if os.path.exists(path):
+                    os.remove(path)
+            open(_column_path(directory, name), "wb").close()
+        rows = 0
+        alphabets = {c: [] for c in TEXT_COLUMNS}
+    else:
+        alphabets = {c: list(np.load(_array_path(directory, f"{c}_alphabet"))) for c in TEXT_COLUMNS}
+    last_id = int(_open_column(directory, "id", rows)[-1]) if rows else 0
+
+    codes = {c: {v: i for i, v in enumerate(alphabets[c])} for c in TEXT_COLUMNS}
+    added = 0
+    for chunk in db.iter_spins(after_id=last_id):
+        sizes = {c: len(alphabets[c]) for c in TEXT_COLUMNS}
+        arrays = _chunk_arrays(chunk, alphabets, codes)
+        for c in TEXT_COLUMNS:
+            # El alfabeto va antes que las columnas que usan sus códigos nuevos
+            if len(alphabets[c]) != sizes[c] or rows + added == 0:
+                _save_array(directory, f"{c}_alphabet", np.asarray(alphabets[c], dtype=str))
+        for name in COLUMN_DTYPES:
+            with open(_column_path(directory, name), "ab") as f:
+                f.write(arrays[name].tobytes())
+        added += len(chunk)
+        last_id = int(arrays["id"][-1])
+    if added:
+        logger.info(f"🗂️ Arrays de tiros actualizados: +{added} (hasta ID {last_id})")
+    return last_id
+
+# ============== Tareas de los workers (nivel de módulo: deben poder serializarse) ==============
+
+_ARRAYS: dict = {}
+
+def _open_arrays(directory: str, version: int) -> dict:
+    """Arrays mapeados en memoria, cacheados por proceso mientras no cambie el volcado."""
+    if _ARRAYS.get("key") != (directory, version):
+        _ARRAYS.clear()
+        _ARRAYS["key"] = (directory, version)
+        # Solo las filas confirmadas: un volcado en curso pudo añadir ya otras columnas
+        rows = _column_rows(directory, "id")
+        for name in COLUMN_DTYPES:
+            _ARRAYS[name] = _open_column(directory, name, rows)
+        for c in TEXT_COLUMNS:
+            _ARRAYS[f"{c}_codes"] = {v: i for i, v in enumerate(np.load(_array_path(directory, f"{c}_alphabet")))}
+        _ARRAYS["resultado_alphabet"] = list(np.load(_array_path(directory, "resultado_alphabet")))
+    return _ARRAYS
+
+_COMPARE = {"==": operator.eq, "!=": operator.ne, ">": operator.gt, ">=": operator.ge,
+            "<": operator.lt, "<=": operator.le}
+
+def _condition_mask(arrays: dict, column: str, op: str, value):
+    """Máscara de una condición; NULL nunca la cumple (igual que en SQL y en PredicateEvaluator)."""
+    if column in TEXT_COLUMNS:
+        # Se evalúa sobre el alfabeto (pocos valores) y se busca por código
+        def holds(v):
+            try:
+                return v in value if op == "in" else _COMPARE[op](v, value)
+            except TypeError:
+                return False
+        codes = [code for v, code in arrays[f"{column}_codes"].items() if holds(v)]
+        return np.isin(arrays[column], codes)
+    data = arrays[column]
+    with np.errstate(invalid="ignore"):
+        if op == "in":
+            return np.isin(data, [float(v) for v in value])
+        return ~np.isnan(data) & _COMPARE[op](data, float(value))
+
+def pattern_positions(arrays: dict, pattern: Pattern):
+    """Índices (en los arrays) de los tiros donde se da el patrón, misma semántica que el tracker."""
+    if pattern.type == "predicate":
+        mask = np.ones(len(arrays["id"]), dtype=bool)
+        for column, op, value in pattern.value:
+            any_column = np.zeros(len(mask), dtype=bool)
+            for c in predicate_columns(column):
+                any_column |= _condition_mask(arrays, c, op, value)
+            mask &= any_column
+        return np.flatnonzero(mask)
+    lookup = arrays["resultado_codes"]
+    symbols = pattern_symbols(pattern)
+    if any(s not in lookup for s in symbols):
+        return np.empty(0, dtype=np.int64)
+    return find_occurrences(arrays["resultado"], tuple(lookup[s] for s in symbols))
+
+def _details(arrays: dict, index: int) -> dict:
+    details = {}
+    for c in DETAIL_COLUMNS:
+        v = arrays[c][index]
+        details[c] = None if np.isnan(v) else float(v)
+    code = int(arrays["resultado"][index])
+    details["resultado"] = arrays["resultado_alphabet"][code] if code >= 0 else None
+    return details
+
+def window_task(directory: str, version: int, pattern_data: dict) -> dict:
+    """Métricas de las ventanas configuradas de un patrón sobre todo el historial."""
+    arrays = _open_arrays(directory, version)
+    pattern = pattern_from_dict(pattern_data)
+    positions = pattern_positions(arrays, pattern)
+    ids = arrays["id"][positions]
+    distances = np.diff(ids)
+    result = {"pattern_id": pattern.id, "pattern_name": pattern.name, "occurrences": len(positions), "windows": {}}
+    if len(positions) < 2:
+        return result
+    payouts = {}
+    for threshold in pattern.warning_thresholds:
+        w_start, w_end = get_window_range(threshold)
+        entered = distances >= w_start
+        won = np.flatnonzero(entered & (distances <= w_end))
+        total_payout = 0
+        for k in won:
+            if k not in payouts:
+                payouts[k] = calculate_payout(pattern, _details(arrays, int(positions[k + 1])))
+            total_payout += payouts[k]
+        metrics = WindowAnalyzer._window_metrics(w_start, w_end, int(entered.sum()), len(won), total_payout)
+        result["windows"][metrics["window_range"]] = metrics
+    # Para el bootstrap solo cuenta el pago de las rachas que caen en alguna ventana
+    streak_payouts = np.zeros(len(distances))
+    streak_payouts[list(payouts)] = list(payouts.values())
+    attach_confidence_intervals(result["windows"], distances, streak_payouts)
+    return result
+
+def daily_task(directory: str, version: int, pattern_data: dict, start_iso: str, end_iso: str) -> dict:
+    """Informe de un patrón en una jornada (mismo formato que DailyReportGenerator)."""
+    arrays = _open_arrays(directory, version)
+    pattern = pattern_from_dict(pattern_data)
+    positions = pattern_positions(arrays, pattern)
+    timestamps = arrays["timestamp"][positions]
+    start, end = np.datetime64(start_iso, "s"), np.datetime64(end_iso, "s")
+    before_end = timestamps < end
+    positions, timestamps = positions[before_end], timestamps[before_end]
+    if not len(positions):
+        return {"id": pattern.id, "name": pattern.name, "count": 0, "windows": []}
+
+    ids = arrays["id"][positions]
+    # La oportunidad nace en la aparición i (dentro de la jornada) y se mide hasta la siguiente
+    in_day = (timestamps[:-1] >= start) & (timestamps[:-1] < end)
+    distances = np.diff(ids)[in_day]
+    windows = []
+    for threshold in pattern.warning_thresholds:
+        w_start, w_end = get_window_range(threshold)
+        windows.append({
+            "window_range": f"[{w_start}-{w_end}]",
+            "hits": int(((distances >= w_start) & (distances <= w_end)).sum()),
+            "misses": int((distances > w_end).sum()),
+        })
+    return {"id": pattern.id, "name": pattern.name, "count": int((timestamps >= start).sum()), "windows": windows}
+
+# ============== Ejecutor ==============
+
+class AnalysisExecutor:
+    """Pool de procesos para análisis por patrón/periodo más un hilo para encolar trabajos."""
+
+    def __init__(self, db_path: str = "data/db.sqlite3", array_dir: Optional[str] = None,
+                 max_workers: Optional[int] = None):
+        if not HAS_NUMPY:
+            raise RuntimeError("numpy no está instalado (pip install numpy)")
+        self.db = Database(db_path)
+        # Por defecto junto a la BD: data/cache/spin_arrays
+        self.array_dir = array_dir or os.path.join(os.path.dirname(db_path), "cache", "spin_arrays")
+        self.max_workers = max_workers or max(1, min(4, (os.cpu_count() or 2) - 1))
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._background = ThreadPoolExecutor(max_workers=1, thread_name_prefix="analysis")
+        self._pending: dict[str, Future] = {}
+        self.version = 0
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: el proceso del servicio tiene hilos (dispatcher, Telegram) y fork no es seguro
+            self._pool = ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def _run(self, func: Callable, tasks: list[tuple]) -> list:
+        """Actualiza los arrays y ejecuta las tareas en el pool; resultados en el orden de `tasks`."""
+        with self._lock:
+            self.version = export_spin_arrays(self.db, self.array_dir)
+            calls = [(self.array_dir, self.version, *task) for task in tasks]
+            if self.max_workers == 1 or len(calls) == 1:
+                return [func(*call) for call in calls]
+            try:
+                return list(self._get_pool().map(func, *zip(*calls)))
+            except Exception as e:
+                # Pool roto (p.ej. un worker muerto): se recrea en el siguiente uso y se resuelve aquí
+                logger.error(f"❌ Pool de análisis no disponible ({e}); ejecutando en el proceso actual")
+                self._pool = None
+                return [func(*call) for call in calls]
+
+    def window_metrics(self, patterns: Iterable[Pattern]) -> dict:
+        """{pattern_id: {"pattern_id", "pattern_name", "occurrences", "windows"}} en orden de patrones."""
+        results = self._run(window_task, [(pattern_to_dict(p),) for p in patterns])
+        return {r["pattern_id"]: r for r in results}
+
+    def daily_reports(self, patterns: Iterable[Pattern], periods: list[tuple[str, str]]) -> list[list[dict]]:
+        """Informe por patrón de cada periodo (start_iso, end_iso): una lista por periodo."""
+        patterns = [pattern_to_dict(p) for p in patterns]
+        results = self._run(daily_task, [(p, start, end) for start, end in periods for p in patterns])
+        return [results[i * len(patterns):(i + 1) * len(patterns)] for i in range(len(periods))]
+
+    def submit(self, name: str, func: Callable, *args, **kwargs) -> Optional[Future]:
+        """Encola un trabajo en el hilo de análisis; si ya hay uno pendiente con ese nombre, no se duplica."""
+        pending = self._pending.get(name)
+        if pending is not None and not pending.done():
+            logger.debug(f"⏭️ Análisis '{name}' ya en curso, no se encola otra vez")
+            return None
+
+        def job():
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                logger.error(f"❌ Error en análisis '{name}': {e}", exc_info=True)
+        self._pending[name] = self._background.submit(job)
+        return self._pending[name]
+
+    def shutdown(self, wait: bool = True):
+        self._background.shutdown(wait=wait)
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait)
+            self._pool = None
@@ -0,0 +1,257 @@
+"""
+analytics/backtester.py - Backtesting de estrategias de apuesta por ventanas con bankroll.
+
+Una estrategia apuesta a un patrón en cada tiro de sus ventanas (distancia
+desde la última aparición, como betting_windows); si el patrón cae dentro de
+una ventana, cada ventana que lo cubre cobra calculate_payout × apuesta.
+A diferencia de las métricas de WindowAnalyzer (que cuentan la ventana
+entera como invertida), aquí solo se pagan los tiros jugados hasta el acierto.
+
+El historial se recorre una sola vez (collect_streaks): cada aparición cierra
+una racha, que queda como evento (spin_id, distancia, pago, jornada). Después
+simulate() aplica todos los eventos de un patrón a todas sus estrategias a la
+vez: el estado (bankroll, progresión, stop-loss, drawdown) son arrays de
+NumPy con una fila por estrategia, así que el coste por evento apenas depende
+de cuántas configuraciones se barran. Para barridos grandes, run() reparte las
+estrategias entre procesos.
+
+Reglas:
+  - apuesta por tiro = min(stake × multiplicador, max_stake); tras una racha
+    jugada sin acierto el multiplicador se multiplica por `progression`
+    (1 = apuesta plana) y vuelve a 1 al acertar;
+  - stop_loss: pérdida máxima por jornada (23:00-23:00); se comprueba al
+    empezar cada racha y la racha en curso se juega entera;
+  - solo se juegan los tiros que cubre el bankroll (floor(equity / apuesta)
+    apuestas por racha); si se acaba antes del tiro del acierto, la racha se
+    pierde sin cobrar, así que la equity nunca baja de 0 ni el drawdown pasa
+    del 100%;
+  - si el bankroll no cubre una apuesta de la siguiente racha, la estrategia
+    queda arruinada (ruined, con el tiro en ruined_at) y deja de apostar;
+  - la racha abierta al final del historial cuesta los tiros ya jugados.
+"""
+
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+from analytics.pattern_matcher import PatternMatcher
+from analytics.pattern_registry import PatternRegistry
+from analytics.payouts import calculate_payout
+from analytics.predicates import PredicateEvaluator
+from config.patterns import Pattern
+from core.database import Database
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CURVE_POINTS = 100
+
+@dataclass(frozen=True)
+class Strategy:
+    """Configuración de apuesta a un patrón (windows vacío = betting_windows del patrón)."""
+    pattern_id: str
+    windows: tuple[tuple[int, int], ...] = ()
+    stake: float = 1.0
+    progression: float = 1.0
+    max_stake: Optional[float] = None
+    stop_loss: Optional[float] = None
+    bankroll: float = 1000.0
+
+    @property
+    def label(self) -> str:
+        windows = ",".join(f"{a}-{b}" for a, b in self.windows) or "config"
+        parts = [self.pattern_id, f"w={windows}", f"stake={self.stake:g}"]
+        if self.progression != 1:
+            parts.append(f"x{self.progression:g}" + (f"≤{self.max_stake:g}" if self.max_stake else ""))
+        if self.stop_loss:
+            parts.append(f"sl={self.stop_loss:g}")
+        return " ".join(parts)
+
+def session_day(timestamp: str) -> str:
+    """Jornada del tiro: de 23:00 a 23:00, con la fecha del día en que cierra."""
+    return (datetime.fromisoformat(timestamp) + timedelta(hours=1)).date().isoformat()
+
+def collect_streaks(db: Database, patterns: Iterable[Pattern], through_id: Optional[int] = None) -> dict:
+    """
+    Recorre `tiros` una vez y devuelve las rachas de cada patrón:
+    {pattern_id: {"spin_id", "distance", "payout", "day", "closed"}} (arrays en orden).
+    La última racha de cada patrón queda abierta (closed=False) hasta el último tiro.
+    """
+    if not HAS_NUMPY:
+        raise RuntimeError("numpy no está instalado (pip install numpy)")
+    patterns = list(patterns)
+    matcher = PatternMatcher([p for p in patterns if p.type != "predicate"])
+    predicates = PredicateEvaluator(patterns)
+    events = {p.id: [] for p in patterns}
+    last_seen: dict[str, int] = {}
+    last_spin = None
+    for chunk in db.iter_spins(through_id=through_id):
+        for spin in chunk:
+            for pattern in (*matcher.step(spin["resultado"]), *predicates.match(spin)):
+                previous = last_seen.get(pattern.id)
+                if previous is not None:
+                    events[pattern.id].append((spin["id"], spin["id"] - previous,
+                                               calculate_payout(pattern, spin), session_day(spin["timestamp"]), True))
+                last_seen[pattern.id] = spin["id"]
+            last_spin = spin
+    if last_spin is not None:
+        for pattern_id, previous in last_seen.items():
+            if previous < last_spin["id"]:
+                events[pattern_id].append((last_spin["id"], last_spin["id"] - previous, 0.0,
+                                           session_day(last_spin["timestamp"]), False))
+
+    streaks = {}
+    for pattern_id, rows in events.items():
+        spin_id, distance, payout, day, closed = zip(*rows) if rows else ((), (), (), (), ())
+        streaks[pattern_id] = {
+            "spin_id": np.asarray(spin_id, dtype=np.int64),
+            "distance": np.asarray(distance, dtype=np.int64),
+            "payout": np.asarray(payout, dtype=np.float64),
+            "day": np.asarray(day, dtype=str),
+            "closed": np.asarray(closed, dtype=bool),
+        }
+    return streaks
+
+def simulate(pattern: Pattern, strategies: list[Strategy], streaks: dict,
+             curve_points: int = DEFAULT_CURVE_POINTS) -> list[dict]:
+    """Simula todas las estrategias de un patrón sobre sus rachas (vectorizado por estrategia)."""
+    n = len(strategies)
+    windows = [s.windows or tuple(map(tuple, pattern.betting_windows)) for s in strategies]
+    width = max(1, max(len(w) for w in windows))
+    # Ventanas de relleno: inicio inalcanzable, nunca apuestan
+    starts = np.full((n, width), np.iinfo(np.int64).max // 2, dtype=np.int64)
+    ends = np.zeros((n, width), dtype=np.int64)
+    for i, ws in enumerate(windows):
+        for j, (a, b) in enumerate(ws):
+            starts[i, j], ends[i, j] = a, b
+
+    base = np.array([s.stake for s in strategies], dtype=np.float64)
+    progression = np.array([s.progression for s in strategies], dtype=np.float64)
+    max_stake = np.array([s.max_stake or np.inf for s in strategies], dtype=np.float64)
+    stop_loss = np.array([s.stop_loss or np.inf for s in strategies], dtype=np.float64)
+    equity = np.array([s.bankroll for s in strategies], dtype=np.float64)
+    peak, max_drawdown, max_drawdown_pct = equity.copy(), np.zeros(n), np.zeros(n)
+    multiplier, day_pnl = np.ones(n), np.zeros(n)
+    staked, returned = np.zeros(n), np.zeros(n)
+    played, won, stopped_days = np.zeros(n, dtype=np.int64), np.zeros(n, dtype=np.int64), np.zeros(n, dtype=np.int64)
+    ruined, stopped_today = np.zeros(n, dtype=bool), np.zeros(n, dtype=bool)
+    ruined_at = np.zeros(n, dtype=np.int64)
+
+    # Curva de equity submuestreada: al llenarse se descarta un punto de cada dos y se dobla el paso
+    curve_ids, curve, stride = [], [], 1
+    day = None
+    total = len(streaks["distance"])
+    for k in range(total):
+        distance, payout, closed = streaks["distance"][k], streaks["payout"][k], streaks["closed"][k]
+        if streaks["day"][k] != day:
+            day = streaks["day"][k]
+            day_pnl[:] = 0
+            stopped_today[:] = False
+        bets = np.clip(np.minimum(distance, ends) - starts + 1, 0, None).sum(axis=1)
+        hits = ((starts <= distance) & (distance <= ends)).sum(axis=1) if closed else np.zeros(n, dtype=np.int64)
+        halted = ~ruined & (bets > 0) & (day_pnl <= -stop_loss)
+        active = ~ruined & (bets > 0) & ~halted
+        stake = np.minimum(base * multiplier, max_stake)
+        # Apuestas que cubre el bankroll; las del tiro del acierto son las últimas de la racha
+        placed = np.where(active, np.minimum(bets, np.floor(equity / stake + 1e-9).astype(np.int64)), 0)
+        hits = np.clip(placed - (bets - hits), 0, None)
+        cost = placed * stake
+        paid = hits * payout * stake
+        pnl = paid - cost
+
+        equity += pnl
+        day_pnl += pnl
+        staked += cost
+        returned += paid
+        played += active
+        won += active & (hits > 0)
+        stopped_days += halted & ~stopped_today
+        stopped_today |= halted
+        if closed:
+            multiplier = np.where(active, np.where(hits > 0, 1.0, multiplier * progression), multiplier)
+        np.maximum(peak, equity, out=peak)
+        np.maximum(max_drawdown, peak - equity, out=max_drawdown)
+        np.maximum(max_drawdown_pct, np.where(peak > 0, (peak - equity) / peak * 100, 0.0), out=max_drawdown_pct)
+        broke = ~ruined & (equity < np.minimum(base * multiplier, max_stake) - 1e-9)
+        ruined_at[broke] = streaks["spin_id"][k]
+        ruined |= broke
+
+        if k % stride == 0 or k == total - 1:
+            curve_ids.append(int(streaks["spin_id"][k]))
+            curve.append(equity.copy())
+            if len(curve) > 2 * curve_points:
+                curve_ids, curve, stride = curve_ids[::2], curve[::2], stride * 2
+
+    curve = np.array(curve).T if curve else np.zeros((n, 0))
+    results = []
+    for i, strategy in enumerate(strategies):
+        profit_loss = returned[i] - staked[i]
+        results.append({
+            "strategy": strategy.label,
+            **asdict(strategy),
+            "windows": [list(w) for w in windows[i]],
+            "final_equity": round(float(equity[i]), 2),
+            "profit_loss": round(float(profit_loss), 2),
+            "staked": round(float(staked[i]), 2),
+            "returned": round(float(returned[i]), 2),
+            "roi": round(float(profit_loss / staked[i] * 100), 2) if staked[i] else 0.0,
+            "max_drawdown": round(float(max_drawdown[i]), 2),
+            "max_drawdown_pct": round(float(max_drawdown_pct[i]), 2),
+            "streaks_played": int(played[i]),
+            "wins": int(won[i]),
+            "stop_loss_days": int(stopped_days[i]),
+            "ruined": bool(ruined[i]),
+            "ruined_at": int(ruined_at[i]) if ruined[i] else None,
+            "equity_curve": [[sid, round(float(v), 2)] for sid, v in zip(curve_ids, curve[i])],
+        })
+    return results
+
+class Backtester:
+    """Evalúa estrategias contra el historial real de tiros (una pasada por el historial)."""
+
+    def __init__(self, db_path: str = "data/db.sqlite3"):
+        if not HAS_NUMPY:
+            raise RuntimeError("numpy no está instalado (pip install numpy)")
+        self.db = Database(db_path)
+        self.patterns = {p.id: p for p in PatternRegistry(self.db).load()}
+
+    def run(self, strategies: Iterable[Strategy], through_id: Optional[int] = None,
+            curve_points: int = DEFAULT_CURVE_POINTS, max_workers: int = 1) -> list[dict]:
+        """Resultados en el mismo orden que `strategies`."""
+        strategies = list(strategies)
+        unknown = {s.pattern_id for s in strategies} - set(self.patterns)
+        if unknown:
+            raise ValueError(f"Patrones desconocidos: {', '.join(sorted(unknown))}")
+        patterns = [self.patterns[pid] for pid in dict.fromkeys(s.pattern_id for s in strategies)]
+        streaks = collect_streaks(self.db, patterns, through_id)
+        logger.info(f"🧪 Backtest: {len(strategies)} estrategias, "
+                    f"{sum(len(s['distance']) for s in streaks.values())} rachas de {len(patterns)} patrones")
+
+        # Tareas: bloques de estrategias del mismo patrón (uno por worker y patrón)
+        tasks, order = [], []
+        for pattern in patterns:
+            indexes = [i for i, s in enumerate(strategies) if s.pattern_id == pattern.id]
+            size = -(-len(indexes) // max_workers)
+            for first in range(0, len(indexes), size):
+                block = indexes[first:first + size]
+                tasks.append((pattern, [strategies[i] for i in block], streaks[pattern.id], curve_points))
+                order.append(block)
+
+        if max_workers > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(max_workers) as pool:
+                outputs = list(pool.map(simulate, *zip(*tasks)))
+        else:
+            outputs = [simulate(*task) for task in tasks]
+
+        results = [None] * len(strategies)
+        for block, output in zip(order, outputs):
+            for i, result in zip(block, output):
+                results[i] = result
+        return results
@@ -0,0 +1,120 @@
+"""
+analytics/bootstrap.py - Intervalos de confianza bootstrap para las métricas de ventanas.
+
+El win rate y el ROI de una ventana salen de pocas decenas de rachas; el
+bootstrap remuestrea (con reemplazo) las distancias entre apariciones junto
+con su pago y recalcula las métricas en cada réplica, con la misma regla que
+WindowAnalyzer._analyze_window_zone.
+
+Todo va en lotes de NumPy: cada réplica es un vector de conteos (cuántas
+veces sale cada racha), y las sumas de todas las ventanas para un lote de
+réplicas son un único producto de matrices
+
+    sumas (réplicas, 3·V) = conteos (réplicas, N) @ valores (N, 3·V)
+
+con valores = [entra, gana, pago si gana] por racha y ventana. El número de
+réplicas se limita para que réplicas × N no pase de MAX_ELEMENTS: el coste
+queda acotado aunque el historial crezca (con muchas rachas, menos réplicas
+bastan para el mismo intervalo).
+"""
+
+import logging
+from typing import Iterable, Optional
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESAMPLES = 2000
+DEFAULT_CONFIDENCE = 0.95
+MIN_RESAMPLES = 200
+MAX_ELEMENTS = 10_000_000    # réplicas × rachas, en total
+BATCH_ELEMENTS = 1_000_000   # réplicas × rachas, por lote (memoria acotada)
+
+def resample_count(n: int, n_resamples: int = DEFAULT_RESAMPLES) -> int:
+    """Réplicas que se harán para `n` rachas (acotadas por MAX_ELEMENTS)."""
+    return max(1, min(n_resamples, max(MIN_RESAMPLES, MAX_ELEMENTS // max(n, 1))))
+
+def bootstrap_windows(distances: Iterable[int], payouts: Iterable[float], windows: list[tuple[int, int]],
+                      n_resamples: int = DEFAULT_RESAMPLES, confidence: float = DEFAULT_CONFIDENCE,
+                      seed: Optional[int] = 0) -> list[dict]:
+    """
+    Intervalos de confianza (percentil) del win rate y el ROI de cada ventana.
+
+    Args:
+        distances: distancia de cada racha (tiros hasta la siguiente aparición)
+        payouts: pago de la aparición que cierra cada racha (si cae en la ventana)
+        windows: [(inicio, fin), ...]
+        seed: semilla fija por defecto, para que el intervalo no baile entre ciclos
+
+    Returns:
+        Por ventana (mismo orden): {"win_rate_ci": [lo, hi] | None, "roi_ci": [lo, hi] | None,
+        "confidence", "resamples"}; None si ninguna réplica tiene entradas.
+    """
+    if not HAS_NUMPY:
+        raise RuntimeError("numpy no está instalado (pip install numpy)")
+    distances = np.asarray(list(distances), dtype=np.int64)
+    payouts = np.asarray(list(payouts), dtype=np.float64)
+    n, v = len(distances), len(windows)
+    if n == 0 or v == 0:
+        return [{"win_rate_ci": None, "roi_ci": None, "confidence": confidence, "resamples": 0} for _ in windows]
+
+    starts = np.array([w[0] for w in windows])
+    ends = np.array([w[1] for w in windows])
+    entered = distances[:, None] >= starts[None, :]
+    won = entered & (distances[:, None] <= ends[None, :])
+    values = np.hstack([entered, won, won * payouts[:, None]]).astype(np.float64)
+
+    rng = np.random.default_rng(seed)
+    total = resample_count(n, n_resamples)
+    batch = max(1, BATCH_ELEMENTS // n)
+    sums = np.empty((total, 3 * v))
+    offsets = np.arange(batch)[:, None] * n
+    for first in range(0, total, batch):
+        b = min(batch, total - first)
+        idx = rng.integers(0, n, size=(b, n))
+        counts = np.bincount((idx + offsets[:b]).ravel(), minlength=b * n).reshape(b, n)
+        sums[first:first + b] = counts @ values
+
+    entries, wins, paid = sums[:, :v], sums[:, v:2 * v], sums[:, 2 * v:]
+    invested = entries * (ends - starts + 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        win_rate = np.where(entries > 0, wins / entries * 100, np.nan)
+        roi = np.where(invested > 0, (paid - invested) / invested * 100, np.nan)
+
+    tail = (1 - confidence) / 2 * 100
+    results = []
+    for j in range(v):
+        result = {"win_rate_ci": None, "roi_ci": None, "confidence": confidence, "resamples": total}
+        if not np.isnan(win_rate[:, j]).all():
+            result["win_rate_ci"] = [round(float(x), 2) for x in np.nanpercentile(win_rate[:, j], [tail, 100 - tail])]
+            result["roi_ci"] = [round(float(x), 2) for x in np.nanpercentile(roi[:, j], [tail, 100 - tail])]
+        results.append(result)
+    return results
+
+def attach_confidence_intervals(windows: dict, distances: Iterable[int], payouts: Iterable[float],
+                                **kwargs) -> dict:
+    """
+    Añade win_rate_ci / roi_ci a cada métrica de ventana ({"[a-b]": métricas}, como
+    las de WindowAnalyzer) a partir de las rachas del patrón. Sin numpy, no hace nada.
+    """
+    if not HAS_NUMPY or not windows:
+        return windows
+    ranges = list(windows)
+    bounds = [tuple(int(x) for x in r.strip("[]").split("-")) for r in ranges]
+    for window_range, ci in zip(ranges, bootstrap_windows(distances, payouts, bounds, **kwargs)):
+        windows[window_range]["win_rate_ci"] = ci["win_rate_ci"]
+        windows[window_range]["roi_ci"] = ci["roi_ci"]
+    return windows
+
+def format_ci(metrics: dict) -> str:
+    """Sufijo para logs/mensajes: ' (IC95%: WR 31.0–52.4%, ROI -18.2–+24.9%)', o '' sin intervalo."""
+    win_rate_ci, roi_ci = metrics.get("win_rate_ci"), metrics.get("roi_ci")
+    if not win_rate_ci or not roi_ci:
+        return ""
+    return (f" (IC{DEFAULT_CONFIDENCE * 100:.0f}%: WR {win_rate_ci[0]:.1f}–{win_rate_ci[1]:.1f}%, "
+            f"ROI {roi_ci[0]:+.1f}–{roi_ci[1]:+.1f}%)")
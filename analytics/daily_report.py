@@ -3,11 +3,12 @@ analytics/daily_report.py - Reportes diarios estratégicos desde SQLite (v3.0).
 """
 
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Optional, Dict, List
 
+from analytics.pattern_registry import PatternRegistry
 from core.database import Database
-from config.patterns import VIP_PATTERNS, TRACKING_PATTERNS, get_window_range
+from config.patterns import get_window_range
 
 logger = logging.getLogger(__name__)
 
@@ -17,8 +18,11 @@ class DailyReportGenerator:
     def __init__(self, db_path: str = "data/db.sqlite3"):
         self.db = Database(db_path)
 
-    def generate(self) -> Optional[Dict]:
-        """Genera el reporte completo del día (cierre estratégico 23:00-23:00)."""
+    def generate(self, executor=None) -> Optional[Dict]:
+        """
+        Genera el reporte completo del día (cierre estratégico 23:00-23:00).
+        Con un AnalysisExecutor, los patrones se analizan en su pool de procesos.
+        """
         try:
             # Lógica "Cierre de Jornada": 23:00 ayer a 23:00 hoy
             now = datetime.now()
@@ -32,13 +36,15 @@ class DailyReportGenerator:
             if db_stats.get("total_spins", 0) == 0:
                 return None
 
-            patterns_report = []
-            all_patterns = VIP_PATTERNS + TRACKING_PATTERNS
-            
-            for pattern in all_patterns:
-                p_data = self._analyze_pattern_in_db(pattern, start_iso, end_iso)
-                if p_data:
-                    patterns_report.append(p_data)
+            all_patterns = [p for p in PatternRegistry(self.db).load() if p.type != "predicate"]
+            if executor is not None:
+                patterns_report = executor.daily_reports(all_patterns, [(start_iso, end_iso)])[0]
+            else:
+                patterns_report = []
+                for pattern in all_patterns:
+                    p_data = self._analyze_pattern_in_db(pattern, start_iso, end_iso)
+                    if p_data:
+                        patterns_report.append(p_data)
 
             return {
                 "total_spins": db_stats["total_spins"],
@@ -57,11 +63,18 @@ class DailyReportGenerator:
             with self.db.get_connection(read_only=True) as conn:
                 cur = conn.cursor()
                 # Obtenemos los tiros del patrón hasta el fin del día
-                cur.execute("""
-                    SELECT id, timestamp FROM tiros 
-                    WHERE resultado = ? AND timestamp < ?
-                    ORDER BY id ASC
-                """, (pattern.value, end_iso))
+                if pattern.type == "sequence":
+                    cur.execute("""
+                        SELECT t.id, t.timestamp FROM pattern_occurrences o JOIN tiros t ON t.id = o.spin_id
+                        WHERE o.pattern_id = ? AND t.timestamp < ?
+                        ORDER BY t.id ASC
+                    """, (pattern.id, end_iso))
+                else:
+                    cur.execute("""
+                        SELECT id, timestamp FROM tiros 
+                        WHERE resultado = ? AND timestamp < ?
+                        ORDER BY id ASC
+                    """, (pattern.value, end_iso))
                 
                 rows = cur.fetchall()
                 if not rows:
@@ -0,0 +1,91 @@
+"""
+analytics/pattern_matcher.py - Autómata de patrones (Aho-Corasick sobre resultados).
+
+Todos los patrones configurados (simples y secuencias de N pasos) se compilan
+en un único autómata cuyo alfabeto son los resultados de la rueda. Cada tiro
+es una sola transición de tabla y devuelve los patrones que terminan en él,
+incluidas coincidencias solapadas (p.ej. 2→5→2 dispara 2→5 y 5→2).
+
+El estado es acotado: el nodo actual equivale a la cola más larga de
+resultados recientes que todavía puede completar algún patrón, como mucho
+tan larga como el patrón más largo. `recent_results()` la devuelve para
+persistirla y `restore()` la re-inyecta tras un reinicio.
+"""
+
+from collections import deque
+from typing import Iterable
+
+from config.patterns import Pattern
+
+def pattern_symbols(pattern: Pattern) -> tuple[str, ...]:
+    """Secuencia de resultados que dispara el patrón."""
+    if pattern.type == "simple":
+        return (pattern.value,)
+    if pattern.type == "predicate":
+        raise ValueError(f"Los patrones predicado no van en el autómata: {pattern.id}")
+    return tuple(pattern.value)
+
+
+class PatternMatcher:
+    """Autómata determinista compilado a partir de una lista de patrones."""
+
+    def __init__(self, patterns: Iterable[Pattern]):
+        self.patterns = list(patterns)
+        # Trie: goto[nodo][símbolo] -> nodo; path[nodo] = símbolos desde la raíz
+        goto: list[dict] = [{}]
+        self._paths: list[tuple] = [()]
+        ends: list[list[int]] = [[]]
+        for index, pattern in enumerate(self.patterns):
+            symbols = pattern_symbols(pattern)
+            if not symbols:
+                raise ValueError(f"Patrón vacío: {pattern.id}")
+            node = 0
+            for symbol in symbols:
+                if symbol not in goto[node]:
+                    goto.append({})
+                    ends.append([])
+                    self._paths.append(self._paths[node] + (symbol,))
+                    goto[node][symbol] = len(goto) - 1
+                node = goto[node][symbol]
+            ends[node].append(index)
+
+        # Enlaces de fallo en BFS; cada nodo hereda las salidas de su enlace y
+        # las transiciones ausentes se resuelven ya (autómata determinista completo)
+        fail = [0] * len(goto)
+        matched = [list(e) for e in ends]
+        self._delta: list[dict] = [dict(goto[0])] + [{} for _ in goto[1:]]
+        order = deque(goto[0].values())
+        while order:
+            node = order.popleft()
+            matched[node] = sorted(set(ends[node]) | set(matched[fail[node]]))
+            self._delta[node] = {**self._delta[fail[node]], **goto[node]}
+            for symbol, child in goto[node].items():
+                fail[child] = self._delta[fail[node]].get(symbol, 0)
+                order.append(child)
+        self._outputs: list[tuple] = [tuple(self.patterns[i] for i in m) for m in matched]
+
+        self.max_length = max(len(p) for p in self._paths)
+        self.state = 0
+
+    @property
+    def states(self) -> int:
+        return len(self._delta)
+
+    def step(self, symbol: str) -> tuple[Pattern, ...]:
+        """Avanza un tiro y devuelve los patrones que terminan en él (en orden de configuración)."""
+        self.state = self._delta[self.state].get(symbol, 0)
+        return self._outputs[self.state]
+
+    def reset(self):
+        self.state = 0
+
+    def recent_results(self) -> list[str]:
+        """Cola mínima de resultados que reproduce el estado actual."""
+        return list(self._paths[self.state])
+
+    def restore(self, recent: Iterable[str]):
+        """Reconstruye el estado a partir de resultados recientes (sin emitir coincidencias)."""
+        self.state = 0
+        recent = list(recent)
+        for symbol in recent[max(0, len(recent) - self.max_length):]:
+            self.state = self._delta[self.state].get(symbol, 0)
@@ -0,0 +1,127 @@
+"""
+analytics/pattern_registry.py - Registro de patrones en SQLite con recarga en caliente.
+
+Los patrones viven en la tabla `patterns` (definición JSON por fila); los de
+config/patterns.py solo sirven de semilla la primera vez. Cada cambio del
+registro incrementa `system_state(pattern_registry, version)`, así que el
+servicio detecta altas, bajas y retoques con una lectura por ciclo y recarga
+sin reiniciar. El tracker se encarga de rellenar el historial de los patrones
+nuevos en segundo plano (PatternTracker.run_backfill).
+"""
+
+import re
+import json
+import logging
+from typing import Iterable, Optional
+
+from analytics.pattern_matcher import pattern_symbols
+from analytics.predicates import _validate as validate_predicate
+from config.patterns import ALL_PATTERNS, Pattern
+from core.database import Database
+
+logger = logging.getLogger(__name__)
+
+# Claves de system_state del tracker que no pueden usarse como ID de patrón
+RESERVED_IDS = {"progress", "definitions"}
+
+def pattern_to_dict(pattern: Pattern) -> dict:
+    return {
+        "id": pattern.id, "name": pattern.name, "type": pattern.type, "value": pattern.value,
+        "warning_thresholds": list(pattern.warning_thresholds),
+        "betting_windows": [list(w) for w in pattern.betting_windows],
+        "alert_level": pattern.alert_level, "description": pattern.description,
+    }
+
+def pattern_from_dict(data: dict) -> Pattern:
+    value = data["value"]
+    if data["type"] == "predicate":
+        # JSON no conserva tuplas: condición (columna | (columnas...), operador, valor)
+        value = [(tuple(c) if isinstance(c, list) else c, op, v) for c, op, v in value]
+    return Pattern(
+        id=data["id"], name=data["name"], type=data["type"], value=value,
+        warning_thresholds=[int(t) for t in data.get("warning_thresholds", [])],
+        betting_windows=[(int(a), int(b)) for a, b in data.get("betting_windows", [])],
+        alert_level=data.get("alert_level", "tracking"),
+        description=data.get("description", ""),
+    )
+
+def pattern_fingerprint(pattern: Pattern) -> str:
+    """Identifica qué dispara el patrón: si cambia, su historial debe recalcularse."""
+    return json.dumps([pattern.type, pattern.value])
+
+def validate_pattern(pattern: Pattern):
+    """Lanza ValueError si el patrón no puede registrarse."""
+    if not re.fullmatch(r"\w+", pattern.id) or pattern.id in RESERVED_IDS:
+        raise ValueError(f"ID de patrón no válido: {pattern.id}")
+    if pattern.type == "predicate":
+        validate_predicate(pattern)
+    elif pattern.type in ("simple", "sequence"):
+        symbols = pattern_symbols(pattern)
+        if not symbols or not all(isinstance(s, str) and s for s in symbols):
+            raise ValueError(f"[{pattern.id}] Valor no válido: {pattern.value!r}")
+    else:
+        raise ValueError(f"[{pattern.id}] Tipo no soportado: {pattern.type}")
+    if pattern.alert_level not in ("vip", "tracking"):
+        raise ValueError(f"[{pattern.id}] Nivel de alerta no soportado: {pattern.alert_level}")
+    for start, end in pattern.betting_windows:
+        if not 0 < start <= end:
+            raise ValueError(f"[{pattern.id}] Ventana no válida: {start}-{end}")
+
+
+class PatternRegistry:
+    """Patrones activos leídos de la tabla `patterns`, recargados cuando cambia su versión."""
+
+    def __init__(self, db: Database):
+        self.db = db
+        self.version: Optional[int] = None
+        self.patterns: list[Pattern] = []
+
+    @property
+    def by_id(self) -> dict[str, Pattern]:
+        return {p.id: p for p in self.patterns}
+
+    @property
+    def vip_patterns(self) -> list[Pattern]:
+        return [p for p in self.patterns if p.alert_level == "vip"]
+
+    def seed(self, defaults: Iterable[Pattern] = ALL_PATTERNS) -> int:
+        """Carga los patrones de config/patterns.py si el registro está vacío."""
+        if self.db.get_patterns(active_only=False):
+            return 0
+        defaults = list(defaults)
+        for pattern in defaults:
+            self.save(pattern)
+        logger.info(f"🌱 Registro de patrones inicializado con {len(defaults)} patrones")
+        return len(defaults)
+
+    def save(self, pattern: Pattern, active: bool = True):
+        validate_pattern(pattern)
+        self.db.upsert_pattern(pattern.id, pattern_to_dict(pattern), active)
+
+    def load(self) -> list[Pattern]:
+        """Lee los patrones activos (o los de config si el registro aún no se ha sembrado)."""
+        # La versión se lee antes que las filas: un cambio concurrente provoca otra recarga
+        self.version = self.db.get_pattern_registry_version()
+        rows = self.db.get_patterns(active_only=False)
+        if not rows:
+            self.patterns = list(ALL_PATTERNS)
+            return self.patterns
+        patterns = []
+        for row in rows:
+            if not row["active"]:
+                continue
+            try:
+                pattern = pattern_from_dict(row["definition"])
+                validate_pattern(pattern)
+                patterns.append(pattern)
+            except (KeyError, TypeError, ValueError) as e:
+                logger.error(f"❌ Patrón {row['id']} ignorado, definición no válida: {e}")
+        self.patterns = patterns
+        return self.patterns
+
+    def refresh(self) -> bool:
+        """Recarga si el registro cambió desde la última lectura. Devuelve True si recargó."""
+        if self.version is not None and self.db.get_pattern_registry_version() == self.version:
+            return False
+        self.load()
+        return True
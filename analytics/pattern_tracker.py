@@ -2,21 +2,172 @@
 analytics/pattern_tracker.py - Tracking de distancias en SQLite con memoria de hit (v3.1).
 """
 
+import time
 import logging
 from dataclasses import dataclass
 from typing import Optional
 
-from config.patterns import ALL_PATTERNS, Pattern
+from analytics.pattern_matcher import PatternMatcher
+from analytics.pattern_registry import PatternRegistry, pattern_fingerprint
+from analytics.predicates import PredicateEvaluator, ensure_predicate_indexes
+from config.patterns import Pattern
 from core.database import Database
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_PATTERN_STATE = {"last_id": None, "last_distance": 0, "prev_distance": 0}
+
 class PatternTracker:
     """Rastrea y registra distancias entre apariciones usando exclusivamente SQLite."""
 
-    def __init__(self, db_path: str = "data/db.sqlite3"):
+    def __init__(self, db_path: str = "data/db.sqlite3", registry: Optional[PatternRegistry] = None):
         self.db = Database(db_path)
+        # Patrones del registro en BD (se siembra con config/patterns.py la primera vez)
+        self.registry = registry or PatternRegistry(self.db)
+        self.registry.seed()
         self.state = self._load_main_state()
+        # Relleno de historial pendiente ({"patterns", "through_id"}) y su resultado en sombra
+        self.backfill: Optional[dict] = None
+        self._backfill_result: Optional[dict] = None
+        self._apply_registry(self.registry.load())
+
+    def _apply_registry(self, patterns: list[Pattern]):
+        """
+        Sigue los patrones del registro. Los que el tracker aún no seguía con su
+        definición actual quedan pendientes de relleno (run_backfill) y no se
+        siguen hasta aplicarlo (apply_backfill); mientras, su estado es el inicial.
+        """
+        known = self.db.get_state("pattern_tracker", "definitions", None)
+        if known is None:
+            # Estado anterior al registro: lo que ya tiene estado se da por seguido
+            known = {p.id: pattern_fingerprint(p) for p in patterns
+                     if self.db.get_state("pattern_tracker", p.id, DEFAULT_PATTERN_STATE)["last_id"] is not None}
+        new = [p for p in patterns if known.get(p.id) != pattern_fingerprint(p)]
+        if not self.state.get("last_processed_id", 0):
+            new = []  # Sin historial no hay nada que rellenar
+        pending = {p.id for p in new}
+        self.patterns = [p for p in patterns if p.id not in pending]
+        # Espejo en memoria de system_state: se lee una vez y se persiste al cierre de cada lote
+        # (los pendientes de un relleno anterior solo tienen el estado inicial, no cuentan)
+        was_pending = {p.id for p in self.backfill["patterns"]} if self.backfill else set()
+        previous = {pid: state for pid, state in getattr(self, "pattern_states", {}).items()
+                    if pid not in was_pending}
+        self.pattern_states = {p.id: previous.get(p.id) or
+                               self.db.get_state("pattern_tracker", p.id, dict(DEFAULT_PATTERN_STATE))
+                               for p in self.patterns}
+        self.pattern_states.update({p.id: dict(DEFAULT_PATTERN_STATE) for p in new})
+        self._compile_patterns()
+        recent = self.state.get("recent_results")
+        if recent is None:
+            # Estado anterior al autómata: solo se guardaba el último resultado
+            recent = [self.state["last_result"]] if self.state.get("last_result") is not None else []
+        self.matcher.restore(recent)
+        # Solo se recuerdan los seguidos: un patrón reactivado (o pendiente al reiniciar) vuelve a rellenarse
+        self.db.set_state("pattern_tracker", "definitions",
+                          {p.id: pattern_fingerprint(p) for p in self.patterns})
+        job_key = [(p.id, pattern_fingerprint(p)) for p in new]
+        if job_key != [(p.id, pattern_fingerprint(p)) for p in (self.backfill or {}).get("patterns", [])]:
+            self.backfill = {"patterns": new, "through_id": self.state["last_processed_id"]} if new else None
+            self._backfill_result = None
+
+    def _compile_patterns(self):
+        # Patrones de resultado (simples y secuencias de N pasos) en un solo autómata;
+        # los predicados sobre columnas se evalúan con funciones compiladas por resultado
+        self.matcher = PatternMatcher([p for p in self.patterns if p.type != "predicate"])
+        self.predicates = PredicateEvaluator(self.patterns)
+        ensure_predicate_indexes(self.db, self.predicates.patterns)
+
+    def reload_patterns(self) -> bool:
+        """
+        Aplica los cambios del registro sin reiniciar. Los patrones nuevos (o
+        cuya definición cambió) quedan pendientes de relleno desde el historial
+        (ver run_backfill). Devuelve True si el registro cambió.
+        """
+        if not self.registry.refresh():
+            return False
+        self._apply_registry(self.registry.patterns)
+        pending = [p.id for p in self.backfill["patterns"]] if self.backfill else []
+        logger.info(f"🔄 Patrones recargados: {len(self.patterns)} activos"
+                    + (f", historial pendiente de rellenar para {', '.join(pending)}" if pending else ""))
+        return True
+
+    def run_backfill(self):
+        """
+        Rellena en sombra el historial de los patrones pendientes: una sola pasada
+        en streaming por `tiros` hasta `through_id` que guarda su historial en
+        pattern_occurrences y calcula su estado, sin tocar el de los patrones
+        seguidos. Pensado para el hilo de análisis; se aplica con apply_backfill.
+        """
+        job = self.backfill
+        if job is None:
+            return
+        patterns, through_id = job["patterns"], job["through_id"]
+        logger.info(f"⏪ Rellenando historial de {len(patterns)} patrones hasta ID {through_id}")
+        t0 = time.perf_counter()
+        matcher = PatternMatcher([p for p in patterns if p.type != "predicate"]) \
+            if any(p.type != "predicate" for p in patterns) else None
+        evaluator = PredicateEvaluator(patterns)
+        states = {p.id: dict(DEFAULT_PATTERN_STATE) for p in patterns}
+        for pattern in patterns:
+            self.db.delete_pattern_occurrences(pattern.id)
+        total = 0
+        for chunk in self.db.iter_spins(0, through_id):
+            total += self._backfill_chunk(chunk, matcher, evaluator, states)
+        logger.info(f"✅ Historial rellenado en segundo plano: {total} apariciones "
+                    f"({time.perf_counter() - t0:.1f}s), se aplica en el próximo ciclo")
+        self._backfill_result = {"job": job, "matcher": matcher, "evaluator": evaluator, "states": states}
+
+    def _backfill_chunk(self, chunk: list[dict], matcher: Optional[PatternMatcher],
+                        evaluator: PredicateEvaluator, states: dict) -> int:
+        rows = []
+        for spin in chunk:
+            hits = [*(matcher.step(spin["resultado"]) if matcher else ()), *evaluator.match(spin)]
+            for pattern in hits:
+                state = states[pattern.id]
+                distance = spin["id"] - state["last_id"] if state["last_id"] is not None else 0
+                states[pattern.id] = {"last_id": spin["id"], "last_distance": 0, "prev_distance": distance}
+                rows.append((pattern.id, spin["id"], distance))
+        self.db.insert_pattern_occurrences(rows)
+        return len(rows)
+
+    def backfill_done(self) -> bool:
+        """True si el relleno pendiente ya terminó y puede aplicarse."""
+        return self._backfill_result is not None
+
+    def apply_backfill(self) -> list[str]:
+        """
+        Incorpora el relleno terminado: pone al día los patrones desde `through_id`
+        hasta el último tiro procesado (lo que entró mientras se rellenaba) y pasa
+        a seguirlos. Devuelve los IDs incorporados ([] si no había nada que aplicar).
+        """
+        result = self._backfill_result
+        if result is None:
+            return []
+        self._backfill_result = None
+        if result["job"] is not self.backfill:
+            return []  # El registro cambió mientras tanto: hay otro relleno pendiente
+        patterns, through_id = result["job"]["patterns"], result["job"]["through_id"]
+        last_processed_id = self.state.get("last_processed_id", 0)
+        states = result["states"]
+        caught_up = 0
+        for chunk in self.db.iter_spins(through_id, last_processed_id):
+            caught_up += self._backfill_chunk(chunk, result["matcher"], result["evaluator"], states)
+
+        for pattern in patterns:
+            state = states[pattern.id]
+            if state["last_id"] is not None:
+                state["last_distance"] = last_processed_id - state["last_id"]
+            self.pattern_states[pattern.id] = state
+            self.db.set_state("pattern_tracker", pattern.id, state)
+        self.backfill = None
+        self.patterns = [p for p in self.registry.patterns if p.id in self.pattern_states]
+        self._compile_patterns()
+        self.matcher.restore(self.state.get("recent_results") or [])
+        self.db.set_state("pattern_tracker", "definitions",
+                          {p.id: pattern_fingerprint(p) for p in self.patterns})
+        logger.info(f"✅ Historial aplicado para {', '.join(p.id for p in patterns)} "
+                    f"(+{last_processed_id - through_id} tiros puestos al día, {caught_up} apariciones)")
+        return [p.id for p in patterns]
 
     def _load_main_state(self) -> dict:
         """Carga el progreso global del tracker."""
@@ -26,55 +177,73 @@ class PatternTracker:
         })
 
     def _save_main_state(self):
-        """Guarda el progreso global del tracker."""
+        """Guarda el progreso global del tracker (incluida la cola que reconstruye el autómata)."""
+        self.state["recent_results"] = self.matcher.recent_results()
         self.db.set_state("pattern_tracker", "progress", self.state)
 
     def process_new_spins(self) -> int:
+        """Procesa desde la BD todos los tiros posteriores al último ID procesado."""
         last_id = self.state.get("last_processed_id", 0)
         new_spins = self.db.get_spins_after_id(last_id)
-        if not new_spins:
-            return 0
-            
-        logger.info(f"📊 Tracker: Procesando {len(new_spins)} tiros nuevos")
-        for spin in new_spins:
-            self._process_spin(spin)
-        
+        return len(self.process_spins(new_spins)[0]) if new_spins else 0
+
+    def process_spins(self, spins: list[dict]) -> tuple[list[dict], list[dict]]:
+        """
+        Procesa tiros ya en memoria (p.ej. recién insertados) sin releerlos de la BD.
+
+        Returns:
+            (tiros procesados, ocurrencias [{"pattern_id", "spin", "distance"}])
+        """
+        last_id = self.state.get("last_processed_id", 0)
+        spins = [s for s in spins if s["id"] > last_id]
+        if not spins:
+            return [], []
+
+        # Si hay un hueco de IDs respecto al último procesado, se completa desde la BD
+        if spins[0]["id"] != last_id + 1:
+            missing = self.db.get_spins_after_id(last_id, limit=spins[0]["id"] - last_id - 1)
+            spins = missing + spins
+
+        logger.info(f"📊 Tracker: Procesando {len(spins)} tiros nuevos")
+        occurrences = []
+        dirty = set()
+        for spin in spins:
+            for pattern, distance in self._process_spin(spin):
+                occurrences.append({"pattern_id": pattern.id, "spin": spin, "distance": distance})
+                dirty.add(pattern.id)
+
         # Al final del lote, actualizamos la distancia de espera actual para todos los patrones
-        last_processed_id = new_spins[-1]["id"]
-        for pattern in ALL_PATTERNS:
-            p_data = self.db.get_state("pattern_tracker", pattern.id, {"last_id": None, "last_distance": 0, "prev_distance": 0})
+        last_processed_id = spins[-1]["id"]
+        for pattern in self.patterns:
+            p_data = self.pattern_states[pattern.id]
             if p_data["last_id"] is not None:
                 # Si el último tiro del lote NO fue el hit de este patrón, calculamos la espera real
                 if p_data["last_id"] < last_processed_id:
                     p_data["last_distance"] = last_processed_id - p_data["last_id"]
-                    self.db.set_state("pattern_tracker", pattern.id, p_data)
-        
+                    dirty.add(pattern.id)
+
+        for pattern_id in dirty:
+            self.db.set_state("pattern_tracker", pattern_id, self.pattern_states[pattern_id])
+        self.db.insert_pattern_occurrences(
+            [(occ["pattern_id"], occ["spin"]["id"], occ["distance"]) for occ in occurrences])
+
         self.state["last_processed_id"] = last_processed_id
         self._save_main_state()
-        return len(new_spins)
+        return spins, occurrences
 
-    def _process_spin(self, spin: dict):
+    def _process_spin(self, spin: dict) -> list[tuple[Pattern, int]]:
         resultado = spin["resultado"]
-        for pattern in ALL_PATTERNS:
-            if pattern.type == "simple" and resultado == pattern.value:
-                self._record_occurrence(pattern, spin)
-        
-        if self.state["last_result"] is not None:
-            for pattern in ALL_PATTERNS:
-                if pattern.type == "sequence":
-                    step1, step2 = pattern.value
-                    if self.state["last_result"] == step1 and resultado == step2:
-                        self._record_occurrence(pattern, spin)
-        
+        hits = [(pattern, self._record_occurrence(pattern, spin)) for pattern in self.matcher.step(resultado)]
+        hits += [(pattern, self._record_occurrence(pattern, spin)) for pattern in self.predicates.match(spin)]
         self.state["last_result"] = resultado
+        return hits
 
-    def _record_occurrence(self, pattern: Pattern, spin: dict):
+    def _record_occurrence(self, pattern: Pattern, spin: dict) -> int:
         current_id = spin["id"]
-        
-        # Obtener estado individual del patrón desde SQLite
-        p_data = self.db.get_state("pattern_tracker", pattern.id, {"last_id": None, "last_distance": 0, "prev_distance": 0})
+
+        p_data = self.pattern_states[pattern.id]
         last_id = p_data.get("last_id")
-        
+
         distance = 0
         if last_id is not None:
             distance = current_id - last_id
@@ -83,13 +252,15 @@ class PatternTracker:
             logger.info(f"⚪ [{pattern.name}] Primera aparición en ID {current_id} (calibrando)")
 
         # MANDATO: En HIT, last_distance = 0 y prev_distance = distancia real
-        new_state = {
+        self.pattern_states[pattern.id] = {
             "last_id": current_id,
             "last_distance": 0,
             "prev_distance": distance
         }
-        self.db.set_state("pattern_tracker", pattern.id, new_state)
+        return distance
 
     def get_pattern_state(self, pattern_id: str) -> dict:
         """Obtiene el estado completo de un patrón."""
-        return self.db.get_state("pattern_tracker", pattern_id, {"last_id": None, "last_distance": 0, "prev_distance": 0})
+        if pattern_id in self.pattern_states:
+            return self.pattern_states[pattern_id]
+        return self.db.get_state("pattern_tracker", pattern_id, dict(DEFAULT_PATTERN_STATE))
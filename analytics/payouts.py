@@ -0,0 +1,29 @@
+"""
+analytics/payouts.py - Pago de una aparición por unidad apostada.
+
+Compartido por el análisis de ventanas (WindowAnalyzer, pool de análisis) y el
+backtester, para que todos valoren un acierto igual.
+"""
+
+from config.patterns import Pattern
+
+def calculate_payout(pattern: Pattern, details: dict) -> float:
+    """
+    Pago de la aparición descrita por `details` (columnas de tiros) por unidad
+    apostada al patrón. Los patrones sin bonus (números, secuencias) pagan 0.
+    """
+    payout = 0
+    kind = pattern.id
+    if pattern.type == "predicate":
+        # Un predicado paga como el bonus que cayó (p.ej. Pachinko con top slot)
+        kind = {"Pachinko": "pachinko", "CrazyTime": "crazytime"}.get(details.get("resultado"))
+    if kind == "pachinko":
+        base = details.get("bonus_multiplier") or 0
+        payout = base * (details.get("top_slot_multiplier") or 1) if details.get("is_top_slot_matched") else base
+    elif kind == "crazytime":
+        blue = details.get("ct_flapper_blue") or 0
+        green = details.get("ct_flapper_green") or 0
+        yellow = details.get("ct_flapper_yellow") or 0
+        base = (blue + green + yellow) / 3
+        payout = base * (details.get("top_slot_multiplier") or 1) if details.get("is_top_slot_matched") else base
+    return payout
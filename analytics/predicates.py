@@ -0,0 +1,126 @@
+"""
+analytics/predicates.py - Patrones por predicado sobre columnas de `tiros`.
+
+Un patrón de tipo "predicate" lleva en `value` una lista de condiciones
+(columna, operador, valor) unidas por AND; una columna puede ser una tupla
+de columnas y la condición se cumple si alguna la cumple (p.ej. cualquier
+flapper ≥ 50x). Las condiciones se compilan a:
+
+  - un evaluador Python generado por resultado: cada tiro hace un lookup por
+    su `resultado` y evalúa solo los predicados que pueden aplicarle, con cada
+    columna leída una vez; añadir predicados de otros resultados no encarece
+    el bucle por tiro.
+  - una cláusula SQL para consultar su historial. Si el predicado fija el
+    resultado ya lo cubre idx_resultado; si no, se crea un índice parcial
+    para no recorrer la tabla.
+"""
+
+import re
+import logging
+from typing import Iterable, Optional
+
+from config.patterns import Pattern
+from core.database import Database
+
+logger = logging.getLogger(__name__)
+
+PREDICATE_COLUMNS = {
+    "resultado", "top_slot_result", "top_slot_multiplier", "is_top_slot_matched",
+    "bonus_multiplier", "ct_flapper_blue", "ct_flapper_green", "ct_flapper_yellow", "latido",
+}
+OPERATORS = {"==": ("==", "="), "!=": ("!=", "!="), ">": (">", ">"), ">=": (">=", ">="),
+             "<": ("<", "<"), "<=": ("<=", "<="), "in": ("in", "IN")}
+
+def predicate_columns(column) -> tuple[str, ...]:
+    """Columnas de una condición: una sola o una tupla (se cumple si lo hace cualquiera)."""
+    return tuple(column) if isinstance(column, (tuple, list)) else (column,)
+
+def _validate(pattern: Pattern):
+    if not pattern.value:
+        raise ValueError(f"Patrón predicado sin condiciones: {pattern.id}")
+    if not re.fullmatch(r"\w+", pattern.id):
+        raise ValueError(f"ID de patrón no válido para índice: {pattern.id}")
+    for column, op, value in pattern.value:
+        unknown = set(predicate_columns(column)) - PREDICATE_COLUMNS
+        if unknown:
+            raise ValueError(f"[{pattern.id}] Columnas no permitidas: {', '.join(sorted(unknown))}")
+        if op not in OPERATORS:
+            raise ValueError(f"[{pattern.id}] Operador no soportado: {op}")
+        literals = value if op == "in" else (value,)
+        if not all(isinstance(v, (int, float, str)) for v in literals):
+            raise ValueError(f"[{pattern.id}] Valor no soportado: {value!r}")
+
+def _sql_literal(value) -> str:
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+def predicate_sql(pattern: Pattern) -> str:
+    """Cláusula WHERE equivalente al predicado (literales en línea, apta para índice parcial)."""
+    _validate(pattern)
+    clauses = []
+    for column, op, value in pattern.value:
+        sql_op = OPERATORS[op][1]
+        literal = ("(" + ", ".join(_sql_literal(v) for v in value) + ")") if op == "in" else _sql_literal(value)
+        terms = [f"{c} {sql_op} {literal}" for c in predicate_columns(column)]
+        clauses.append(terms[0] if len(terms) == 1 else "(" + " OR ".join(terms) + ")")
+    return " AND ".join(clauses)
+
+def result_key(pattern: Pattern) -> Optional[str]:
+    """Resultado exigido por el predicado (`resultado == X`), o None si aplica a cualquiera."""
+    for column, op, value in pattern.value:
+        if column == "resultado" and op == "==":
+            return value
+    return None
+
+
+class PredicateEvaluator:
+    """Evalúa todos los patrones predicado de un tiro con funciones generadas por resultado."""
+
+    def __init__(self, patterns: Iterable[Pattern]):
+        self.patterns = [p for p in patterns if p.type == "predicate"]
+        for pattern in self.patterns:
+            _validate(pattern)
+        generic = [p for p in self.patterns if result_key(p) is None]
+        results = {result_key(p) for p in self.patterns} - {None}
+        self._by_result = {
+            resultado: self._compile([p for p in self.patterns if result_key(p) in (resultado, None)])
+            for resultado in results
+        }
+        self._generic = self._compile(generic)
+
+    def match(self, spin: dict) -> tuple[Pattern, ...]:
+        """Patrones predicado que cumple el tiro (en orden de configuración)."""
+        evaluate = self._by_result.get(spin["resultado"], self._generic)
+        return evaluate(spin) if evaluate else ()
+
+    def _compile(self, patterns: list[Pattern]):
+        if not patterns:
+            return None
+        used = sorted({c for p in patterns for column, _, _ in p.value for c in predicate_columns(column)})
+        local = {column: f"v{i}" for i, column in enumerate(used)}
+        lines = ["def evaluate(spin):", "    get = spin.get"]
+        lines += [f"    {local[c]} = get({c!r})" for c in used]
+        lines.append("    hits = []")
+        for index, pattern in enumerate(patterns):
+            conditions = []
+            for column, op, value in pattern.value:
+                py_op = OPERATORS[op][0]
+                literal = repr(tuple(value)) if op == "in" else repr(value)
+                terms = [f"({local[c]} is not None and {local[c]} {py_op} {literal})" for c in predicate_columns(column)]
+                conditions.append(terms[0] if len(terms) == 1 else "(" + " or ".join(terms) + ")")
+            lines.append(f"    if {' and '.join(conditions)}:")
+            lines.append(f"        hits.append(P{index})")
+        lines.append("    return hits")
+        namespace = {f"P{i}": p for i, p in enumerate(patterns)}
+        exec(compile("\n".join(lines), f"<predicates:{len(patterns)}>", "exec"), namespace)
+        return namespace["evaluate"]
+
+
+def ensure_predicate_indexes(db: Database, patterns: Iterable[Pattern]):
+    """Crea (si faltan) los índices parciales de los predicados que no fijan el resultado."""
+    for pattern in patterns:
+        if pattern.type == "predicate" and result_key(pattern) is None:
+            db.ensure_partial_index(f"idx_pattern_{pattern.id}", predicate_sql(pattern))
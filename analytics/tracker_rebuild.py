@@ -0,0 +1,138 @@
+"""
+analytics/tracker_rebuild.py - Reconstrucción vectorizada del estado del tracker.
+
+Recalcula desde `tiros` el estado que PatternTracker guarda en system_state
+(last_id / last_distance / prev_distance por patrón y la cola del autómata)
+sin re-procesar tiro a tiro:
+
+  - la columna `resultado` se carga una vez como array de códigos y cada
+    patrón de resultado (simple o secuencia de N pasos) se localiza con N
+    comparaciones vectorizadas sobre todo el historial;
+  - los predicados se resuelven en SQLite con su cláusula (idx_resultado o
+    su índice parcial), leyendo solo IDs.
+
+El resultado se compara con lo guardado y, si se pide, se repara. La
+reparación debe hacerse con el servicio parado: el tracker mantiene los
+estados en memoria y los volvería a escribir en el siguiente lote.
+"""
+
+import logging
+from typing import Iterable, Optional
+
+from analytics.pattern_matcher import PatternMatcher, pattern_symbols
+from analytics.pattern_registry import PatternRegistry
+from analytics.pattern_tracker import DEFAULT_PATTERN_STATE
+from analytics.predicates import predicate_sql
+from config.patterns import Pattern
+from core.database import Database
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+logger = logging.getLogger(__name__)
+
+STATE_FIELDS = ("last_id", "last_distance", "prev_distance")
+
+def find_occurrences(codes, symbols: tuple[int, ...]):
+    """Posiciones (índice del último paso) donde termina la secuencia de códigos dada."""
+    n, k = len(codes), len(symbols)
+    if k > n:
+        return np.empty(0, dtype=np.int64)
+    mask = codes[:n - k + 1] == symbols[0]
+    for offset, symbol in enumerate(symbols[1:], start=1):
+        mask &= codes[offset:n - k + 1 + offset] == symbol
+    return np.flatnonzero(mask) + (k - 1)
+
+def state_from_occurrences(occurrence_ids, through_id: int) -> dict:
+    """Estado del tracker tras procesar hasta `through_id` dadas las apariciones (IDs crecientes)."""
+    if len(occurrence_ids) == 0:
+        return dict(DEFAULT_PATTERN_STATE)
+    last_id = int(occurrence_ids[-1])
+    return {
+        "last_id": last_id,
+        "last_distance": through_id - last_id,
+        "prev_distance": last_id - int(occurrence_ids[-2]) if len(occurrence_ids) > 1 else 0,
+    }
+
+def rebuild_tracker_state(db: Database, patterns: Optional[Iterable[Pattern]] = None,
+                          through_id: Optional[int] = None) -> dict:
+    """
+    Reconstruye el estado del tracker hasta `through_id` (por defecto, el último
+    tiro que el tracker dice haber procesado; si no hay progreso, el último tiro)
+    para `patterns` (por defecto, los activos del registro).
+
+    Returns:
+        {"through_id", "progress", "patterns": {id: estado}, "occurrences": {id: array de IDs}}
+    """
+    if not HAS_NUMPY:
+        raise RuntimeError("numpy no está instalado (pip install numpy)")
+    patterns = list(patterns) if patterns is not None else PatternRegistry(db).load()
+    if through_id is None:
+        through_id = db.get_state("pattern_tracker", "progress", {}).get("last_processed_id") or db.get_max_id() or 0
+
+    rows = db.get_spin_results(through_id)
+    ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+    alphabet: dict[str, int] = {}
+    codes = np.fromiter((alphabet.setdefault(r[1], len(alphabet)) for r in rows), dtype=np.int32, count=len(rows))
+    through_id = int(ids[-1]) if len(ids) else 0
+
+    occurrences = {}
+    for pattern in patterns:
+        if pattern.type == "predicate":
+            occurrences[pattern.id] = np.asarray(db.get_spin_ids_where(predicate_sql(pattern), through_id), dtype=np.int64)
+            continue
+        symbols = pattern_symbols(pattern)
+        if any(s not in alphabet for s in symbols):
+            occurrences[pattern.id] = np.empty(0, dtype=np.int64)
+        else:
+            occurrences[pattern.id] = ids[find_occurrences(codes, tuple(alphabet[s] for s in symbols))]
+
+    # Cola del autómata: basta re-inyectar los últimos max_length resultados
+    matcher = PatternMatcher([p for p in patterns if p.type != "predicate"])
+    results = list(alphabet)
+    recent = [results[c] for c in codes[-matcher.max_length:]] if len(codes) else []
+    matcher.restore(recent)
+    progress = {
+        "last_processed_id": through_id,
+        "last_result": recent[-1] if recent else None,
+        "recent_results": matcher.recent_results(),
+    }
+
+    logger.info(f"🧮 Reconstrucción: {len(rows)} tiros, {len(patterns)} patrones hasta ID {through_id}")
+    return {
+        "through_id": through_id,
+        "progress": progress,
+        "patterns": {pid: state_from_occurrences(occ, through_id) for pid, occ in occurrences.items()},
+        "occurrences": occurrences,
+    }
+
+def diff_tracker_state(db: Database, rebuilt: dict) -> list[dict]:
+    """Diferencias entre el estado guardado y el reconstruido ({"key", "field", "stored", "rebuilt"})."""
+    diffs = []
+    stored_progress = db.get_state("pattern_tracker", "progress", {})
+    for field in ("last_processed_id", "last_result", "recent_results"):
+        if field in stored_progress and stored_progress[field] != rebuilt["progress"][field]:
+            diffs.append({"key": "progress", "field": field,
+                          "stored": stored_progress[field], "rebuilt": rebuilt["progress"][field]})
+    for pattern_id, state in rebuilt["patterns"].items():
+        stored = db.get_state("pattern_tracker", pattern_id, dict(DEFAULT_PATTERN_STATE))
+        for field in STATE_FIELDS:
+            if stored.get(field) != state[field]:
+                diffs.append({"key": pattern_id, "field": field, "stored": stored.get(field), "rebuilt": state[field]})
+    return diffs
+
+def repair_tracker_state(db: Database, rebuilt: dict, diffs: list[dict]) -> int:
+    """Sobrescribe en system_state las claves con diferencias. Devuelve cuántas se escribieron."""
+    keys = sorted({d["key"] for d in diffs})
+    for key in keys:
+        if key == "progress":
+            progress = db.get_state("pattern_tracker", "progress", {})
+            progress.update(rebuilt["progress"])
+            db.set_state("pattern_tracker", "progress", progress)
+        else:
+            db.set_state("pattern_tracker", key, rebuilt["patterns"][key])
+        logger.warning(f"🔧 Estado del tracker reparado: {key}")
+    return len(keys)
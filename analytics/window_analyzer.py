@@ -7,9 +7,16 @@ import json
 import logging
 import statistics
 from datetime import datetime
-from typing import Optional, List, Dict
+from contextlib import closing
+from itertools import takewhile
+from typing import Iterable, Iterator, Optional, List, Dict
 
-from config.patterns import Pattern, VIP_PATTERNS, get_window_range
+from analytics.bootstrap import attach_confidence_intervals, format_ci
+from analytics.pattern_registry import PatternRegistry, pattern_fingerprint
+from analytics.payouts import calculate_payout
+from analytics.predicates import ensure_predicate_indexes, predicate_sql
+from analytics.window_grid import window_grid, DEFAULT_MAX_START, DEFAULT_MAX_WIDTH
+from config.patterns import Pattern, get_window_range
 from core.database import Database
 
 try:
@@ -21,28 +28,198 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+def iter_occurrences(db: Database, pattern: Pattern, after_id: int = 0, chunk_size: int = 5000) -> Iterator[Dict]:
+    """
+    Apariciones del patrón (posteriores a `after_id`) con sus detalles de la tabla
+    tiros, en streaming por bloques y con una conexión de solo lectura.
+    """
+    columns = """t.id as spin_id, t.timestamp, t.resultado,
+                 t.bonus_multiplier, t.top_slot_multiplier, t.is_top_slot_matched,
+                 t.ct_flapper_blue, t.ct_flapper_green, t.ct_flapper_yellow"""
+    with closing(db.get_connection(read_only=True)) as conn:
+        if pattern.type == "predicate":
+            # Historial por índice parcial del predicado
+            cur = conn.execute(f"""
+                SELECT {columns} FROM tiros t
+                WHERE {predicate_sql(pattern)} AND t.id > ? ORDER BY t.id ASC
+            """, (after_id,))
+        elif pattern.type == "sequence":
+            # Las secuencias se leen del historial del tracker (pattern_occurrences)
+            cur = conn.execute(f"""
+                SELECT {columns}
+                FROM pattern_occurrences o JOIN tiros t ON t.id = o.spin_id
+                WHERE o.pattern_id = ? AND o.spin_id > ? ORDER BY o.spin_id ASC
+            """, (pattern.id, after_id))
+        else:
+            cur = conn.execute(f"""
+                SELECT {columns}
+                FROM tiros t WHERE t.resultado = ? AND t.id > ? ORDER BY t.id ASC
+            """, (pattern.value, after_id))
+
+        previous = after_id
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                d = dict(row)
+                # Calcular distancia cronológica
+                d["distance_from_previous"] = (row["spin_id"] - previous) if previous else None
+                previous = row["spin_id"]
+                # Formatear detalles para compatibilidad con lógica de pago
+                d["details"] = {
+                    "bonus_multiplier": d.get("bonus_multiplier"),
+                    "top_slot_multiplier": d.get("top_slot_multiplier"),
+                    "is_top_slot_matched": d.get("is_top_slot_matched"),
+                    "ct_flapper_blue": d.get("ct_flapper_blue"),
+                    "ct_flapper_green": d.get("ct_flapper_green"),
+                    "ct_flapper_yellow": d.get("ct_flapper_yellow"),
+                    "resultado": d.get("resultado")
+                }
+                yield d
+
+def pattern_streaks(pattern: Pattern, occurrences: Iterable[dict]) -> tuple[list[int], list[float]]:
+    """Distancia de cada racha y pago de la aparición que la cierra."""
+    hits = [o for o in occurrences if o["distance_from_previous"] is not None]
+    return ([o["distance_from_previous"] for o in hits],
+            [calculate_payout(pattern, o["details"]) for o in hits])
+
 class WindowAnalyzer:
     """Analizador histórico de rentabilidad de ventanas usando la BD."""
 
     def __init__(self, db_path: str = "data/db.sqlite3"):
         self.db = Database(db_path)
         self.results_dir = "data/analytics"
-        os.makedirs(self.results_dir, exist_ok=True)
+        self.registry = PatternRegistry(self.db)
+        self.patterns = self.registry.load()
+        ensure_predicate_indexes(self.db, self.patterns)
+        # Rachas (distancias y pagos) de cada patrón para el bootstrap, ampliadas con cada
+        # aparición nueva en update_aggregates: {pattern_id: {"fingerprint", "last_spin_id", ...}}
+        self._streak_cache: dict[str, dict] = {}
 
-    def analyze_all_patterns(self) -> dict:
+    def refresh_patterns(self) -> bool:
+        """Recarga los patrones si cambió el registro (para un analizador de larga vida)."""
+        if not self.registry.refresh():
+            return False
+        self.patterns = self.registry.patterns
+        ensure_predicate_indexes(self.db, self.patterns)
+        return True
+
+    def _analyzed_patterns(self) -> list[Pattern]:
+        # Los predicados entran en el análisis periódico si definen umbrales de estudio
+        return [p for p in self.patterns
+                if p.alert_level == "vip" or (p.type == "predicate" and p.warning_thresholds)]
+
+    def analyze_all_patterns(self, executor=None, force: bool = False) -> dict:
+        """
+        Análisis completo con reportes (JSON/Excel). Solo se recalculan y reescriben
+        los de patrones cuyas entradas cambiaron (última aparición, definición,
+        umbrales); el resto se lee de su JSON. Con un AnalysisExecutor las métricas
+        se calculan en paralelo por patrón.
+        """
         logger.info("📊 Iniciando análisis de ventanas histórico (Pure SQLite)...")
+        os.makedirs(self.results_dir, exist_ok=True)
+        patterns = self._analyzed_patterns()
+        fingerprints = {p.id: self._artifact_fingerprint(p) for p in patterns}
+        cached = {}
+        if not force:
+            for pattern in patterns:
+                results = self._load_pattern_report(pattern, fingerprints[pattern.id])
+                if results is not None:
+                    cached[pattern.id] = results
+        stale = [p for p in patterns if p.id not in cached]
+        computed = executor.window_metrics(stale) if executor is not None and stale else {}
+
         all_results = {}
-        for pattern in VIP_PATTERNS:
-            results = self.analyze_pattern(pattern)
-            all_results[pattern.id] = results
-        self._save_consolidated_report(all_results)
+        for pattern in patterns:
+            if pattern.id in cached:
+                logger.info(f"⏭️ {pattern.name}: sin apariciones nuevas, reportes vigentes")
+                all_results[pattern.id] = cached[pattern.id]
+            else:
+                all_results[pattern.id] = self.analyze_pattern(pattern, computed.get(pattern.id),
+                                                               fingerprints[pattern.id])
+        if stale or not os.path.exists(os.path.join(self.results_dir, "window_analysis_full.json")):
+            self._save_consolidated_report(all_results)
         return all_results
 
-    def analyze_pattern(self, pattern: Pattern) -> dict:
+    def update_aggregates(self) -> dict:
+        """
+        Actualiza los agregados de ventanas (window_aggregates) solo con las
+        apariciones posteriores al checkpoint de cada patrón, sin releer el
+        historial ni regenerar reportes. Si cambian la definición o los umbrales
+        del patrón, sus agregados se recalculan desde cero una vez.
+
+        Los patrones con apariciones nuevas llevan además win_rate_ci / roi_ci
+        (bootstrap, ver analytics/bootstrap.py). Sus rachas se guardan en memoria
+        y se amplían con las apariciones nuevas, así que el historial solo se lee
+        una vez por proceso; el coste del bootstrap ya está acotado (MAX_ELEMENTS).
+
+        Returns:
+            {pattern_id: {"pattern_id", "pattern_name", "windows": {rango: métricas}, "new_occurrences"}}
+        """
+        all_results = {}
+        for pattern in self._analyzed_patterns():
+            fingerprint = json.dumps([pattern_fingerprint(pattern), sorted(pattern.warning_thresholds)])
+            checkpoint = self.db.get_state("window_analyzer", pattern.id, None)
+            aggregates = {a["threshold"]: a for a in self.db.get_window_aggregates(pattern.id)}
+            if not checkpoint or checkpoint.get("fingerprint") != fingerprint:
+                checkpoint = {"last_spin_id": 0, "fingerprint": fingerprint}
+                aggregates = {}
+            for threshold in pattern.warning_thresholds:
+                if threshold not in aggregates:
+                    w_start, w_end = get_window_range(threshold)
+                    aggregates[threshold] = {"threshold": threshold, "w_start": w_start, "w_end": w_end,
+                                             "entries": 0, "wins": 0, "total_payout": 0.0}
+
+            streaks = self._cached_streaks(pattern, fingerprint, checkpoint["last_spin_id"])
+            occurrences = self._get_occurrences_from_db(pattern, after_id=checkpoint["last_spin_id"])
+            for occ in occurrences:
+                dist = occ["distance_from_previous"]
+                if dist is None:
+                    continue
+                for agg in aggregates.values():
+                    if dist >= agg["w_start"]:
+                        agg["entries"] += 1
+                        if dist <= agg["w_end"]:
+                            agg["wins"] += 1
+                            agg["total_payout"] += calculate_payout(pattern, occ["details"])
+
+            if occurrences or not checkpoint["last_spin_id"]:
+                if occurrences:
+                    checkpoint["last_spin_id"] = occurrences[-1]["spin_id"]
+                self.db.save_window_aggregates(pattern.id, list(aggregates.values()), checkpoint)
+
+            windows = {f"[{a['w_start']}-{a['w_end']}]": self._window_metrics(
+                           a["w_start"], a["w_end"], a["entries"], a["wins"], a["total_payout"])
+                       for a in sorted(aggregates.values(), key=lambda a: a["threshold"])}
+            if occurrences:
+                distances, payouts = pattern_streaks(pattern, occurrences)
+                streaks["distances"].extend(distances)
+                streaks["payouts"].extend(payouts)
+                streaks["last_spin_id"] = occurrences[-1]["spin_id"]
+                attach_confidence_intervals(windows, streaks["distances"], streaks["payouts"])
+            all_results[pattern.id] = {
+                "pattern_id": pattern.id,
+                "pattern_name": pattern.name,
+                "windows": windows,
+                "new_occurrences": len(occurrences),
+            }
+        return all_results
+
+    def analyze_pattern(self, pattern: Pattern, computed: Optional[dict] = None,
+                        fingerprint: Optional[str] = None) -> dict:
+        """
+        `computed`: métricas ya calculadas por el pool (AnalysisExecutor.window_metrics);
+        en ese caso las apariciones solo se recorren en streaming para el Excel.
+        `fingerprint`: entradas del análisis (_artifact_fingerprint), calculadas antes de leerlas.
+        """
         logger.info(f"🔍 Analizando ventanas para {pattern.name}...")
-        
-        # 1. Obtener todas las ocurrencias desde la BD
-        occurrences = self._get_occurrences_from_db(pattern)
+        os.makedirs(self.results_dir, exist_ok=True)
+        fingerprint = fingerprint or self._artifact_fingerprint(pattern)
+
+        # 1. Obtener todas las ocurrencias desde la BD (con métricas del pool basta su número)
+        occurrences = None if computed is not None else self._get_occurrences_from_db(pattern)
+        count = computed["occurrences"] if computed is not None else len(occurrences)
         
         results = {
             "pattern_id": pattern.id,
@@ -51,52 +228,88 @@ class WindowAnalyzer:
             "analyzed_at": datetime.now().isoformat()
         }
 
-        if len(occurrences) < 2:
+        if count < 2:
             logger.warning(f"⚠️ Datos insuficientes para {pattern.name}")
             return results
             
         # 2. Analizar cada ventana configurada
         for threshold in pattern.warning_thresholds:
-            window_result = self._analyze_window_zone(pattern, threshold, occurrences)
+            if computed is not None:
+                w_start, w_end = get_window_range(threshold)
+                window_result = computed["windows"][f"[{w_start}-{w_end}]"]
+            else:
+                window_result = self._analyze_window_zone(pattern, threshold, occurrences)
             window_key = window_result['window_range']
             results["windows"][window_key] = window_result
+
+        if computed is None:
+            attach_confidence_intervals(results["windows"], *pattern_streaks(pattern, occurrences))
+        for window_key, window_result in results["windows"].items():
+            logger.info(f"  Ventana {window_key}: Win Rate={window_result['win_rate']:.1f}%, "
+                        f"ROI={window_result['roi']:+.1f}%{format_ci(window_result)}")
             
-            logger.info(f"  Ventana {window_key}: Win Rate={window_result['win_rate']:.1f}%, ROI={window_result['roi']:+.1f}%")
-            
-        self._save_pattern_report(pattern, results)
         if HAS_OPENPYXL:
-            self._generate_excel_report(pattern, results, occurrences)
+            self._generate_excel_report(pattern, results,
+                                        occurrences if occurrences is not None else self._iter_occurrences(pattern))
+        # El JSON va al final: su presencia con la huella guardada marca los reportes como completos
+        self._save_pattern_report(pattern, results)
+        self.db.set_state("window_artifacts", pattern.id, {"fingerprint": fingerprint})
             
         return results
 
-    def _get_occurrences_from_db(self, pattern: Pattern) -> List[Dict]:
-        """Extrae todas las apariciones y sus detalles de la tabla tiros."""
-        with self.db.get_connection(read_only=True) as conn:
-            cur = conn.cursor()
-            cur.execute("""
-                SELECT id as spin_id, timestamp, resultado,
-                       bonus_multiplier, top_slot_multiplier, is_top_slot_matched,
-                       ct_flapper_blue, ct_flapper_green, ct_flapper_yellow
-                FROM tiros WHERE resultado = ? ORDER BY id ASC
-            """, (pattern.value,))
-            rows = cur.fetchall()
-            
-            occs = []
-            for i, row in enumerate(rows):
-                d = dict(row)
-                # Calcular distancia cronológica
-                d["distance_from_previous"] = (row["spin_id"] - rows[i-1]["spin_id"]) if i > 0 else None
-                # Formatear detalles para compatibilidad con lógica de pago
-                d["details"] = {
-                    "bonus_multiplier": d.get("bonus_multiplier"),
-                    "top_slot_multiplier": d.get("top_slot_multiplier"),
-                    "is_top_slot_matched": d.get("is_top_slot_matched"),
-                    "ct_flapper_blue": d.get("ct_flapper_blue"),
-                    "ct_flapper_green": d.get("ct_flapper_green"),
-                    "ct_flapper_yellow": d.get("ct_flapper_yellow")
-                }
-                occs.append(d)
-            return occs
+    def _artifact_fingerprint(self, pattern: Pattern) -> str:
+        """Entradas de los reportes de un patrón: definición, umbrales y última aparición."""
+        if pattern.type == "predicate":
+            last_id = self.db.get_max_id_where(predicate_sql(pattern))
+        elif pattern.type == "sequence":
+            last_id = self.db.get_last_pattern_occurrence_id(pattern.id)
+        else:
+            last_id = self.db.get_last_occurrence_id(pattern.value)
+        return json.dumps([pattern_fingerprint(pattern), pattern.name, sorted(pattern.warning_thresholds),
+                           last_id, HAS_OPENPYXL])
+
+    def _load_pattern_report(self, pattern: Pattern, fingerprint: str) -> Optional[dict]:
+        """Reporte vigente del patrón (misma huella y ficheros presentes), o None si hay que regenerarlo."""
+        state = self.db.get_state("window_artifacts", pattern.id, None)
+        if not state or state.get("fingerprint") != fingerprint:
+            return None
+        filepath = os.path.join(self.results_dir, f"{pattern.id}_window_analysis.json")
+        excel = os.path.join(self.results_dir, f"{pattern.id}_history.xlsx")
+        if HAS_OPENPYXL and not os.path.exists(excel):
+            return None
+        try:
+            with open(filepath) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def window_grid(self, pattern: Pattern, max_start: int = DEFAULT_MAX_START,
+                    max_width: int = DEFAULT_MAX_WIDTH) -> dict:
+        """Métricas de todas las ventanas candidatas del patrón (ver analytics/window_grid.py)."""
+        return window_grid(*pattern_streaks(pattern, self._get_occurrences_from_db(pattern)), max_start, max_width)
+
+    def _cached_streaks(self, pattern: Pattern, fingerprint: str, through_id: int) -> dict:
+        """Rachas del patrón hasta la aparición `through_id` (el checkpoint); se releen si no cuadran."""
+        cached = self._streak_cache.get(pattern.id)
+        if cached is None or cached["fingerprint"] != fingerprint or cached["last_spin_id"] != through_id:
+            history = takewhile(lambda o: o["spin_id"] <= through_id, self._iter_occurrences(pattern))
+            distances, payouts = pattern_streaks(pattern, list(history)) if through_id else ([], [])
+            cached = {"fingerprint": fingerprint, "last_spin_id": through_id,
+                      "distances": distances, "payouts": payouts}
+            self._streak_cache[pattern.id] = cached
+        return cached
+
+    def _get_occurrences_from_db(self, pattern: Pattern, after_id: int = 0) -> List[Dict]:
+        """
+        Extrae las apariciones (posteriores a `after_id`) y sus detalles de la
+        tabla tiros. `after_id`, si se da, es la aparición anterior: la primera
+        devuelta lleva su distancia respecto a ella.
+        """
+        return list(self._iter_occurrences(pattern, after_id))
+
+    def _iter_occurrences(self, pattern: Pattern, after_id: int = 0, chunk_size: int = 5000) -> Iterator[Dict]:
+        """Como _get_occurrences_from_db, pero en streaming por bloques (memoria constante)."""
+        return iter_occurrences(self.db, pattern, after_id, chunk_size)
 
     def _analyze_window_zone(self, pattern: Pattern, threshold: int, occurrences: list[dict]) -> dict:
         w_start, w_end = get_window_range(threshold)
@@ -110,8 +323,12 @@ class WindowAnalyzer:
                 entries += 1
                 if dist <= w_end:
                     wins += 1
-                    total_payout += self._calculate_payout(pattern, occurrences[i+1]["details"])
+                    total_payout += calculate_payout(pattern, occurrences[i+1]["details"])
 
+        return self._window_metrics(w_start, w_end, entries, wins, total_payout)
+
+    @staticmethod
+    def _window_metrics(w_start: int, w_end: int, entries: int, wins: int, total_payout: float) -> dict:
         win_rate = (wins / entries * 100) if entries > 0 else 0
         window_size = (w_end - w_start + 1)
         total_invested = entries * window_size 
@@ -128,34 +345,30 @@ class WindowAnalyzer:
             "profit_loss": round(profit_loss, 2)
         }
 
-    def _calculate_payout(self, pattern: Pattern, details: dict) -> float:
-        payout = 0
-        if pattern.id == "pachinko":
-            base = details.get("bonus_multiplier") or 0
-            payout = base * (details.get("top_slot_multiplier") or 1) if details.get("is_top_slot_matched") else base
-        elif pattern.id == "crazytime":
-            blue = details.get("ct_flapper_blue") or 0
-            green = details.get("ct_flapper_green") or 0
-            yellow = details.get("ct_flapper_yellow") or 0
-            base = (blue + green + yellow) / 3
-            payout = base * (details.get("top_slot_multiplier") or 1) if details.get("is_top_slot_matched") else base
-        return payout
-
     def _save_pattern_report(self, pattern: Pattern, results: dict):
         filepath = os.path.join(self.results_dir, f"{pattern.id}_window_analysis.json")
-        with open(filepath, "w") as f:
-            json.dump(results, f, indent=2)
+        self._write_atomic(filepath, lambda f: json.dump(results, f, indent=2))
 
     def _save_consolidated_report(self, all_results: dict):
         filepath = os.path.join(self.results_dir, "window_analysis_full.json")
-        with open(filepath, "w") as f:
-            json.dump(all_results, f, indent=2)
+        self._write_atomic(filepath, lambda f: json.dump(all_results, f, indent=2))
 
-    def _generate_excel_report(self, pattern: Pattern, results: dict, occurrences: list[dict]):
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Historial"
+    def _generate_excel_report(self, pattern: Pattern, results: dict, occurrences: Iterable[dict]):
+        # write_only: cada fila se serializa al añadirla, sin guardar celdas en memoria
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Historial")
         ws.append(["ID", "Fecha", "Distancia", "Resultado"])
+        ranges = [get_window_range(t) for t in pattern.warning_thresholds]
         for o in occurrences:
-            ws.append([o["spin_id"], o["timestamp"], o["distance_from_previous"], "WIN" if o["distance_from_previous"] and any(get_window_range(t)[0] <= o["distance_from_previous"] <= get_window_range(t)[1] for t in pattern.warning_thresholds) else "-"])
-        wb.save(os.path.join(self.results_dir, f"{pattern.id}_history.xlsx"))
+            dist = o["distance_from_previous"]
+            ws.append([o["spin_id"], o["timestamp"], dist,
+                       "WIN" if dist and any(w_start <= dist <= w_end for w_start, w_end in ranges) else "-"])
+        self._write_atomic(os.path.join(self.results_dir, f"{pattern.id}_history.xlsx"), wb.save, binary=True)
+
+    @staticmethod
+    def _write_atomic(filepath: str, write, binary: bool = False):
+        """Escribe en un temporal y lo renombra: un lector nunca ve el fichero a medias."""
+        tmp = f"{filepath}.tmp"
+        with open(tmp, "wb" if binary else "w") as f:
+            write(f)
+        os.replace(tmp, filepath)
@@ -0,0 +1,115 @@
+"""
+analytics/window_grid.py - Búsqueda vectorizada de ventanas de apuesta.
+
+Evalúa de una vez todas las ventanas candidatas [inicio, inicio + ancho - 1]
+(inicio 1..max_start, ancho 1..max_width) con la misma regla que
+WindowAnalyzer._analyze_window_zone: se entra en la ventana si la racha llega
+a su inicio, se gana si termina dentro, y se invierte una unidad por tiro de
+la ventana.
+
+Con las distancias en un histograma y sus sumas acumuladas (conteos y pagos),
+cada celda sale por diferencia de prefijos:
+
+    entradas(s)    = N - C[s]
+    aciertos(s, w) = C[s + w] - C[s]
+    pago(s, w)     = P[s + w] - P[s]
+
+así que el coste es O(max_distancia + max_start * max_width), sin importar
+cuántas apariciones haya.
+"""
+
+import csv
+import io
+import logging
+from typing import Iterable
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_START = 400
+DEFAULT_MAX_WIDTH = 120
+
+def window_grid(distances: Iterable[int], payouts: Iterable[float],
+                max_start: int = DEFAULT_MAX_START, max_width: int = DEFAULT_MAX_WIDTH) -> dict:
+    """
+    Métricas de todas las ventanas a partir de las distancias entre apariciones
+    y el pago de cada una (si cayera dentro de la ventana).
+
+    Returns:
+        {"starts", "widths", "entries" (S,), "wins" (S, W), "payout" (S, W),
+         "win_rate" (S, W), "roi" (S, W)}; win_rate/roi son NaN sin entradas.
+    """
+    if not HAS_NUMPY:
+        raise RuntimeError("numpy no está instalado (pip install numpy)")
+    distances = np.asarray(list(distances), dtype=np.int64)
+    payouts = np.asarray(list(payouts), dtype=np.float64)
+    size = max(int(distances.max()) if len(distances) else 0, max_start + max_width) + 1
+
+    # C[k] / P[k]: apariciones y pago acumulado con distancia < k
+    counts = np.bincount(distances, minlength=size)
+    paid = np.bincount(distances, weights=payouts, minlength=size)
+    C = np.concatenate(([0], np.cumsum(counts)))
+    P = np.concatenate(([0.0], np.cumsum(paid)))
+
+    starts = np.arange(1, max_start + 1)
+    widths = np.arange(1, max_width + 1)
+    ends = starts[:, None] + widths[None, :]  # e + 1
+    entries = len(distances) - C[starts]
+    wins = C[ends] - C[starts][:, None]
+    payout = P[ends] - P[starts][:, None]
+
+    invested = entries[:, None] * widths[None, :]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        roi = np.where(invested > 0, (payout - invested) / invested * 100, np.nan)
+        win_rate = np.where(entries[:, None] > 0, wins / entries[:, None] * 100, np.nan)
+    return {"starts": starts, "widths": widths, "entries": entries, "wins": wins,
+            "payout": payout, "win_rate": win_rate, "roi": roi}
+
+def best_windows(grid: dict, min_entries: int = 30, top: int = 10) -> list[dict]:
+    """Mejores ventanas por ROI con al menos `min_entries` entradas."""
+    roi = np.where(grid["entries"][:, None] >= min_entries, grid["roi"], np.nan)
+    flat = np.argsort(np.nan_to_num(roi, nan=-np.inf), axis=None)[::-1][:top]
+    windows = []
+    for i, j in zip(*np.unravel_index(flat, roi.shape)):
+        if np.isnan(roi[i, j]):
+            break
+        windows.append(_cell(grid, i, j))
+    return windows
+
+def window_cell(grid: dict, start: int, end: int) -> dict:
+    """Métricas de una ventana concreta de la rejilla (p.ej. una betting_window configurada)."""
+    return _cell(grid, start - 1, end - start)
+
+def _cell(grid: dict, i: int, j: int) -> dict:
+    start, width = int(grid["starts"][i]), int(grid["widths"][j])
+    entries, wins = int(grid["entries"][i]), int(grid["wins"][i, j])
+    invested = entries * width
+    return {
+        "start": start, "end": start + width - 1, "width": width,
+        "entries": entries, "wins": wins,
+        "win_rate": round(float(grid["win_rate"][i, j]), 2) if entries else None,
+        "roi": round(float(grid["roi"][i, j]), 2) if invested else None,
+        "profit_loss": round(float(grid["payout"][i, j]) - invested, 2),
+    }
+
+def grid_heatmap(grid: dict) -> list[list]:
+    """Matriz de ROI (filas = inicio, columnas = ancho) redondeada a 1 decimal; None sin entradas."""
+    roi = np.round(grid["roi"], 1)
+    return [[None if np.isnan(v) else float(v) for v in row] for row in roi]
+
+def grid_to_csv(grid: dict) -> str:
+    """Todas las celdas en formato largo (una fila por ventana)."""
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(["start", "end", "width", "entries", "wins", "win_rate", "roi", "profit_loss"])
+    for i in range(len(grid["starts"])):
+        for j in range(len(grid["widths"])):
+            cell = _cell(grid, i, j)
+            writer.writerow([cell[k] if cell[k] is not None else "" for k in
+                             ("start", "end", "width", "entries", "wins", "win_rate", "roi", "profit_loss")])
+    return out.getvalue()
@@ -9,8 +9,10 @@ from typing import Literal, List, Tuple
 class Pattern:
     id: str
     name: str
-    type: Literal["simple", "sequence"]
-    value: str | list[str]
+    type: Literal["simple", "sequence", "predicate"]
+    # simple: resultado; sequence: resultados consecutivos;
+    # predicate: condiciones [(columna | (columnas...), operador, valor)] unidas por AND
+    value: str | list[str] | list[tuple]
     # Nuevos campos desacoplados
     warning_thresholds: List[int] = field(default_factory=list)
     betting_windows: List[Tuple[int, int]] = field(default_factory=list)
@@ -63,9 +65,33 @@ SECUENCIA_5_2 = Pattern(
     description="Secuencia"
 )
 
+# Patrones por predicado sobre columnas de tiros (analytics/predicates.py)
+PACHINKO_TOP_SLOT = Pattern(
+    id="pachinko_ts", name="Pachinko con Top Slot", type="predicate",
+    value=[("resultado", "==", "Pachinko"), ("is_top_slot_matched", "==", True)],
+    alert_level="tracking",
+    description="Pachinko con multiplicador de top slot aplicado"
+)
+
+TOP_SLOT_10X = Pattern(
+    id="top_slot_10x", name="Top Slot ≥10x", type="predicate",
+    value=[("top_slot_multiplier", ">=", 10)],
+    alert_level="tracking",
+    description="Cualquier resultado con top slot de 10x o más"
+)
+
+CRAZYTIME_FLAPPER_50 = Pattern(
+    id="crazytime_flapper_50", name="Crazy Time flapper ≥50x", type="predicate",
+    value=[("resultado", "==", "CrazyTime"),
+           (("ct_flapper_blue", "ct_flapper_green", "ct_flapper_yellow"), ">=", 50)],
+    alert_level="tracking",
+    description="Crazy Time con algún flapper de 50x o más"
+)
+
 VIP_PATTERNS = [PACHINKO, CRAZYTIME]
 TRACKING_PATTERNS = [NUMERO_10, SECUENCIA_2_5, SECUENCIA_5_2]
-ALL_PATTERNS = VIP_PATTERNS + TRACKING_PATTERNS
+PREDICATE_PATTERNS = [PACHINKO_TOP_SLOT, TOP_SLOT_10X, CRAZYTIME_FLAPPER_50]
+ALL_PATTERNS = VIP_PATTERNS + TRACKING_PATTERNS + PREDICATE_PATTERNS
 PATTERNS_BY_ID = {p.id: p for p in ALL_PATTERNS}
 
 PATTERN_IMAGES = {
@@ -2,26 +2,94 @@
 core/api_client.py - Cliente HTTP para API de CasinoScores con soporte de paginación.
 """
 
+import os
 import time
 import logging
+import threading
 import requests
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from typing import Optional
 
+from core.telemetry import API_SECONDS, API_RESPONSES
+
 logger = logging.getLogger(__name__)
 
+class LatencyTracker:
+    """Ventana deslizante de latencias observadas (segundos) con percentiles."""
+
+    def __init__(self, maxlen: int = 256):
+        self._samples = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        idx = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+        return ordered[idx]
+
 class APIClient:
     """Cliente HTTP robusto para API de CasinoScores"""
 
     BASE_URL = "https://api.casinoscores.com/svc-evolution-game-events/api/crazytime"
+    HEDGE_MIN_SAMPLES = 10
     
-    def __init__(self, max_retries: int = 5, timeout: int = 15):
+    def __init__(self, max_retries: int = 5, timeout: int = 15, base_url: Optional[str] = None,
+                 hedge_percentile: Optional[float] = 0.95, max_hedge_ratio: float = 0.1,
+                 hedge_initial_delay: float = 3.0, hedge_min_delay: float = 0.2):
         self.max_retries = max_retries
         self.timeout = timeout
+        # Permite apuntar a un stand-in local (benchmarks / pruebas offline)
+        self.base_url = base_url or os.getenv("CRAZYTIME_API_URL") or self.BASE_URL
+        self.request_count = 0
+        self.retry_count = 0
+
+        # Hedged requests: duplicar la petición si no responde antes del percentil observado.
+        # hedge_percentile=None desactiva el mecanismo.
+        self.hedge_percentile = hedge_percentile
+        self.max_hedge_ratio = max_hedge_ratio
+        self.hedge_initial_delay = hedge_initial_delay
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_count = 0
+        self.hedge_wins = 0
+        self.latency = LatencyTracker()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._counter_lock = threading.Lock()
+
+    def hedge_delay(self) -> float:
+        """Retardo antes de emitir la petición duplicada (se adapta a la latencia observada)."""
+        if len(self.latency) < self.HEDGE_MIN_SAMPLES:
+            return self.hedge_initial_delay
+        observed = self.latency.percentile(self.hedge_percentile)
+        return min(float(self.timeout), max(self.hedge_min_delay, observed))
+
+    def latency_stats(self) -> dict:
+        """Resumen de latencia de fetch (ms) y uso de hedging."""
+        p50 = self.latency.percentile(0.5)
+        p99 = self.latency.percentile(0.99)
+        return {
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p99_ms": round(p99 * 1000, 1) if p99 is not None else None,
+            "samples": len(self.latency),
+            "requests": self.request_count,
+            "retries": self.retry_count,
+            "hedges": self.hedge_count,
+            "hedge_wins": self.hedge_wins,
+        }
 
     def fetch(self, page: int = 0, size: int = 10) -> list[dict]:
         # Construcción dinámica de URL
         url = (
-            f"{self.BASE_URL}"
+            f"{self.base_url}"
             f"?page={page}&size={size}"
             "&sort=data.settledAt,desc&duration=6"
             "&wheelResults=Pachinko,CashHunt,CrazyBonus,CoinFlip,1,2,5,10"
@@ -32,20 +100,19 @@ class APIClient:
             try:
                 # Logger silencioso para intentos normales, ruidoso para reintentos
                 if attempt > 1:
+                    self.retry_count += 1
                     logger.debug(f"API request intento {attempt}/{self.max_retries} (Page {page})")
                 
-                response = requests.get(
-                    url,
-                    headers=self._get_headers(),
-                    timeout=self.timeout
-                )
+                response = self._get(url)
                 if response.status_code == 200:
                     data = response.json()
                     # logger.info(f"✅ API (P{page}): {len(data)} registros obtenidos") 
                     # Comentado para no spamear en modo recursivo
                     return data
                 elif response.status_code == 429:
-                    wait_time = (attempt * 5)
+                    # Respetar Retry-After si el servidor lo indica
+                    retry_after = response.headers.get("Retry-After", "")
+                    wait_time = float(retry_after) if retry_after.replace(".", "", 1).isdigit() else (attempt * 5)
                     logger.warning(f"⚠️ API rate limit (429), esperando {wait_time}s...")
                     time.sleep(wait_time)
                     continue
@@ -63,6 +130,72 @@ class APIClient:
         logger.error(f"❌ API: Fallo total en Page {page}")
         return []
 
+    def _request(self, url: str) -> requests.Response:
+        with self._counter_lock:
+            self.request_count += 1
+        t0 = time.perf_counter()
+        status = "error"
+        try:
+            response = requests.get(url, headers=self._get_headers(), timeout=self.timeout)
+            status = str(response.status_code)
+            return response
+        finally:
+            # Los timeouts también cuentan: son justamente la cola que interesa
+            elapsed = time.perf_counter() - t0
+            self.latency.record(elapsed)
+            API_SECONDS.observe(elapsed)
+            API_RESPONSES.inc(status=status)
+
+    def _can_hedge(self) -> bool:
+        if self.hedge_percentile is None:
+            return False
+        # Tope de carga extra: los duplicados no superan max_hedge_ratio de las peticiones
+        return self.hedge_count < self.max_hedge_ratio * max(self.request_count, 1)
+
+    def _get(self, url: str) -> requests.Response:
+        """GET con hedging: si la primaria tarda más que el percentil, lanza un duplicado."""
+        if not self._can_hedge():
+            return self._request(url)
+
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="api-hedge")
+
+        primary = self._pool.submit(self._request, url)
+        done, _ = wait([primary], timeout=self.hedge_delay())
+        if done or not self._can_hedge():
+            return primary.result()
+
+        self.hedge_count += 1
+        logger.debug(f"⏱️ Petición lenta (>{self.hedge_delay():.2f}s), enviando duplicado")
+        backup = self._pool.submit(self._request, url)
+        pending = {primary, backup}
+        fallback, last_error = None, None
+
+        # Gana la primera respuesta 200; otras respuestas quedan como respaldo
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    response = future.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+                if response.status_code == 200:
+                    if future is backup:
+                        self.hedge_wins += 1
+                    return response
+                fallback = fallback or response
+
+        if fallback is not None:
+            return fallback
+        raise last_error
+
+    def close(self):
+        """Detiene el pool de hedging (espera a las peticiones en vuelo, acotadas por timeout)."""
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
     def _get_headers(self) -> dict:
         return {
             "User-Agent": "Mozilla/5.0 (Linux; Android 15; Mobile; rv:121.0) Gecko/121.0 Firefox/121.0",
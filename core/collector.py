@@ -17,10 +17,13 @@ class DataCollector:
     PAGE_SIZE_RECOVERY = 24
     MINUTES_PER_PAGE = 20
 
-    def __init__(self, db_path: str = "data/db.sqlite3"):
-        self.api = APIClient()
+    def __init__(self, db_path: str = "data/db.sqlite3", api_base_url: Optional[str] = None):
+        self.api = APIClient(base_url=api_base_url)
         self.db = Database(db_path)
 
+    def close(self):
+        self.api.close()
+
     def fetch_batches(self) -> List[List[dict]]:
         """
         Obtiene uno o más lotes de datos. 
@@ -100,7 +103,12 @@ class DataCollector:
             page_data = self.api.fetch(page=i, size=self.PAGE_SIZE_RECOVERY)
             if page_data:
                 stair.append(self._transform_batch(page_data))
-        
+
+        stats = self.api.latency_stats()
+        logger.info(
+            f"📶 Latencia API: p50={stats['p50_ms']}ms p99={stats['p99_ms']}ms "
+            f"(hedges {stats['hedges']}/{stats['requests']} peticiones)"
+        )
         return stair
 
     def _transform_batch(self, raw_data: list) -> List[dict]:
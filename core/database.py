@@ -8,11 +8,18 @@ import logging
 from datetime import datetime, timedelta
 from typing import Optional
 
+from core.telemetry import SQLITE_SECONDS
+
 logger = logging.getLogger(__name__)
 
+METRIC_STAGES = ["fetch", "insert", "tracking", "alerts", "rollups", "notify", "window", "backup", "total"]
+METRIC_COUNTS = ["pages", "rows_inserted", "requests", "retries"]
+
 class Database:
     """Capa de acceso a datos con SQLite"""
 
+    METRICS_RETENTION_DAYS = 30
+
     def __init__(self, db_path: str = "data/db.sqlite3"):
         self.db_path = db_path
         self._ensure_schema()
@@ -74,6 +81,84 @@ class Database:
             )
         """)
         
+        # FASE 4: Métricas estructuradas por ciclo (una fila compacta por ciclo)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS cycle_metrics (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                started_at TEXT NOT NULL,
+                recovery BOOLEAN DEFAULT 0,
+                fetch_ms REAL, insert_ms REAL, tracking_ms REAL, alerts_ms REAL,
+                rollups_ms REAL, notify_ms REAL, window_ms REAL, backup_ms REAL, total_ms REAL,
+                pages INTEGER DEFAULT 0,
+                rows_inserted INTEGER DEFAULT 0,
+                requests INTEGER DEFAULT 0,
+                retries INTEGER DEFAULT 0
+            )
+        """)
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_cycle_metrics_started ON cycle_metrics(started_at)")
+
+        # FASE 5: Outbox de notificaciones (se escribe en la misma transacción que el estado de alertas)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS alert_outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                idempotency_key TEXT NOT NULL UNIQUE,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER DEFAULT 0,
+                created_at TEXT NOT NULL,
+                next_attempt_at TEXT NOT NULL,
+                delivered_at TEXT,
+                last_error TEXT
+            )
+        """)
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON alert_outbox(status, next_attempt_at)")
+
+        # FASE 6: Suscriptores (patrones/tipos en JSON; NULL = todos)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS subscribers (
+                chat_id TEXT PRIMARY KEY,
+                name TEXT,
+                patterns TEXT,
+                alert_types TEXT,
+                active BOOLEAN DEFAULT 1,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+        # FASE 7: Registro de patrones (definición JSON, recarga en caliente) y su historial de apariciones
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS patterns (
+                id TEXT PRIMARY KEY,
+                definition TEXT NOT NULL,
+                active BOOLEAN DEFAULT 1,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS pattern_occurrences (
+                pattern_id TEXT NOT NULL,
+                spin_id INTEGER NOT NULL,
+                distance INTEGER NOT NULL,
+                PRIMARY KEY (pattern_id, spin_id)
+            ) WITHOUT ROWID
+        """)
+
+        # FASE 8: Agregados de ventanas por patrón/umbral (se actualizan solo con apariciones nuevas)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS window_aggregates (
+                pattern_id TEXT NOT NULL,
+                threshold INTEGER NOT NULL,
+                w_start INTEGER NOT NULL,
+                w_end INTEGER NOT NULL,
+                entries INTEGER DEFAULT 0,
+                wins INTEGER DEFAULT 0,
+                total_payout REAL DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (pattern_id, threshold)
+            )
+        """)
+        
         conn.commit()
 
     def _verify_integrity(self):
@@ -98,6 +183,7 @@ class Database:
             logger.critical(f"💥 Error verificando integridad: {e}")
             raise
 
+    @SQLITE_SECONDS.time(op="get_state")
     def get_state(self, module: str, key: str, default=None):
         """Obtiene un valor de estado del sistema."""
         try:
@@ -114,6 +200,7 @@ class Database:
             logger.error(f"Error leyendo estado ({module}.{key}): {e}")
             return default
 
+    @SQLITE_SECONDS.time(op="set_state")
     def set_state(self, module: str, key: str, value):
         """Guarda un valor de estado del sistema (UPSERT)."""
         try:
@@ -130,6 +217,492 @@ class Database:
         except Exception as e:
             logger.error(f"Error guardando estado ({module}.{key}): {e}")
 
+    def record_cycle_metrics(self, started_at: str, timings_ms: dict, counts: dict, recovery: bool = False):
+        """Guarda las métricas de un ciclo y aplica la retención."""
+        try:
+            stage_cols = [f"{s}_ms" for s in METRIC_STAGES]
+            cols = ["started_at", "recovery"] + stage_cols + METRIC_COUNTS
+            values = [started_at, recovery] + [timings_ms.get(s) for s in METRIC_STAGES] + \
+                     [counts.get(c, 0) for c in METRIC_COUNTS]
+            cutoff = (datetime.now() - timedelta(days=self.METRICS_RETENTION_DAYS)).isoformat()
+            conn = self.get_connection(read_only=False)
+            conn.execute(
+                f"INSERT INTO cycle_metrics ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})",
+                values
+            )
+            conn.execute("DELETE FROM cycle_metrics WHERE started_at < ?", (cutoff,))
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logger.error(f"Error guardando métricas de ciclo: {e}")
+
+    def get_cycle_metrics_summary(self, since_iso: str) -> dict:
+        """Percentiles (p50/p95/p99/max) por etapa y totales de conteos desde `since_iso`."""
+        try:
+            conn = self.get_connection(read_only=True)
+            rows = conn.execute(
+                "SELECT * FROM cycle_metrics WHERE started_at >= ? ORDER BY started_at", (since_iso,)
+            ).fetchall()
+            conn.close()
+        except Exception as e:
+            logger.error(f"Error leyendo métricas de ciclo: {e}")
+            return {"cycles": 0, "stages": {}, "counts": {}}
+
+        def pct(ordered: list, q: float) -> float:
+            return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+        stages = {}
+        for stage in METRIC_STAGES:
+            values = sorted(r[f"{stage}_ms"] for r in rows if r[f"{stage}_ms"] is not None)
+            if values:
+                stages[stage] = {
+                    "p50": round(pct(values, 0.50), 2),
+                    "p95": round(pct(values, 0.95), 2),
+                    "p99": round(pct(values, 0.99), 2),
+                    "max": round(values[-1], 2),
+                    "samples": len(values)
+                }
+        return {
+            "cycles": len(rows),
+            "recoveries": sum(1 for r in rows if r["recovery"]),
+            "stages": stages,
+            "counts": {c: sum(r[c] or 0 for r in rows) for c in METRIC_COUNTS}
+        }
+
+    def get_last_cycle_metrics(self) -> Optional[dict]:
+        """Última fila de cycle_metrics (o None si no hay ciclos registrados)."""
+        try:
+            conn = self.get_connection(read_only=True)
+            row = conn.execute("SELECT * FROM cycle_metrics ORDER BY id DESC LIMIT 1").fetchone()
+            conn.close()
+            return dict(row) if row else None
+        except Exception as e:
+            logger.error(f"Error leyendo último ciclo: {e}")
+            return None
+
+    # ============== Outbox de notificaciones ==============
+
+    def set_state_with_outbox(self, module: str, key: str, value, entries: list[dict],
+                              hold_seconds: float = 0) -> int:
+        """
+        Guarda un estado y encola sus notificaciones en una única transacción.
+
+        Args:
+            entries: [{"idempotency_key", "kind", "payload"}]; una clave ya
+                     encolada se ignora (reprocesar no duplica envíos).
+            hold_seconds: Retrasa la entrega (p.ej. hasta decidir si se resumen);
+                          `release_outbox` las libera antes.
+
+        Returns:
+            Número de entradas nuevas en el outbox
+        """
+        import json
+        now = datetime.now().isoformat()
+        due = (datetime.now() + timedelta(seconds=hold_seconds)).isoformat() if hold_seconds else now
+        conn = None
+        try:
+            conn = self.get_connection(read_only=False)
+            cur = conn.cursor()
+            cur.execute("""
+                INSERT OR REPLACE INTO system_state (module, key, value, updated_at)
+                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+            """, (module, key, json.dumps(value)))
+            cur.executemany("""
+                INSERT OR IGNORE INTO alert_outbox (idempotency_key, kind, payload, created_at, next_attempt_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, [(e["idempotency_key"], e["kind"], json.dumps(e["payload"]), now, due) for e in entries])
+            enqueued = cur.rowcount if entries else 0
+            conn.commit()
+            return enqueued
+        except Exception as e:
+            logger.error(f"Error guardando estado con outbox ({module}.{key}): {e}")
+            if conn:
+                conn.rollback()
+            return 0
+        finally:
+            if conn:
+                conn.close()
+
+    def release_outbox(self, keys: list[str]) -> int:
+        """Adelanta a ahora la entrega de entradas pendientes retenidas."""
+        if not keys:
+            return 0
+        try:
+            conn = self.get_connection(read_only=False)
+            cur = conn.executemany(
+                "UPDATE alert_outbox SET next_attempt_at = ? WHERE idempotency_key = ? AND status = 'pending'",
+                [(datetime.now().isoformat(), k) for k in keys]
+            )
+            conn.commit()
+            conn.close()
+            return cur.rowcount
+        except Exception as e:
+            logger.error(f"Error liberando entradas del outbox: {e}")
+            return 0
+
+    def summarize_outbox(self, keys: list[str], entries: list[dict]) -> int:
+        """Sustituye entradas aún pendientes por las entradas resumen (transacción única)."""
+        import json
+        now = datetime.now().isoformat()
+        conn = None
+        try:
+            conn = self.get_connection(read_only=False)
+            cur = conn.cursor()
+            cur.executemany(
+                "UPDATE alert_outbox SET status = 'summarized' WHERE idempotency_key = ? AND status = 'pending'",
+                [(k,) for k in keys]
+            )
+            summarized = cur.rowcount
+            cur.executemany("""
+                INSERT OR IGNORE INTO alert_outbox (idempotency_key, kind, payload, created_at, next_attempt_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, [(e["idempotency_key"], e["kind"], json.dumps(e["payload"]), now, now) for e in entries])
+            conn.commit()
+            return summarized
+        except Exception as e:
+            logger.error(f"Error resumiendo outbox: {e}")
+            if conn:
+                conn.rollback()
+            return 0
+        finally:
+            if conn:
+                conn.close()
+
+    @SQLITE_SECONDS.time(op="outbox_fetch")
+    def fetch_due_outbox(self, limit: int = 20) -> list[dict]:
+        """Entradas pendientes cuyo próximo intento ya venció, en orden de creación."""
+        import json
+        try:
+            conn = self.get_connection(read_only=True)
+            rows = conn.execute("""
+                SELECT * FROM alert_outbox
+                WHERE status = 'pending' AND next_attempt_at <= ?
+                ORDER BY id ASC LIMIT ?
+            """, (datetime.now().isoformat(), limit)).fetchall()
+            conn.close()
+            entries = []
+            for row in rows:
+                entry = dict(row)
+                entry["payload"] = json.loads(entry["payload"])
+                entries.append(entry)
+            return entries
+        except Exception as e:
+            logger.error(f"Error leyendo outbox: {e}")
+            return []
+
+    def mark_outbox_delivered(self, outbox_id: int):
+        try:
+            conn = self.get_connection(read_only=False)
+            conn.execute("""
+                UPDATE alert_outbox SET status = 'sent', attempts = attempts + 1, delivered_at = ?, last_error = NULL
+                WHERE id = ?
+            """, (datetime.now().isoformat(), outbox_id))
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logger.error(f"Error marcando outbox #{outbox_id} como entregado: {e}")
+
+    def mark_outbox_failed(self, outbox_id: int, error: str, next_attempt_at: Optional[str]):
+        """Registra un intento fallido; sin próximo intento la entrada queda como 'dead'."""
+        try:
+            conn = self.get_connection(read_only=False)
+            conn.execute("""
+                UPDATE alert_outbox
+                SET attempts = attempts + 1, last_error = ?,
+                    status = CASE WHEN ? IS NULL THEN 'dead' ELSE status END,
+                    next_attempt_at = COALESCE(?, next_attempt_at)
+                WHERE id = ?
+            """, (error[:500], next_attempt_at, next_attempt_at, outbox_id))
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logger.error(f"Error marcando outbox #{outbox_id} como fallido: {e}")
+
+    def get_outbox_stats(self) -> dict:
+        """Conteo por estado, antigüedad del pendiente más viejo y lag de entrega (última hora)."""
+        stats = {"pending": 0, "sent": 0, "dead": 0, "summarized": 0,
+                 "oldest_pending_s": 0.0, "avg_lag_s": None, "max_lag_s": None}
+        try:
+            conn = self.get_connection(read_only=True)
+            for row in conn.execute("SELECT status, COUNT(*) AS n FROM alert_outbox GROUP BY status"):
+                stats[row["status"]] = row["n"]
+            oldest = conn.execute(
+                "SELECT MIN(created_at) FROM alert_outbox WHERE status = 'pending'"
+            ).fetchone()[0]
+            since = (datetime.now() - timedelta(hours=1)).isoformat()
+            lags = conn.execute("""
+                SELECT AVG((julianday(delivered_at) - julianday(created_at)) * 86400),
+                       MAX((julianday(delivered_at) - julianday(created_at)) * 86400)
+                FROM alert_outbox WHERE status = 'sent' AND delivered_at >= ?
+            """, (since,)).fetchone()
+            conn.close()
+            if oldest:
+                stats["oldest_pending_s"] = round((datetime.now() - datetime.fromisoformat(oldest)).total_seconds(), 1)
+            if lags[0] is not None:
+                stats["avg_lag_s"], stats["max_lag_s"] = round(lags[0], 2), round(lags[1], 2)
+        except Exception as e:
+            logger.error(f"Error leyendo estadísticas del outbox: {e}")
+        return stats
+
+    def prune_outbox(self, days: Optional[int] = None) -> int:
+        """Elimina entradas ya cerradas (enviadas/resumidas) más viejas que la retención."""
+        cutoff = (datetime.now() - timedelta(days=days or self.METRICS_RETENTION_DAYS)).isoformat()
+        try:
+            conn = self.get_connection(read_only=False)
+            cur = conn.execute(
+                "DELETE FROM alert_outbox WHERE status IN ('sent', 'summarized') AND created_at < ?", (cutoff,)
+            )
+            # Entregas por chat del fan-out cuyas entradas ya no existen
+            conn.execute("""
+                DELETE FROM system_state WHERE module = 'fanout'
+                AND key NOT IN (SELECT idempotency_key FROM alert_outbox)
+            """)
+            conn.commit()
+            conn.close()
+            return cur.rowcount
+        except Exception as e:
+            logger.error(f"Error depurando outbox: {e}")
+            return 0
+
+    def get_fanout_deliveries(self, keys: list[str]) -> dict[str, set]:
+        """idempotency_key -> chats que ya recibieron esa alerta (system_state, módulo 'fanout')."""
+        import json
+        if not keys:
+            return {}
+        try:
+            conn = self.get_connection(read_only=True)
+            rows = conn.execute(
+                f"SELECT key, value FROM system_state WHERE module = 'fanout' AND key IN ({','.join('?' * len(keys))})",
+                list(keys)
+            ).fetchall()
+            conn.close()
+            return {row["key"]: set(json.loads(row["value"])) for row in rows}
+        except Exception as e:
+            logger.error(f"Error leyendo entregas del fan-out: {e}")
+            return {}
+
+    def add_fanout_deliveries(self, delivered: dict[str, set]):
+        """Añade chats servidos por idempotency_key (lectura y escritura en una transacción)."""
+        import json
+        if not delivered:
+            return
+        conn = None
+        try:
+            conn = self.get_connection(read_only=False)
+            conn.execute("BEGIN IMMEDIATE")
+            keys = list(delivered)
+            current = {row["key"]: set(json.loads(row["value"])) for row in conn.execute(
+                f"SELECT key, value FROM system_state WHERE module = 'fanout' AND key IN ({','.join('?' * len(keys))})",
+                keys
+            )}
+            conn.executemany("""
+                INSERT OR REPLACE INTO system_state (module, key, value, updated_at)
+                VALUES ('fanout', ?, ?, CURRENT_TIMESTAMP)
+            """, [(k, json.dumps(sorted(current.get(k, set()) | set(chats)))) for k, chats in delivered.items()])
+            conn.commit()
+        except Exception as e:
+            logger.error(f"Error guardando entregas del fan-out: {e}")
+            if conn:
+                conn.rollback()
+        finally:
+            if conn:
+                conn.close()
+
+    # ============== Suscriptores ==============
+
+    def upsert_subscriber(self, chat_id: str, name: Optional[str] = None,
+                          patterns: Optional[list[str]] = None,
+                          alert_types: Optional[list[str]] = None, active: bool = True):
+        """Alta o actualización de un suscriptor (patterns/alert_types None = todos)."""
+        import json
+        try:
+            conn = self.get_connection(read_only=False)
+            conn.execute("""
+                INSERT INTO subscribers (chat_id, name, patterns, alert_types, active)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(chat_id) DO UPDATE SET
+                    name = excluded.name, patterns = excluded.patterns,
+                    alert_types = excluded.alert_types, active = excluded.active
+            """, (str(chat_id), name,
+                  json.dumps(patterns) if patterns is not None else None,
+                  json.dumps(alert_types) if alert_types is not None else None,
+                  active))
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logger.error(f"Error guardando suscriptor {chat_id}: {e}")
+
+    def deactivate_subscriber(self, chat_id: str) -> bool:
+        """Desactiva un suscriptor sin borrar su configuración (p.ej. si bloqueó al bot)."""
+        try:
+            conn = self.get_connection(read_only=False)
+            cur = conn.execute("UPDATE subscribers SET active = 0 WHERE chat_id = ?", (str(chat_id),))
+            conn.commit()
+            conn.close()
+            return cur.rowcount > 0
+        except Exception as e:
+            logger.error(f"Error desactivando suscriptor {chat_id}: {e}")
+            return False
+
+    def delete_subscriber(self, chat_id: str) -> bool:
+        try:
+            conn = self.get_connection(read_only=False)
+            cur = conn.execute("DELETE FROM subscribers WHERE chat_id = ?", (str(chat_id),))
+            conn.commit()
+            conn.close()
+            return cur.rowcount > 0
+        except Exception as e:
+            logger.error(f"Error eliminando suscriptor {chat_id}: {e}")
+            return False
+
+    def get_subscribers(self, active_only: bool = True) -> list[dict]:
+        import json
+        try:
+            conn = self.get_connection(read_only=True)
+            query = "SELECT * FROM subscribers" + (" WHERE active = 1" if active_only else "") + " ORDER BY created_at"
+            rows = conn.execute(query).fetchall()
+            conn.close()
+        except Exception as e:
+            logger.error(f"Error leyendo suscriptores: {e}")
+            return []
+        subscribers = []
+        for row in rows:
+            sub = dict(row)
+            sub["patterns"] = json.loads(sub["patterns"]) if sub["patterns"] else None
+            sub["alert_types"] = json.loads(sub["alert_types"]) if sub["alert_types"] else None
+            subscribers.append(sub)
+        return subscribers
+
+    # Cada cambio del registro incrementa esta versión (misma transacción) para la recarga en caliente
+    _BUMP_PATTERN_VERSION = """
+        INSERT INTO system_state (module, key, value, updated_at) VALUES ('pattern_registry', 'version', '1', CURRENT_TIMESTAMP)
+        ON CONFLICT(module, key) DO UPDATE SET
+            value = CAST(CAST(value AS INTEGER) + 1 AS TEXT), updated_at = CURRENT_TIMESTAMP
+    """
+
+    def upsert_pattern(self, pattern_id: str, definition: dict, active: bool = True):
+        """Alta o actualización de un patrón del registro."""
+        import json
+        try:
+            conn = self.get_connection(read_only=False)
+            with conn:
+                conn.execute("""
+                    INSERT INTO patterns (id, definition, active, updated_at) VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                    ON CONFLICT(id) DO UPDATE SET
+                        definition = excluded.definition, active = excluded.active, updated_at = CURRENT_TIMESTAMP
+                """, (pattern_id, json.dumps(definition), active))
+                conn.execute(self._BUMP_PATTERN_VERSION)
+            conn.close()
+        except Exception as e:
+            logger.error(f"Error guardando patrón {pattern_id}: {e}")
+
+    def set_pattern_active(self, pattern_id: str, active: bool) -> bool:
+        try:
+            conn = self.get_connection(read_only=False)
+            with conn:
+                cur = conn.execute("UPDATE patterns SET active = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                                   (active, pattern_id))
+                if cur.rowcount:
+                    conn.execute(self._BUMP_PATTERN_VERSION)
+            conn.close()
+            return cur.rowcount > 0
+        except Exception as e:
+            logger.error(f"Error actualizando patrón {pattern_id}: {e}")
+            return False
+
+    def get_patterns(self, active_only: bool = True) -> list[dict]:
+        """Patrones del registro en orden de alta ({"id", "definition", "active"})."""
+        import json
+        try:
+            conn = self.get_connection(read_only=True)
+            query = "SELECT id, definition, active FROM patterns" + (" WHERE active = 1" if active_only else "") + " ORDER BY rowid"
+            rows = conn.execute(query).fetchall()
+            conn.close()
+            return [{"id": r["id"], "definition": json.loads(r["definition"]), "active": bool(r["active"])} for r in rows]
+        except Exception as e:
+            logger.error(f"Error leyendo registro de patrones: {e}")
+            return []
+
+    def get_pattern_registry_version(self) -> int:
+        return int(self.get_state("pattern_registry", "version", 0))
+
+    def insert_pattern_occurrences(self, rows: list[tuple]):
+        """Guarda apariciones (pattern_id, spin_id, distance); las ya registradas se ignoran."""
+        if not rows:
+            return
+        try:
+            conn = self.get_connection(read_only=False)
+            conn.executemany("INSERT OR IGNORE INTO pattern_occurrences (pattern_id, spin_id, distance) VALUES (?, ?, ?)", rows)
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logger.error(f"Error guardando {len(rows)} apariciones: {e}")
+
+    def delete_pattern_occurrences(self, pattern_id: str):
+        try:
+            conn = self.get_connection(read_only=False)
+            conn.execute("DELETE FROM pattern_occurrences WHERE pattern_id = ?", (pattern_id,))
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logger.error(f"Error borrando apariciones de {pattern_id}: {e}")
+
+    def get_window_aggregates(self, pattern_id: Optional[str] = None) -> list[dict]:
+        try:
+            conn = self.get_connection(read_only=True)
+            if pattern_id:
+                rows = conn.execute("SELECT * FROM window_aggregates WHERE pattern_id = ? ORDER BY threshold",
+                                    (pattern_id,)).fetchall()
+            else:
+                rows = conn.execute("SELECT * FROM window_aggregates ORDER BY pattern_id, threshold").fetchall()
+            conn.close()
+            return [dict(row) for row in rows]
+        except Exception as e:
+            logger.error(f"Error leyendo agregados de ventanas: {e}")
+            return []
+
+    def save_window_aggregates(self, pattern_id: str, aggregates: list[dict], checkpoint: dict):
+        """
+        Sustituye los agregados de un patrón y guarda su checkpoint en la misma
+        transacción (un fallo no deja agregados y checkpoint desalineados).
+        """
+        import json
+        conn = None
+        try:
+            conn = self.get_connection(read_only=False)
+            with conn:
+                conn.execute("DELETE FROM window_aggregates WHERE pattern_id = ?", (pattern_id,))
+                conn.executemany("""
+                    INSERT INTO window_aggregates (pattern_id, threshold, w_start, w_end, entries, wins, total_payout)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, [(pattern_id, a["threshold"], a["w_start"], a["w_end"], a["entries"], a["wins"], a["total_payout"])
+                      for a in aggregates])
+                conn.execute("""
+                    INSERT OR REPLACE INTO system_state (module, key, value, updated_at)
+                    VALUES ('window_analyzer', ?, ?, CURRENT_TIMESTAMP)
+                """, (pattern_id, json.dumps(checkpoint)))
+        except Exception as e:
+            logger.error(f"Error guardando agregados de ventanas ({pattern_id}): {e}")
+        finally:
+            if conn:
+                conn.close()
+
+    def iter_spins(self, after_id: int = 0, through_id: Optional[int] = None, chunk_size: int = 10_000):
+        """Recorre los tiros en orden de ID por bloques, sin cargar el historial en memoria."""
+        conn = self.get_connection(read_only=True)
+        try:
+            if through_id is not None:
+                cur = conn.execute("SELECT * FROM tiros WHERE id > ? AND id <= ? ORDER BY id ASC", (after_id, through_id))
+            else:
+                cur = conn.execute("SELECT * FROM tiros WHERE id > ? ORDER BY id ASC", (after_id,))
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield [dict(row) for row in rows]
+        finally:
+            conn.close()
+
     def get_connection(self, read_only: bool = False) -> sqlite3.Connection:
         """
         Obtiene conexión a la base de datos.
@@ -155,10 +728,15 @@ class Database:
             raise
 
     def insertar_datos(self, datos: list[dict]) -> int:
+        return len(self.insertar_tiros(datos))
+
+    @SQLITE_SECONDS.time(op="insert")
+    def insertar_tiros(self, datos: list[dict]) -> list[dict]:
+        """Inserta un lote y devuelve las filas insertadas (con su ID real) en orden cronológico."""
         if not datos:
-            return 0
+            return []
         conn = None
-        insertados = 0
+        insertados = []
         try:
             conn = self.get_connection(read_only=False)
             cur = conn.cursor()
@@ -221,7 +799,22 @@ class Database:
                         dato.get("is_top_slot_matched", False), dato.get("bonus_multiplier"),
                         dato.get("ct_flapper_blue"), dato.get("ct_flapper_green"), dato.get("ct_flapper_yellow")
                     ))
-                    insertados += 1
+                    # Fila equivalente a SELECT * para que el pipeline no tenga que releerla
+                    insertados.append({
+                        "id": cur.lastrowid,
+                        "resultado": current_resultado,
+                        "timestamp": current_start,
+                        "started_at": None,
+                        "settled_at": current_end,
+                        "latido": latido,
+                        "top_slot_result": dato.get("top_slot_result"),
+                        "top_slot_multiplier": dato.get("top_slot_multiplier"),
+                        "is_top_slot_matched": int(bool(dato.get("is_top_slot_matched", False))),
+                        "bonus_multiplier": dato.get("bonus_multiplier"),
+                        "ct_flapper_blue": dato.get("ct_flapper_blue"),
+                        "ct_flapper_green": dato.get("ct_flapper_green"),
+                        "ct_flapper_yellow": dato.get("ct_flapper_yellow"),
+                    })
 
                 except sqlite3.IntegrityError:
                     continue
@@ -235,7 +828,7 @@ class Database:
             logger.error(f"❌ Error en inserción batch: {e}")
             if conn:
                 conn.rollback()
-            return 0
+            return []
         finally:
             if conn:
                 conn.close()
@@ -264,6 +857,30 @@ class Database:
             logger.error(f"Error obteniendo última aparición de {value}: {e}")
             return None
 
+    def get_max_id_where(self, where_sql: str) -> Optional[int]:
+        """Último tiro que cumple un predicado compilado (por su índice parcial)."""
+        try:
+            conn = self.get_connection(read_only=True)
+            result = conn.execute(f"SELECT MAX(id) FROM tiros WHERE {where_sql}").fetchone()[0]
+            conn.close()
+            return result
+        except Exception as e:
+            logger.error(f"Error obteniendo último tiro por predicado: {e}")
+            return None
+
+    def get_last_pattern_occurrence_id(self, pattern_id: str) -> Optional[int]:
+        """Última aparición registrada por el tracker (pattern_occurrences)."""
+        try:
+            conn = self.get_connection(read_only=True)
+            result = conn.execute("SELECT MAX(spin_id) FROM pattern_occurrences WHERE pattern_id = ?",
+                                  (pattern_id,)).fetchone()[0]
+            conn.close()
+            return result
+        except Exception as e:
+            logger.error(f"Error obteniendo última aparición de {pattern_id}: {e}")
+            return None
+
+    @SQLITE_SECONDS.time(op="get_spin")
     def get_spin_by_id(self, spin_id: int) -> Optional[dict]:
         try:
             conn = self.get_connection(read_only=True)
@@ -278,6 +895,83 @@ class Database:
             logger.error(f"Error obteniendo tiro {spin_id}: {e}")
             return None
 
+    @SQLITE_SECONDS.time(op="get_spins_by_ids")
+    def get_spins_by_ids(self, spin_ids) -> dict[int, dict]:
+        """Varios tiros por ID con una sola conexión (IN en bloques de 500). Devuelve {id: tiro}."""
+        ids = sorted(set(spin_ids))
+        if not ids:
+            return {}
+        try:
+            conn = self.get_connection(read_only=True)
+            spins = {}
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                rows = conn.execute(
+                    f"SELECT * FROM tiros WHERE id IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                spins.update((row["id"], dict(row)) for row in rows)
+            conn.close()
+            return spins
+        except Exception as e:
+            logger.error(f"Error obteniendo {len(ids)} tiros por ID: {e}")
+            return {}
+
+    def ensure_partial_index(self, name: str, where_sql: str):
+        """Índice parcial sobre tiros(id) para un predicado (where_sql generado, no de usuario)."""
+        try:
+            conn = self.get_connection(read_only=False)
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON tiros(id) WHERE {where_sql}")
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logger.error(f"Error creando índice parcial {name}: {e}")
+
+    @SQLITE_SECONDS.time(op="get_spins_where")
+    def get_spins_where(self, where_sql: str, before_timestamp: Optional[str] = None,
+                        after_id: int = 0) -> list[dict]:
+        """Tiros que cumplen un predicado compilado, en orden de ID (usa su índice parcial)."""
+        try:
+            conn = self.get_connection(read_only=True)
+            query, params = f"SELECT * FROM tiros WHERE {where_sql} AND id > ?", [after_id]
+            if before_timestamp:
+                query += " AND timestamp < ?"
+                params.append(before_timestamp)
+            rows = conn.execute(query + " ORDER BY id ASC", params).fetchall()
+            conn.close()
+            return [dict(row) for row in rows]
+        except Exception as e:
+            logger.error(f"Error consultando tiros por predicado: {e}")
+            return []
+
+    def get_spin_results(self, through_id: Optional[int] = None) -> list[tuple]:
+        """(id, resultado) de todos los tiros hasta `through_id`, en orden de ID."""
+        try:
+            conn = self.get_connection(read_only=True)
+            if through_id is not None:
+                rows = conn.execute("SELECT id, resultado FROM tiros WHERE id <= ? ORDER BY id ASC", (through_id,)).fetchall()
+            else:
+                rows = conn.execute("SELECT id, resultado FROM tiros ORDER BY id ASC").fetchall()
+            conn.close()
+            return [tuple(row) for row in rows]
+        except Exception as e:
+            logger.error(f"Error leyendo la columna resultado: {e}")
+            return []
+
+    def get_spin_ids_where(self, where_sql: str, through_id: Optional[int] = None) -> list[int]:
+        """IDs de los tiros que cumplen un predicado compilado (solo el índice, sin leer filas)."""
+        try:
+            conn = self.get_connection(read_only=True)
+            if through_id is not None:
+                rows = conn.execute(f"SELECT id FROM tiros WHERE {where_sql} AND id <= ? ORDER BY id ASC", (through_id,)).fetchall()
+            else:
+                rows = conn.execute(f"SELECT id FROM tiros WHERE {where_sql} ORDER BY id ASC").fetchall()
+            conn.close()
+            return [row[0] for row in rows]
+        except Exception as e:
+            logger.error(f"Error consultando IDs por predicado: {e}")
+            return []
+
+    @SQLITE_SECONDS.time(op="get_spins")
     def get_spins_after_id(self, after_id: int, limit: Optional[int] = None) -> list[dict]:
         try:
             conn = self.get_connection(read_only=True)
@@ -320,6 +1014,7 @@ class Database:
         """Obtiene un tiro completo por su ID real"""
         return self.get_spin_by_id(spin_id)
 
+    @SQLITE_SECONDS.time(op="get_last_spin")
     def get_last_spin(self) -> Optional[dict]:
         try:
             conn = self.get_connection(read_only=True)
@@ -334,6 +1029,7 @@ class Database:
             logger.error(f"Error obteniendo último tiro: {e}")
             return None
 
+    @SQLITE_SECONDS.time(op="stats_range")
     def obtener_estadisticas_rango(self, start_iso: str, end_iso: str) -> dict:
         """
         Obtiene estadísticas de tiros en un rango de tiempo específico.
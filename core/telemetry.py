@@ -0,0 +1,289 @@
+"""
+core/telemetry.py - Métricas en proceso con exportación en formato texto Prometheus.
+
+Contadores, gauges e histogramas mínimos (sin dependencias externas). El coste
+en el camino caliente es un lock y una suma; el render solo ocurre al scrapear.
+"""
+
+import os
+import abc
+import time
+import bisect
+import logging
+import threading
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+def _label_key(labels: dict) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric(abc.ABC):
+    type_name = "untyped"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._lock = threading.Lock()
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type_name}"] + self._samples()
+
+    @abc.abstractmethod
+    def _samples(self) -> list[str]:
+        ...
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def __init__(self, name: str, help_text: str, function: Optional[Callable[[], object]] = None):
+        super().__init__(name, help_text)
+        self._values: Dict[LabelKey, float] = {}
+        self._function = function
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def set_function(self, function: Callable[[], object]):
+        """Valor calculado al scrapear: número o dict {((label, valor), ...): número}."""
+        self._function = function
+
+    def _samples(self) -> list[str]:
+        if self._function is not None:
+            try:
+                result = self._function()
+            except Exception as e:
+                logger.debug(f"Gauge {self.name} falló: {e}")
+                return []
+            if isinstance(result, dict):
+                return [f"{self.name}{_format_labels(_label_key(dict(k)))} {_format_value(v)}"
+                        for k, v in result.items() if v is not None]
+            return [] if result is None else [f"{self.name} {_format_value(result)}"]
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(k)} {_format_value(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelKey, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # [conteos por bucket..., +Inf, suma]
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[idx] += 1
+            series[-1] += value
+
+    def time(self, **labels):
+        """Context manager / decorador que observa la duración en segundos."""
+        return _Timer(self, labels)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        lines = []
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', _format_value(float(bound))))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: dict):
+        self._histogram = histogram
+        self._labels = labels
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._histogram.observe(time.perf_counter() - self._t0, **self._labels)
+
+    def __call__(self, func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with _Timer(self._histogram, self._labels):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+class Registry:
+    """Conjunto de métricas con render en formato de exposición Prometheus."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: Dict[str, Callable[[], None]] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self._register(Counter(name, help_text))
+
+    def gauge(self, name: str, help_text: str, function: Optional[Callable[[], object]] = None) -> Gauge:
+        return self._register(Gauge(name, help_text, function))
+
+    def histogram(self, name: str, help_text: str, buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, buckets))
+
+    def collector(self, name: str, function: Callable[[], None]):
+        """
+        Función llamada una vez al inicio de cada render, p.ej. para fijar varios
+        gauges con una sola consulta. Registrar otra con el mismo nombre la sustituye.
+        """
+        with self._lock:
+            self._collectors[name] = function
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors.items())
+        for name, collect in collectors:
+            try:
+                collect()
+            except Exception as e:
+                logger.debug(f"Collector {name} falló: {e}")
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# ============== Métricas del servicio ==============
+
+CYCLE_SECONDS = REGISTRY.histogram(
+    "crazytime_cycle_duration_seconds", "Duración total de cada ciclo del scheduler",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300))
+STAGE_SECONDS = REGISTRY.histogram(
+    "crazytime_cycle_stage_seconds", "Duración de cada etapa del ciclo")
+API_SECONDS = REGISTRY.histogram(
+    "crazytime_api_request_duration_seconds", "Latencia de peticiones a la API de tiros")
+API_RESPONSES = REGISTRY.counter(
+    "crazytime_api_responses_total", "Respuestas de la API por código de estado")
+ROWS_INSERTED = REGISTRY.counter(
+    "crazytime_rows_inserted_total", "Tiros insertados en la tabla tiros")
+RECOVERIES = REGISTRY.counter(
+    "crazytime_recovery_events_total", "Ciclos que ejecutaron escalera de recuperación")
+ALERT_DISPATCH_SECONDS = REGISTRY.histogram(
+    "crazytime_alert_dispatch_seconds", "Latencia de entrega de cada alerta")
+NOTIFY_QUEUE_DEPTH = REGISTRY.gauge(
+    "crazytime_notification_queue_depth", "Notificaciones encoladas pendientes de entrega")
+NOTIFY_LAG_SECONDS = REGISTRY.histogram(
+    "crazytime_notification_lag_seconds", "Tiempo desde que se encola una notificación hasta su entrega")
+NOTIFY_DROPPED = REGISTRY.counter(
+    "crazytime_notifications_dropped_total", "Notificaciones descartadas por cola llena")
+NOTIFY_RETRIES = REGISTRY.counter(
+    "crazytime_telegram_retries_total", "Reintentos de envío a Telegram por motivo (flood, error)")
+SQLITE_SECONDS = REGISTRY.histogram(
+    "crazytime_sqlite_query_seconds", "Tiempo de operaciones SQLite por tipo",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5))
+
+def register_db_size_gauges(db_path: str, registry: Registry = REGISTRY):
+    """Tamaño en disco de la BD y su WAL (calculado al scrapear)."""
+    def size(path: str) -> int:
+        return os.path.getsize(path) if os.path.exists(path) else 0
+    registry.gauge("crazytime_db_size_bytes", "Tamaño del archivo SQLite", lambda: size(db_path))
+    registry.gauge("crazytime_wal_size_bytes", "Tamaño del archivo WAL de SQLite", lambda: size(f"{db_path}-wal"))
+
+def register_outbox_gauges(db, registry: Registry = REGISTRY):
+    """Pendientes del outbox y antigüedad del más viejo: una sola get_outbox_stats() por scrape."""
+    pending = registry.gauge("crazytime_outbox_pending", "Entradas del outbox de alertas pendientes de entrega")
+    oldest = registry.gauge("crazytime_outbox_oldest_pending_seconds",
+                            "Antigüedad de la entrada pendiente más vieja del outbox")
+
+    def collect():
+        stats = db.get_outbox_stats()
+        pending.set(stats["pending"])
+        oldest.set(stats["oldest_pending_s"])
+    registry.collector("outbox", collect)
+
+def start_metrics_server(port: int, host: str = "0.0.0.0", registry: Registry = REGISTRY) -> ThreadingHTTPServer:
+    """Listener HTTP ligero que sirve /metrics en un hilo daemon."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_response(404)
+                self.end_headers()
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info(f"📈 Métricas Prometheus en http://{host}:{port}/metrics")
+    return server
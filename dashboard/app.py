@@ -11,6 +11,7 @@ import json
 import sqlite3
 import logging
 import statistics
+from contextlib import closing
 
 # --- Configuración de Rutas de Sistema ---
 BASE_DIR = Path(__file__).resolve().parent
@@ -23,17 +24,42 @@ DB_PATH = BASE_DATA_PATH / "db.sqlite3"
 
 from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi import Request
 from pydantic import BaseModel
 
-from core.database import Database
-from config.patterns import ALL_PATTERNS, VIP_PATTERNS, TRACKING_PATTERNS
+from core.database import Database, METRIC_STAGES
+from core.telemetry import Registry, CONTENT_TYPE, register_db_size_gauges, register_outbox_gauges
+from config.patterns import Pattern
+from analytics.pattern_registry import PatternRegistry, pattern_fingerprint
+from analytics.predicates import predicate_sql
+from analytics.window_analyzer import iter_occurrences, pattern_streaks
+from analytics.window_grid import (HAS_NUMPY, window_grid, best_windows, window_cell, grid_heatmap, grid_to_csv,
+                                   DEFAULT_MAX_START, DEFAULT_MAX_WIDTH)
 
 # Inicializar BD
 db = Database(str(DB_PATH))
+# Registro de patrones: se relee solo cuando cambia su versión
+registry = PatternRegistry(db)
+
+# Métricas exportadas por el dashboard: solo gauges que se calculan desde la BD al scrapear.
+# El dashboard es otro proceso: ciclos, API, SQLite y entregas del servicio no pasan por aquí
+# y se exponen en el listener del propio servicio (METRICS_PORT), así que usa su propio registro.
+METRICS = Registry()
+register_db_size_gauges(str(DB_PATH), METRICS)
+
+def _last_cycle_stage_seconds():
+    row = db.get_last_cycle_metrics()
+    if not row:
+        return {}
+    return {(("stage", s),): row[f"{s}_ms"] / 1000 for s in METRIC_STAGES if row.get(f"{s}_ms") is not None}
+
+METRICS.gauge("crazytime_last_cycle_stage_seconds",
+              "Duración por etapa del último ciclo registrado en cycle_metrics", _last_cycle_stage_seconds)
+METRICS.gauge("crazytime_last_spin_id", "ID del último tiro en la BD", lambda: db.get_max_id())
+register_outbox_gauges(db, METRICS)
 
 app = FastAPI(title="CrazyTime v3.0 Dashboard", version="3.0.0")
 
@@ -108,6 +134,50 @@ class DailyStats(BaseModel):
 class StatsResponse(BaseModel):
     today_stats: DailyStats
 
+class StagePercentiles(BaseModel):
+    p50: float
+    p95: float
+    p99: float
+    max: float
+    samples: int
+
+class CycleMetricsResponse(BaseModel):
+    hours: int
+    cycles: int
+    recoveries: int
+    stages: Dict[str, StagePercentiles]
+    counts: Dict[str, int]
+
+class OutboxStatsResponse(BaseModel):
+    pending: int
+    sent: int
+    dead: int
+    summarized: int
+    oldest_pending_s: float
+    avg_lag_s: Optional[float]
+    max_lag_s: Optional[float]
+
+class WindowCell(BaseModel):
+    start: int
+    end: int
+    width: int
+    entries: int
+    wins: int
+    win_rate: Optional[float]
+    roi: Optional[float]
+    profit_loss: float
+
+class WindowGridResponse(BaseModel):
+    pattern_id: str
+    pattern_name: str
+    streaks: int                        # distancias entre apariciones (= entradas con inicio 1)
+    max_start: int
+    max_width: int
+    entries: List[int]                  # por inicio (fila)
+    roi: List[List[Optional[float]]]    # [inicio - 1][ancho - 1], None sin entradas
+    best: List[WindowCell]
+    configured: List[WindowCell]        # betting_windows actuales dentro de la rejilla
+
 # ============== Helpers ============== 
 
 def contar_secuencias(db_instance: Database, start_iso: str, end_iso: str) -> Dict[str, int]:
@@ -139,11 +209,23 @@ def contar_secuencias(db_instance: Database, start_iso: str, end_iso: str) -> Di
         logging.error(f"Error contando secuencias: {e}")
         return {"2-5": 0, "5-2": 0}
 
-def calculate_distances_from_db(pattern_value: str, limit: int = 50):
-    """Calcula distancias e historial directamente desde la tabla tiros"""
+def _recent_occurrences_query(pattern: Pattern):
+    """Consulta de los IDs de las últimas apariciones del patrón (de nueva a vieja, con LIMIT ?)."""
+    if pattern.type == "predicate":
+        # Usa el índice parcial del predicado
+        return f"SELECT id FROM tiros WHERE {predicate_sql(pattern)} ORDER BY id DESC LIMIT ?", ()
+    if pattern.type == "sequence":
+        # Las secuencias se leen del historial del tracker (pattern_occurrences)
+        return ("SELECT spin_id FROM pattern_occurrences WHERE pattern_id = ? ORDER BY spin_id DESC LIMIT ?",
+                (pattern.id,))
+    return "SELECT id FROM tiros WHERE resultado = ? ORDER BY id DESC LIMIT ?", (pattern.value,)
+
+def calculate_distances_from_db(pattern: Pattern, limit: int = 50):
+    """Calcula distancias e historial directamente desde la BD"""
+    query, params = _recent_occurrences_query(pattern)
     with db.get_connection(read_only=True) as conn:
         cur = conn.cursor()
-        cur.execute("SELECT id FROM tiros WHERE resultado = ? ORDER BY id DESC LIMIT ?", (pattern_value, limit + 1))
+        cur.execute(query, (*params, limit + 1))
         ids = [row[0] for row in cur.fetchall()]
         
         if len(ids) < 2:
@@ -201,8 +283,9 @@ async def get_patterns():
     current_max_id = db.get_max_id() or 0
     patterns = []
     
-    # SOLO VIPs: Pachinko y CrazyTime
-    for p in VIP_PATTERNS:
+    # SOLO VIPs (según el registro de patrones)
+    registry.refresh()
+    for p in registry.vip_patterns:
         # Obtener estado oficial desde system_state
         p_state = db.get_state("pattern_tracker", p.id, {"last_id": None, "last_distance": 0})
         last_id = p_state.get("last_id")
@@ -230,7 +313,8 @@ async def get_alerts():
     alerts = []
     active_count = 0
     
-    for p in VIP_PATTERNS:
+    registry.refresh()
+    for p in registry.vip_patterns:
         p_tracker = db.get_state("pattern_tracker", p.id, {"last_id": None})
         last_id = p_tracker.get("last_id")
         if not last_id: continue
@@ -251,11 +335,12 @@ async def get_alerts():
 
 @app.get("/api/patterns/{pattern_id}/distances", response_model=PatternDistancesResponse)
 async def get_pattern_distances(pattern_id: str, limit: int = Query(default=50, ge=1, le=200)):
-    p_config = next((p for p in ALL_PATTERNS if p.id == pattern_id), None)
+    registry.refresh()
+    p_config = registry.by_id.get(pattern_id)
     if not p_config:
         raise HTTPException(status_code=404, detail="Pattern not found")
         
-    distances, stats = calculate_distances_from_db(p_config.value, limit)
+    distances, stats = calculate_distances_from_db(p_config, limit)
     
     return PatternDistancesResponse(
         pattern_id=pattern_id,
@@ -271,6 +356,61 @@ async def get_pattern_distances(pattern_id: str, limit: int = Query(default=50,
         )
     )
 
+# Última rejilla de ventanas de cada patrón: {pattern_id: (clave, grid)}. La clave incluye
+# la huella del patrón y su última aparición, así que solo se recalcula si hay rachas nuevas.
+_window_grid_cache: Dict[str, tuple] = {}
+
+def _last_occurrence_id(pattern: Pattern) -> int:
+    query, params = _recent_occurrences_query(pattern)
+    with closing(db.get_connection(read_only=True)) as conn:
+        row = conn.execute(query, (*params, 1)).fetchone()
+    return row[0] if row else 0
+
+def _pattern_window_grid(pattern_id: str, max_start: int, max_width: int):
+    if not HAS_NUMPY:
+        raise HTTPException(status_code=503, detail="numpy no disponible")
+    registry.refresh()
+    pattern = registry.by_id.get(pattern_id)
+    if not pattern:
+        raise HTTPException(status_code=404, detail="Pattern not found")
+    key = (pattern_fingerprint(pattern), _last_occurrence_id(pattern), max_start, max_width)
+    cached = _window_grid_cache.get(pattern.id)
+    if cached and cached[0] == key:
+        return pattern, cached[1]
+    # Solo lectura: nada de recargar el registro ni crear índices contra la BD del servicio
+    grid = window_grid(*pattern_streaks(pattern, iter_occurrences(db, pattern)), max_start, max_width)
+    _window_grid_cache[pattern.id] = (key, grid)
+    return pattern, grid
+
+@app.get("/api/patterns/{pattern_id}/window-grid", response_model=WindowGridResponse)
+def get_window_grid(pattern_id: str,
+                    max_start: int = Query(default=DEFAULT_MAX_START, ge=1, le=1000),
+                    max_width: int = Query(default=DEFAULT_MAX_WIDTH, ge=1, le=300),
+                    min_entries: int = Query(default=30, ge=1),
+                    top: int = Query(default=10, ge=1, le=100)):
+    """Mapa de ROI de todas las ventanas (inicio 1..max_start, ancho 1..max_width) del patrón."""
+    pattern, grid = _pattern_window_grid(pattern_id, max_start, max_width)
+    configured = [window_cell(grid, start, end) for start, end in pattern.betting_windows
+                  if start <= max_start and end - start + 1 <= max_width]
+    return WindowGridResponse(
+        pattern_id=pattern.id, pattern_name=pattern.name,
+        streaks=int(grid["entries"][0]) if len(grid["entries"]) else 0,
+        max_start=max_start, max_width=max_width,
+        entries=[int(e) for e in grid["entries"]],
+        roi=grid_heatmap(grid),
+        best=best_windows(grid, min_entries=min_entries, top=top),
+        configured=configured,
+    )
+
+@app.get("/api/patterns/{pattern_id}/window-grid.csv", response_class=PlainTextResponse)
+def export_window_grid(pattern_id: str,
+                       max_start: int = Query(default=DEFAULT_MAX_START, ge=1, le=1000),
+                       max_width: int = Query(default=DEFAULT_MAX_WIDTH, ge=1, le=300)):
+    """Exporta la rejilla completa en CSV (una fila por ventana)."""
+    pattern, grid = _pattern_window_grid(pattern_id, max_start, max_width)
+    return PlainTextResponse(grid_to_csv(grid), media_type="text/csv", headers={
+        "Content-Disposition": f'attachment; filename="{pattern.id}_window_grid.csv"'})
+
 @app.get("/api/spins/recent", response_model=RecentSpinsResponse)
 async def get_recent_spins(limit: int = Query(default=20, ge=1, le=100)):
     spins = db.get_spins_after_id(db.get_max_id() - limit if db.get_max_id() else 0)
@@ -280,6 +420,33 @@ async def get_recent_spins(limit: int = Query(default=20, ge=1, le=100)):
         count=len(spins)
     )
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """
+    Exposición en formato texto Prometheus de los gauges del dashboard (BD/WAL,
+    último ciclo, último tiro, outbox). Las métricas del servicio (histogramas
+    de ciclo, API, SQLite y entregas) se sirven en su listener METRICS_PORT.
+    """
+    return PlainTextResponse(METRICS.render(), media_type=CONTENT_TYPE)
+
+@app.get("/api/metrics/cycles", response_model=CycleMetricsResponse)
+async def get_cycle_metrics(hours: int = Query(default=24, ge=1, le=24 * 30)):
+    """Percentiles de latencia por etapa del ciclo (tabla cycle_metrics)."""
+    since = (datetime.now() - timedelta(hours=hours)).isoformat()
+    summary = db.get_cycle_metrics_summary(since)
+    return CycleMetricsResponse(
+        hours=hours,
+        cycles=summary.get("cycles", 0),
+        recoveries=summary.get("recoveries", 0),
+        stages=summary.get("stages", {}),
+        counts=summary.get("counts", {})
+    )
+
+@app.get("/api/metrics/outbox", response_model=OutboxStatsResponse)
+async def get_outbox_metrics():
+    """Estado del outbox de alertas y lag de entrega de la última hora."""
+    return OutboxStatsResponse(**db.get_outbox_stats())
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
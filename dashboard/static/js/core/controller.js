@@ -2,6 +2,7 @@ import { state } from "./state.js";
 import { fetchDashboardData } from "./api.js";
 import { renderDashboard } from "../render/dashboard.js";
 import { renderDistanceGrid } from "../render/tabs.js";
+import { renderWindowHeatmap } from "../render/heatmap.js";
 
 async function updateDashboard() {
     try {
@@ -32,7 +33,7 @@ export function startController() {
     state.timers.refresh = setInterval(updateDashboard, 30000);
 
     // Inicializar listeners de pestañas (Pachinko/CrazyTime)
-    const tabs = document.querySelectorAll('.distance-tab');
+    const tabs = document.querySelectorAll('.distance-grid-section .distance-tab');
     tabs.forEach(tab => {
         tab.addEventListener('click', () => {
             tabs.forEach(t => t.classList.remove('active'));
@@ -40,7 +41,20 @@ export function startController() {
             renderDistanceGrid(tab.dataset.pattern);
         });
     });
+
+    // Mapa de ventanas: se calcula al elegir patrón (no entra en el polling)
+    const windowTabs = document.querySelectorAll('.window-tab');
+    windowTabs.forEach(tab => {
+        tab.addEventListener('click', () => {
+            windowTabs.forEach(t => t.classList.remove('active'));
+            tab.classList.add('active');
+            renderWindowHeatmap(tab.dataset.pattern);
+        });
+    });
     
-    // Cargar Pachinko por defecto en el grid
-    setTimeout(() => renderDistanceGrid('pachinko'), 1000);
+    // Cargar Pachinko por defecto en el grid y en el mapa de ventanas
+    setTimeout(() => {
+        renderDistanceGrid('pachinko');
+        renderWindowHeatmap('pachinko');
+    }, 1000);
 }
@@ -0,0 +1,85 @@
+// Mapa de ROI de todas las ventanas: filas = inicio, columnas = ancho
+const ROI_SCALE = 50; // % de ROI que satura el color
+
+const EMPTY = [10, 10, 18];     // --bg-dark: sin entradas
+const NEUTRAL = [18, 18, 31];   // --bg-card: ROI 0
+const GAIN = [0, 255, 136];     // --neon-green
+const LOSS = [255, 51, 102];    // --neon-red
+
+function roiColor(roi) {
+    if (roi === null) return EMPTY;
+    const t = Math.min(1, Math.abs(roi) / ROI_SCALE);
+    const target = roi >= 0 ? GAIN : LOSS;
+    return NEUTRAL.map((c, k) => Math.round(c + t * (target[k] - c)));
+}
+
+function formatCell(cell) {
+    const roi = cell.roi === null ? '--' : `${cell.roi > 0 ? '+' : ''}${cell.roi}%`;
+    return `[${cell.start} - ${cell.end}] ROI ${roi} · ${cell.wins}/${cell.entries}`;
+}
+
+function drawGrid(canvas, data) {
+    const rows = data.roi.length;
+    const cols = rows ? data.roi[0].length : 0;
+    canvas.width = cols;
+    canvas.height = rows;
+    if (!rows || !cols) return;
+
+    const ctx = canvas.getContext('2d');
+    const image = ctx.createImageData(cols, rows);
+    data.roi.forEach((row, i) => {
+        row.forEach((roi, j) => {
+            const [r, g, b] = roiColor(roi);
+            const k = (i * cols + j) * 4;
+            image.data[k] = r;
+            image.data[k + 1] = g;
+            image.data[k + 2] = b;
+            image.data[k + 3] = 255;
+        });
+    });
+    ctx.putImageData(image, 0, 0);
+
+    // Ventanas configuradas (betting_windows) en blanco
+    ctx.fillStyle = '#ffffff';
+    data.configured.forEach(cell => ctx.fillRect(cell.width - 1, cell.start - 1, 1, 1));
+}
+
+function bindTooltip(canvas, data) {
+    canvas.onmousemove = (event) => {
+        const rect = canvas.getBoundingClientRect();
+        const j = Math.floor((event.clientX - rect.left) / rect.width * canvas.width);
+        const i = Math.floor((event.clientY - rect.top) / rect.height * canvas.height);
+        const roi = data.roi[i] ? data.roi[i][j] : undefined;
+        if (roi === undefined) return;
+        const start = i + 1;
+        const end = start + j;
+        canvas.title = `Ventana [${start} - ${end}] · ${data.entries[i]} entradas · ROI ${roi === null ? '--' : roi + '%'}`;
+    };
+}
+
+export function renderWindowHeatmap(patternId) {
+    const canvas = document.getElementById('windowHeatmap');
+    const info = document.getElementById('windowHeatmapInfo');
+    if (!canvas) return;
+
+    fetch(`/api/patterns/${patternId}/window-grid?top=3`)
+        .then(response => response.ok ? response.json() : null)
+        .then(data => {
+            if (!data || data.streaks === 0) {
+                canvas.width = canvas.height = 0;
+                if (info) info.innerHTML = '<p class="loading-text">Sin datos suficientes</p>';
+                return;
+            }
+            drawGrid(canvas, data);
+            bindTooltip(canvas, data);
+            if (!info) return;
+            const best = data.best.map(cell => `<span class="window-best">${formatCell(cell)}</span>`).join('');
+            const configured = data.configured.map(cell => `<span class="window-configured">${formatCell(cell)}</span>`).join('');
+            info.innerHTML = `
+                <div><span class="counter-label">RACHAS</span> ${data.streaks}</div>
+                <div><span class="counter-label">MEJORES</span> ${best || '--'}</div>
+                <div><span class="counter-label">CONFIGURADAS</span> ${configured || '--'}</div>
+            `;
+        })
+        .catch(err => console.warn("Error fetching window grid", err));
+}
@@ -5,6 +5,7 @@ Ejecuta bucle infinito consultando API cada 5 minutos.
 Diseñado para correr 24/7 en instancia GCP free tier.
 """
 
+import os
 import sys
 import time
 import signal
@@ -12,6 +13,7 @@ import logging
 from datetime import datetime
 
 from orchestration.scheduler import CrazyTimeScheduler, setup_logging
+from core.telemetry import start_metrics_server, register_db_size_gauges
 
 shutdown_flag = False
 
@@ -40,9 +42,17 @@ def main():
     except Exception as e:
         logger.critical(f"💥 ERROR FATAL al inicializar: {e}", exc_info=True)
         sys.exit(1)
+    # Listener Prometheus opcional (METRICS_PORT=9108)
+    metrics_port = os.getenv("METRICS_PORT")
+    if metrics_port:
+        try:
+            register_db_size_gauges("data/db.sqlite3")
+            start_metrics_server(int(metrics_port))
+        except Exception as e:
+            logger.warning(f"No se pudo iniciar el listener de métricas: {e}")
     try:
-        if scheduler.notifier:
-            scheduler.notifier.send_startup_notification()
+        if scheduler.dispatcher:
+            scheduler.dispatcher.submit("startup", scheduler.notifier.send_startup_notification)
     except Exception as e:
         logger.warning(f"No se pudo enviar notificación de inicio: {e}")
     cycle_count = 0
@@ -65,8 +75,8 @@ def main():
         except Exception as e:
             logger.error(f"\n❌ ERROR EN CICLO #{cycle_count}: {e}", exc_info=True)
             try:
-                if scheduler.notifier:
-                    scheduler.notifier.send_error_notification(e, cycle_count)
+                if scheduler.dispatcher:
+                    scheduler.dispatcher.submit("error", scheduler.notifier.send_error_notification, e, cycle_count)
             except:
                 pass
             logger.info("⏳ Esperando 1 minuto antes de reintentar...")
@@ -78,10 +88,12 @@ def main():
     logger.info("🛑 APAGANDO SERVICIO")
     logger.info("="*70)
     try:
-        if scheduler.notifier:
-            scheduler.notifier.send_shutdown_notification(cycle_count)
+        if scheduler.dispatcher:
+            scheduler.dispatcher.submit("shutdown", scheduler.notifier.send_shutdown_notification, cycle_count)
     except:
         pass
+    # Entregar lo que quede en cola antes de salir (SIGTERM incluido)
+    scheduler.close()
     logger.info(f"✅ Servicio detenido limpiamente después de {cycle_count} ciclos")
     sys.exit(0)
 
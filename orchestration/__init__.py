@@ -1 +1,2 @@
 from .scheduler import CrazyTimeScheduler, setup_logging
+from .pipeline import SpinPipeline
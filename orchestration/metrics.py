@@ -0,0 +1,34 @@
+"""
+orchestration/metrics.py - Medición estructurada de un ciclo del scheduler.
+"""
+
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+class CycleMetrics:
+    """Acumula tiempos (ms) por etapa y conteos de un único ciclo."""
+
+    def __init__(self):
+        self.started_at = datetime.now().isoformat()
+        self._t0 = time.perf_counter()
+        self.timings_ms: dict = {}
+        self.counts: dict = {}
+        self.recovery = False
+
+    @contextmanager
+    def stage(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - t0)
+
+    def add_time(self, name: str, seconds: float):
+        self.timings_ms[name] = self.timings_ms.get(name, 0.0) + seconds * 1000
+
+    def add_count(self, name: str, value: int):
+        self.counts[name] = self.counts.get(name, 0) + value
+
+    def finish(self):
+        self.timings_ms["total"] = (time.perf_counter() - self._t0) * 1000
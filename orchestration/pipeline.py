@@ -0,0 +1,68 @@
+"""
+orchestration/pipeline.py - Pipeline en memoria para los tiros recién insertados.
+
+Cada lote insertado recorre las etapas registradas (tracker -> alertas ->
+rollups -> notificación) compartiendo un contexto en memoria; la BD solo se
+usa para persistir. Se mide la latencia de cada etapa.
+"""
+
+import time
+import logging
+from typing import Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+Stage = Callable[[dict], None]
+
+class SpinPipeline:
+    """Encadena etapas sobre un contexto compartido y registra su latencia."""
+
+    def __init__(self):
+        self.stages: List[Tuple[str, Stage]] = []
+        self.last_timings: Dict[str, float] = {}
+        self._totals: Dict[str, float] = {}
+        self._calls: Dict[str, int] = {}
+
+    def add_stage(self, name: str, stage: Stage) -> "SpinPipeline":
+        self.stages.append((name, stage))
+        return self
+
+    def run(self, spins: List[dict], **extra) -> dict:
+        """
+        Ejecuta todas las etapas sobre los tiros dados.
+
+        Un fallo en una etapa se registra y no detiene las siguientes (mismo
+        criterio que los pasos independientes del scheduler).
+        """
+        ctx = {
+            "spins": spins,
+            "spins_by_id": {s["id"]: s for s in spins},
+            "max_id": spins[-1]["id"] if spins else None,
+            **extra,
+        }
+        self.last_timings = {}
+        for name, stage in self.stages:
+            t0 = time.perf_counter()
+            try:
+                stage(ctx)
+            except Exception as e:
+                logger.error(f"❌ Error en etapa '{name}' del pipeline: {e}", exc_info=True)
+            elapsed = time.perf_counter() - t0
+            self.last_timings[name] = elapsed
+            self._totals[name] = self._totals.get(name, 0.0) + elapsed
+            self._calls[name] = self._calls.get(name, 0) + 1
+        return ctx
+
+    def stage_stats(self) -> Dict[str, dict]:
+        """Latencia por etapa: última ejecución y media acumulada (ms)."""
+        return {
+            name: {
+                "last_ms": round(self.last_timings.get(name, 0.0) * 1000, 2),
+                "avg_ms": round(self._totals[name] / self._calls[name] * 1000, 2),
+                "calls": self._calls[name],
+            }
+            for name, _ in self.stages if name in self._calls
+        }
+
+    def format_timings(self) -> str:
+        return " | ".join(f"{name}={t * 1000:.1f}ms" for name, t in self.last_timings.items())
@@ -13,60 +13,108 @@ from dotenv import load_dotenv
 from core.collector import DataCollector
 from core.database import Database
 from analytics.pattern_tracker import PatternTracker
+from analytics.analysis_executor import AnalysisExecutor, HAS_NUMPY
+from analytics.bootstrap import format_ci
 from alerting.alert_manager import AlertManager
 from alerting.notification import TelegramNotifier
+from alerting.dispatcher import NotificationDispatcher
+from alerting.coalescer import AlertCoalescer
+from alerting.fanout import FanoutNotifier
+from orchestration.pipeline import SpinPipeline
+from orchestration.metrics import CycleMetrics
+from core.telemetry import CYCLE_SECONDS, STAGE_SECONDS, ROWS_INSERTED, RECOVERIES
 
 logger = logging.getLogger(__name__)
 
 class CrazyTimeScheduler:
     """Orquestador del sistema CrazyTime."""
 
+    # En recuperación, un hit más viejo que esto (respecto al último tiro) ya no es accionable
+    RECOVERY_ALERT_MAX_AGE_MINUTES = 10
+    # En recuperación, las alertas se retienen en el outbox hasta decidir cuáles se resumen
+    RECOVERY_OUTBOX_HOLD_S = 60
+    # Telegram rechaza textos de más de 4096 caracteres; el resumen se parte por debajo
+    RECOVERY_SUMMARY_MAX_CHARS = 4000
+    # Reportes completos de ventanas (data/analytics): como mucho uno por intervalo, y solo si
+    # cambiaron los agregados (analyze_all_patterns solo reescribe los patrones que cambiaron)
+    WINDOW_REPORTS_INTERVAL_S = 3600
+    # Etapas del pipeline -> columnas de cycle_metrics
+    PIPELINE_METRICS = {"tracker": "tracking", "alerts": "alerts", "rollups": "rollups", "notify": "notify"}
+
     def __init__(self):
         load_dotenv()
         self.db = Database("data/db.sqlite3")
         self.collector = DataCollector("data/db.sqlite3")
         self.tracker = PatternTracker("data/db.sqlite3")
-        self.alert_manager = AlertManager("data/db.sqlite3")
         token = os.getenv("TELEGRAM_TOKEN")
         chat_id = os.getenv("TELEGRAM_CHAT_ID")
         if not token or not chat_id:
             logger.warning("⚠️ Credenciales de Telegram no configuradas")
             self.notifier = None
         else:
-            self.notifier = TelegramNotifier(token, chat_id)
+            # Las alertas también llegan a los suscriptores (tabla subscribers) según sus filtros
+            self.notifier = FanoutNotifier(TelegramNotifier(token, chat_id, db=self.db), self.db)
+        # Con notificador, las alertas se encolan en alert_outbox junto con el estado de alertas
+        self.alert_manager = AlertManager("data/db.sqlite3", outbox=self.notifier is not None)
+        self.alert_manager.vip_patterns = self.tracker.registry.vip_patterns
+        # Las entregas a Telegram ocurren en un hilo aparte que drena el outbox: el ciclo solo encola
+        self.dispatcher = NotificationDispatcher(
+            self.notifier, db=self.db, coalescer=AlertCoalescer()
+        ).start() if self.notifier else None
         # self.daily_summary_file = "data/.last_summary" <-- DEPRECATED
         self.backup_control_file = "data/backups/.last_backup"
         # self.last_run_file = "data/.scheduler_last_run" <-- DEPRECATED
 
+        # El análisis de ventanas solo cambia cuando aparece un patrón VIP (se fuerza al arrancar)
+        self._window_analysis_pending = True
+        # Los reportes de ventanas se regeneran tras cambiar los agregados (y una vez al arrancar)
+        self._window_reports_stale = True
+        # Análisis (ventanas, resumen diario) en un hilo y pool de procesos propios: no frena la recolección
+        self.analysis = AnalysisExecutor("data/db.sqlite3") if HAS_NUMPY else None
+        # Se crea en el primer análisis de ventanas (hilo de análisis) y se conserva entre ciclos
+        self.window_analyzer = None
+
+        # Pipeline en memoria: los tiros insertados fluyen por las etapas sin releer la BD
+        self.pipeline = SpinPipeline()
+        self.pipeline.add_stage("tracker", self._stage_tracking)
+        self.pipeline.add_stage("alerts", self._stage_alerts)
+        self.pipeline.add_stage("rollups", self._stage_rollups)
+        self.pipeline.add_stage("notify", self._stage_notify)
+        self.cycle = CycleMetrics()
+
     def run(self):
+        self.cycle = CycleMetrics()
+        api = self.collector.api
+        requests_before, retries_before = api.request_count, api.retry_count
         try:
             logger.info("=" * 70)
             logger.info("🚀 INICIANDO CICLO DE ACTUALIZACIÓN")
             logger.info("=" * 70)
 
             # Obtener lotes (uno o más si hay brecha)
-            batches = self.collector.fetch_batches()
+            with self.cycle.stage("fetch"):
+                batches = self.collector.fetch_batches()
+            self.cycle.add_count("pages", len(batches))
             
             if not batches:
                 logger.info("✅ No hay datos nuevos, ciclo completado")
                 self._update_last_run()
                 return
 
-            total_new_spins = 0
-            
-            # Procesar cada lote de forma secuencial
-            for i, batch in enumerate(batches):
-                if len(batches) > 1:
-                    logger.info(f"🔄 Procesando lote de recuperación {i+1}/{len(batches)}...")
-                
-                # 1. Insertar datos del lote
-                inserted = self.db.insertar_datos(batch)
-                total_new_spins += inserted
-                
-                # 2. Solo si hubo inserciones reales en este lote, procesamos tracking y alertas
-                if inserted > 0:
-                    self._process_tracking()
-                    self._process_alerts()
+            if len(batches) > 1:
+                # Recuperación: insertar toda la escalera y reproducir tracking/alertas una sola vez
+                self.cycle.recovery = True
+                total_new_spins = self._run_recovery(batches)
+            else:
+                # 1. Insertar datos del lote (devuelve las filas con su ID real)
+                with self.cycle.stage("insert"):
+                    inserted_rows = self.db.insertar_tiros(batches[0])
+                total_new_spins = len(inserted_rows)
+
+                # 2. Solo si hubo inserciones reales, las filas recorren el pipeline en memoria
+                if inserted_rows:
+                    self._run_pipeline(inserted_rows)
+            self.cycle.add_count("rows_inserted", total_new_spins)
 
             # Si fue una recuperación (más de 1 lote), mostrar resumen explícito
             if len(batches) > 1:
@@ -85,6 +133,123 @@ class CrazyTimeScheduler:
         except Exception as e:
             logger.error(f"❌ ERROR CRÍTICO EN CICLO: {e}", exc_info=True)
             self._send_error_alert(e)
+        finally:
+            self.cycle.add_count("requests", api.request_count - requests_before)
+            self.cycle.add_count("retries", api.retry_count - retries_before)
+            self._record_cycle_metrics()
+
+    def _run_pipeline(self, rows: list, **extra):
+        """Ejecuta el pipeline y vuelca la latencia de cada etapa en las métricas del ciclo."""
+        self.pipeline.run(rows, **extra)
+        for stage, seconds in self.pipeline.last_timings.items():
+            self.cycle.add_time(self.PIPELINE_METRICS.get(stage, stage), seconds)
+        logger.info(f"⏱️ Pipeline: {self.pipeline.format_timings()}")
+
+    def _record_cycle_metrics(self):
+        self.cycle.finish()
+        for stage, ms in self.cycle.timings_ms.items():
+            if stage == "total":
+                CYCLE_SECONDS.observe(ms / 1000)
+            else:
+                STAGE_SECONDS.observe(ms / 1000, stage=stage)
+        ROWS_INSERTED.inc(self.cycle.counts.get("rows_inserted", 0))
+        if self.cycle.recovery:
+            RECOVERIES.inc()
+        self.db.record_cycle_metrics(
+            self.cycle.started_at, self.cycle.timings_ms, self.cycle.counts, recovery=self.cycle.recovery
+        )
+
+    def _run_recovery(self, batches: list) -> int:
+        """
+        Inserta la escalera completa y luego pasa el backlog cronológico por el
+        pipeline en una sola pasada (una carga/guardado de estado, un envío).
+        """
+        backlog = []
+        for i, batch in enumerate(batches):
+            logger.info(f"🔄 Procesando lote de recuperación {i+1}/{len(batches)}...")
+            with self.cycle.stage("insert"):
+                backlog.extend(self.db.insertar_tiros(batch))
+
+        if backlog:
+            backlog.sort(key=lambda s: s["id"])
+            logger.info(f"⏩ Replay diferido: {len(backlog)} tiros en una sola pasada")
+            self._run_pipeline(backlog, recovery=True)
+        return len(backlog)
+
+    def _split_stale_alerts(self, alerts: list, newest_spin: dict) -> tuple[list, list]:
+        """
+        Separa alertas accionables de históricas tras una recuperación.
+
+        - Umbral: accionable mientras la racha siga abierta (sin hit posterior).
+        - Hit: accionable si ocurrió hace menos de RECOVERY_ALERT_MAX_AGE_MINUTES.
+        """
+        from alerting.alert_manager import AlertType
+        try:
+            newest_time = datetime.fromisoformat(newest_spin["timestamp"])
+        except Exception:
+            newest_time = datetime.now()
+        max_age = timedelta(minutes=self.RECOVERY_ALERT_MAX_AGE_MINUTES)
+
+        actionable, stale = [], []
+        for alert in alerts:
+            if alert.type == AlertType.THRESHOLD_REACHED:
+                last_hit = self.tracker.get_pattern_state(alert.pattern_id).get("last_id") or 0
+                is_stale = last_hit >= alert.details.get("spin_id", 0)
+            else:
+                is_stale = newest_time - alert.timestamp > max_age
+            (stale if is_stale else actionable).append(alert)
+        return actionable, stale
+
+    def _send_recovery_summary(self, stale: list, spins: list):
+        """
+        Sustituye en el outbox las alertas históricas de una recuperación por un resumen.
+
+        El resumen se parte en mensajes de menos de RECOVERY_SUMMARY_MAX_CHARS,
+        cada uno con su propia clave de idempotencia.
+        """
+        from alerting.alert_manager import AlertType
+        lines = []
+        for alert in stale:
+            hora = alert.timestamp.strftime("%H:%M:%S")
+            if alert.type == AlertType.THRESHOLD_REACHED:
+                lines.append(f"🟡 {hora} • {alert.pattern_name}: umbral {alert.value}")
+            else:
+                lines.append(f"🎉 {hora} • {alert.pattern_name}: salió a {alert.spin_count} tiros")
+
+        # Margen para la cabecera "(parte i/n)"
+        budget = self.RECOVERY_SUMMARY_MAX_CHARS - 100
+        chunks, current, size = [], [], 0
+        for line in lines:
+            if current and size + len(line) + 1 > budget:
+                chunks.append(current)
+                current, size = [], 0
+            current.append(line)
+            size += len(line) + 1
+        chunks.append(current)
+
+        base_key = f"recovery_summary:{spins[0]['id']}-{spins[-1]['id']}"
+        entries = []
+        for i, chunk in enumerate(chunks, 1):
+            cabecera = f"📚 <b>RECUPERACIÓN: {len(stale)} ALERTAS HISTÓRICAS</b>"
+            if len(chunks) > 1:
+                cabecera += f" (parte {i}/{len(chunks)})"
+            entries.append({
+                "idempotency_key": f"{base_key}:{i}",
+                "kind": "recovery_summary",
+                "payload": {"text": cabecera + "\n\n" + "\n".join(chunk)}
+            })
+        self.db.summarize_outbox([a.idempotency_key for a in stale], entries)
+
+    def close(self, timeout: float = 30.0):
+        """Vacía las notificaciones pendientes y libera los hilos (llamar antes de salir del proceso)."""
+        if self.analysis:
+            # Antes que el dispatcher: un resumen diario en curso todavía puede encolar su envío
+            self.analysis.shutdown()
+        if self.dispatcher:
+            self.dispatcher.stop(timeout)
+        if self.notifier:
+            self.notifier.close()
+        self.collector.close()
 
     def _update_last_run(self):
         """Registra timestamp de última ejecución en BD"""
@@ -99,49 +264,109 @@ class CrazyTimeScheduler:
             logger.error(f"❌ Error actualizando datos: {e}", exc_info=True)
             return 0
 
-    def _process_tracking(self):
-        try:
-            logger.info("📊 Procesando tracking de distancias...")
-            processed = self.tracker.process_new_spins()
-            if processed > 0:
-                logger.info(f"✅ Tracking: {processed} tiros procesados")
-        except Exception as e:
-            logger.error(f"❌ Error en tracking: {e}", exc_info=True)
-
-    def _process_alerts(self):
-        try:
-            logger.info("🚨 Evaluando alertas...")
-            alerts = self.alert_manager.check_all_patterns()
-            if not alerts:
-                logger.info("✅ Sin alertas que enviar")
-                return
-            logger.info(f"📤 {len(alerts)} alertas detectadas")
-            if not self.notifier:
-                logger.warning("⚠️ Notificador no disponible, alertas no enviadas")
+    def _stage_tracking(self, ctx: dict):
+        # Altas/bajas/retoques del registro de patrones se aplican antes del lote
+        if self.tracker.reload_patterns():
+            self.alert_manager.vip_patterns = self.tracker.registry.vip_patterns
+            self._window_analysis_pending = True
+        self._tracker_backfill()
+        logger.info("📊 Procesando tracking de distancias...")
+        processed, occurrences = self.tracker.process_spins(ctx["spins"])
+        if len(processed) != len(ctx["spins"]):
+            # El tracker completó un hueco desde la BD: el contexto pasa a incluirlo
+            ctx["spins"] = processed
+            ctx["spins_by_id"] = {s["id"]: s for s in processed}
+        ctx["occurrences"] = occurrences
+        if processed:
+            logger.info(f"✅ Tracking: {len(processed)} tiros procesados")
+
+    def _tracker_backfill(self):
+        """
+        Relleno de historial de patrones nuevos: la pasada por `tiros` corre en el
+        hilo de análisis y su resultado se incorpora en un ciclo posterior, así la
+        recolección y las alertas VIP no esperan a que termine.
+        """
+        if self.tracker.backfill is None:
+            return
+        if not self.tracker.backfill_done():
+            if self.analysis:
+                self.analysis.submit("tracker_backfill", self._timed_tracker_backfill)
                 return
-            for alert in alerts:
-                try:
-                    self.notifier.send_alert(alert)
-                    logger.info(f"✅ Alerta enviada: {alert.pattern_name} ({alert.type.value})")
-                except Exception as e:
-                    logger.error(f"Error enviando alerta: {e}")
-        except Exception as e:
-            logger.error(f"❌ Error procesando alertas: {e}", exc_info=True)
+            self._timed_tracker_backfill()
+        if self.tracker.apply_backfill():
+            self._window_analysis_pending = True
+
+    def _timed_tracker_backfill(self):
+        with STAGE_SECONDS.time(stage="backfill"):
+            self.tracker.run_backfill()
+
+    def _stage_alerts(self, ctx: dict):
+        logger.info("🚨 Evaluando alertas...")
+        # Evaluación por tiro: cada aparición VIP del lote (o del backlog de recuperación) se
+        # evalúa en orden, así no se pierden hits/umbrales intermedios
+        ctx["alerts"] = self.alert_manager.check_all_patterns(
+            tracker_states=self.tracker.pattern_states,
+            spins_by_id=ctx["spins_by_id"],
+            current_max_id=ctx["max_id"],
+            occurrences=ctx.get("occurrences", []),
+            hold_seconds=self.RECOVERY_OUTBOX_HOLD_S if ctx.get("recovery") else 0
+        )
+
+    def _stage_rollups(self, ctx: dict):
+        """Agrega conteos del lote y marca el análisis de ventanas si hubo apariciones VIP."""
+        counts = {}
+        for spin in ctx["spins"]:
+            counts[spin["resultado"]] = counts.get(spin["resultado"], 0) + 1
+        occurrences = {}
+        for occ in ctx.get("occurrences", []):
+            occurrences[occ["pattern_id"]] = occurrences.get(occ["pattern_id"], 0) + 1
+        ctx["rollups"] = {"results": counts, "occurrences": occurrences}
+
+        if any(p.id in occurrences for p in self.tracker.registry.vip_patterns):
+            self._window_analysis_pending = True
+
+    def _stage_notify(self, ctx: dict):
+        alerts = ctx.get("alerts", [])
+        if not alerts:
+            logger.info("✅ Sin alertas que enviar")
+            return
+        logger.info(f"📤 {len(alerts)} alertas detectadas")
+        if not self.dispatcher:
+            logger.warning("⚠️ Notificador no disponible, alertas no enviadas")
+            return
+        if ctx.get("recovery"):
+            alerts, stale = self._split_stale_alerts(alerts, ctx["spins"][-1])
+            if stale:
+                logger.info(f"📚 {len(stale)} alertas históricas resumidas en un mensaje")
+                self._send_recovery_summary(stale, ctx["spins"])
+            self.db.release_outbox([a.idempotency_key for a in alerts])
+        # Las alertas ya están en alert_outbox (misma transacción que el estado); se despierta al hilo
+        for alert in alerts:
+            logger.info(f"✅ Alerta encolada: {alert.pattern_name} ({alert.type.value})")
+        self.dispatcher.wake()
+        stats = self.dispatcher.stats()
+        logger.info(f"📬 Notificaciones: {stats['outbox_pending']} en outbox, {stats['depth']} en cola "
+                    f"(entregadas={stats['delivered']}, fallidas={stats['failed']}, descartadas={stats['dropped']})")
 
     def _run_window_analysis(self):
         """
         Ejecuta análisis de ventanas si hay datos suficientes.
 
-        Criterio: Al menos 10 apariciones de algún patrón VIP.
+        Criterio: Al menos 10 apariciones de algún patrón VIP y alguna aparición
+        VIP nueva desde el último análisis (el resultado solo depende de ellas).
+        Solo se incorporan a window_aggregates las apariciones nuevas; los
+        reportes completos (JSON/Excel) se regeneran aparte cuando cambian los
+        agregados, como mucho una vez por WINDOW_REPORTS_INTERVAL_S (_scheduled_tasks).
         """
         try:
-            from analytics.window_analyzer import WindowAnalyzer
-            from config.patterns import VIP_PATTERNS
+            if not self._window_analysis_pending:
+                logger.debug("📊 Analytics: Sin apariciones VIP nuevas, análisis omitido")
+                return
 
             # Verificar si hay suficientes datos
             should_analyze = False
 
-            for pattern in VIP_PATTERNS:
+            for pattern in self.tracker.registry.vip_patterns:
                 state = self.tracker.get_pattern_state(pattern.id)
                 count = state.get("prev_distance", 0) if state.get("last_id") else 0
 
@@ -154,35 +379,65 @@ class CrazyTimeScheduler:
                 logger.debug("📊 Analytics: Datos insuficientes (<10 apariciones)")
                 return
 
-            logger.info("📊 Ejecutando análisis de ventanas...")
+            if self.analysis:
+                if self.analysis.submit("window_analysis", self._timed_window_update):
+                    self._window_analysis_pending = False
+            else:
+                with self.cycle.stage("window"):
+                    self._update_window_aggregates()
+                self._window_analysis_pending = False
 
-            analyzer = WindowAnalyzer('data/db.sqlite3')
-            results = analyzer.analyze_all_patterns()
+        except Exception as e:
+            logger.error(f"❌ Error en análisis de ventanas: {e}", exc_info=True)
 
-            # Log de resultados
-            for pattern_id, data in results.items():
-                pattern_name = data.get('pattern_name', pattern_id)
-                windows = data.get('windows', {})
+    def _timed_window_update(self):
+        """En segundo plano el ciclo ya se registró: la duración real va solo al histograma de etapas."""
+        with STAGE_SECONDS.time(stage="window"):
+            self._update_window_aggregates()
+
+    def _update_window_aggregates(self):
+        logger.info("📊 Ejecutando análisis de ventanas...")
+        results = self._get_window_analyzer().update_aggregates()
+        if any(data.get('new_occurrences') for data in results.values()):
+            self._window_reports_stale = True
+
+        # Log de resultados (solo patrones con apariciones nuevas)
+        for pattern_id, data in results.items():
+            if not data.get('new_occurrences'):
+                continue
+            pattern_name = data.get('pattern_name', pattern_id)
+            windows = data.get('windows', {})
+
+            for window_range, metrics in windows.items():
+                roi = metrics.get('roi', 0)
+                win_rate = metrics.get('win_rate', 0)
+                logger.info(
+                    f"   📈 {pattern_name} (Ventana {window_range}): "
+                    f"ROI={roi:+.1f}%, Win Rate={win_rate:.1f}%{format_ci(metrics)}"
+                )
 
-                for window_range, metrics in windows.items():
-                    roi = metrics.get('roi', 0)
-                    win_rate = metrics.get('win_rate', 0)
-                    logger.info(
-                        f"   📈 {pattern_name} (Ventana {window_range}): "
-                        f"ROI={roi:+.1f}%, Win Rate={win_rate:.1f}%"
-                    )
+        logger.info("✅ Análisis de ventanas completado")
 
-            logger.info("✅ Análisis de ventanas completado")
+    def _get_window_analyzer(self):
+        """Un solo analizador para todo el servicio: conserva las rachas de cada patrón entre ciclos."""
+        from analytics.window_analyzer import WindowAnalyzer
 
-        except Exception as e:
-            logger.error(f"❌ Error en análisis de ventanas: {e}", exc_info=True)
+        if self.window_analyzer is None:
+            self.window_analyzer = WindowAnalyzer('data/db.sqlite3')
+        else:
+            self.window_analyzer.refresh_patterns()
+        return self.window_analyzer
 
     def _scheduled_tasks(self):
         try:
             if self._should_send_daily_summary():
-                self._send_daily_summary()
+                with self.cycle.stage("notify"):
+                    self._send_daily_summary()
+            if self._should_run_window_reports():
+                self._run_window_reports()
             if self._should_run_backup():
-                self._run_backup()
+                with self.cycle.stage("backup"):
+                    self._run_backup()
         except Exception as e:
             logger.error(f"❌ Error en tareas programadas: {e}")
 
@@ -214,20 +469,27 @@ class CrazyTimeScheduler:
             return False
 
     def _send_daily_summary(self):
+        if self.analysis:
+            # El reporte recorre el día entero: se genera en el hilo de análisis (una vez aunque se pida en varios ciclos)
+            self.analysis.submit("daily_summary", self._generate_daily_summary)
+        else:
+            self._generate_daily_summary()
+
+    def _generate_daily_summary(self):
         try:
             logger.info("📊 Generando resumen diario estratégico...")
             
             # Delegar lógica al generador especializado
             from analytics.daily_report import DailyReportGenerator
             generator = DailyReportGenerator("data/db.sqlite3")
-            full_report = generator.generate()
+            full_report = generator.generate(executor=self.analysis)
 
             if not full_report:
                 logger.info("ℹ️ Sin datos suficientes para resumen diario")
                 return
 
-            if self.notifier:
-                self.notifier.enviar_resumen_diario(full_report)
+            if self.dispatcher:
+                self.dispatcher.submit("daily_summary", self.notifier.enviar_resumen_diario, full_report)
                 today = datetime.now().strftime("%Y-%m-%d")
                 # Guardar estado en BD
                 self.db.set_state("scheduler", "last_summary_date", today)
@@ -236,6 +498,39 @@ class CrazyTimeScheduler:
         except Exception as e:
             logger.error(f"❌ Error enviando resumen diario: {e}", exc_info=True)
 
+    def _should_run_window_reports(self) -> bool:
+        if not self._window_reports_stale:
+            return False
+        last_run = self.db.get_state("scheduler", "last_window_reports")
+        if not last_run:
+            return True
+        elapsed = (datetime.now() - datetime.fromisoformat(last_run)).total_seconds()
+        return elapsed >= self.WINDOW_REPORTS_INTERVAL_S
+
+    def _run_window_reports(self):
+        if self.analysis:
+            # Recorre el historial de cada patrón: en el hilo de análisis, con las métricas en el pool
+            self.analysis.submit("window_reports", self._generate_window_reports)
+        else:
+            with self.cycle.stage("window"):
+                self._generate_window_reports()
+
+    def _generate_window_reports(self):
+        """
+        Reportes de ventanas (data/analytics: JSON por patrón, consolidado y Excel).
+        Los patrones sin apariciones nuevas conservan sus reportes (misma huella).
+        """
+        try:
+            logger.info("📊 Generando reportes de ventanas...")
+            # Antes de empezar: los agregados que cambien durante la generación piden otra
+            self._window_reports_stale = False
+            self._get_window_analyzer().analyze_all_patterns(executor=self.analysis)
+            self.db.set_state("scheduler", "last_window_reports", datetime.now().isoformat())
+            logger.info("✅ Reportes de ventanas actualizados")
+        except Exception as e:
+            self._window_reports_stale = True
+            logger.error(f"❌ Error generando reportes de ventanas: {e}", exc_info=True)
+
     def _should_run_backup(self) -> bool:
         try:
             if not os.path.exists(self.backup_control_file):
@@ -262,12 +557,13 @@ class CrazyTimeScheduler:
 
     def _send_error_alert(self, error: Exception):
         try:
-            if self.notifier:
-                self.notifier.send_message(
+            if self.dispatcher:
+                self.dispatcher.submit_message(
                     f"🚨 <b>ERROR CRÍTICO EN SISTEMA</b>\n\n"
                     f"<code>{type(error).__name__}: {str(error)}</code>\n\n"
                     f"Hora: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
-                    f"Revisar logs del sistema"
+                    f"Revisar logs del sistema",
+                    kind="error"
                 )
         except:
             pass
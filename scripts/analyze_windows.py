@@ -1,41 +1,56 @@
 """
 scripts/analyze_windows.py - Análisis manual de ventanas.
+
+Uso:
+    python scripts/analyze_windows.py
+    python scripts/analyze_windows.py --workers 4
+    python scripts/analyze_windows.py --serial
+    python scripts/analyze_windows.py --force      # regenerar reportes aunque no haya apariciones nuevas
 """
 
 import sys
 import os
+import argparse
 import logging
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from analytics.window_analyzer import WindowAnalyzer
-from analytics.pattern_tracker import PatternTracker
-from config.patterns import VIP_PATTERNS
+from analytics.analysis_executor import AnalysisExecutor, HAS_NUMPY
 
 def main():
+    parser = argparse.ArgumentParser(description="Análisis histórico de ventanas")
+    parser.add_argument("--db", type=str, default="data/db.sqlite3")
+    parser.add_argument("--workers", type=int, help="Procesos del pool (por defecto, según CPUs)")
+    parser.add_argument("--serial", action="store_true", help="Sin pool de procesos")
+    parser.add_argument("--force", action="store_true", help="Regenerar todos los reportes")
+    args = parser.parse_args()
+
     logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(message)s")
     logger = logging.getLogger(__name__)
     logger.info("=" * 70)
     logger.info("📊 ANÁLISIS DE VENTANAS - CRAZYTIME")
     logger.info("=" * 70)
+    executor = None
     try:
-        tracker = PatternTracker("data/db.sqlite3")
-        analyzer = WindowAnalyzer("data/db.sqlite3")
-        results = analyzer.analyze_all_patterns()
+        analyzer = WindowAnalyzer(args.db)
+        if HAS_NUMPY and not args.serial:
+            executor = AnalysisExecutor(args.db, max_workers=args.workers)
+        results = analyzer.analyze_all_patterns(executor=executor, force=args.force)
         print("\n" + "=" * 70)
         print("RESUMEN DEL ANÁLISIS")
         print("=" * 70)
-        for pattern in VIP_PATTERNS:
-            pattern_results = results.get(pattern.id, {})
-            thresholds = pattern_results.get("thresholds", {})
-            print(f"\n{pattern.name.upper()}")
+        for pattern_results in results.values():
+            print(f"\n{pattern_results['pattern_name'].upper()}")
             print("-" * 70)
-            for threshold_str, data in thresholds.items():
-                print(f"\n  Umbral {threshold_str}:")
-                print(f"    Ventana: tiros {data['window_start_offset']}-{data['window_end_offset']}")
-                print(f"    Oportunidades: {data['total_opportunities']}")
-                print(f"    Aciertos: {data['hits_in_window']} ({data['hit_rate']}%)")
+            for window_range, data in pattern_results.get("windows", {}).items():
+                print(f"\n  Ventana {window_range}:")
+                print(f"    Oportunidades: {data['entries']}")
+                print(f"    Aciertos: {data['wins']} ({data['win_rate']}%)")
                 print(f"    ROI: {data['roi']:+.2f}%")
+                if data.get("roi_ci"):
+                    print(f"    IC 95%: win rate {data['win_rate_ci'][0]:.1f}–{data['win_rate_ci'][1]:.1f}%, "
+                          f"ROI {data['roi_ci'][0]:+.1f}–{data['roi_ci'][1]:+.1f}%")
                 print(f"    Ganancia/Pérdida: {data['profit_loss']:+.2f}")
         print("\n" + "=" * 70)
         print("✅ Análisis completado")
@@ -44,6 +59,9 @@ def main():
     except Exception as e:
         logger.error(f"❌ Error: {e}", exc_info=True)
         sys.exit(1)
+    finally:
+        if executor:
+            executor.shutdown()
 
 if __name__ == "__main__":
     main()
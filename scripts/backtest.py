@@ -0,0 +1,112 @@
+"""
+scripts/backtest.py - Barrido de estrategias de apuesta contra el historial de tiros.
+
+Combina todas las opciones dadas (conjuntos de ventanas × stakes × progresiones
+× stop-loss) y las simula en una sola pasada por el historial (ver
+analytics/backtester.py). Por defecto prueba cada betting_window del patrón
+por separado y todas juntas.
+
+Uso:
+    python scripts/backtest.py pachinko
+    python scripts/backtest.py pachinko --progressions 1,1.5,2 --max-stake 16 --stop-losses 0,50,100
+    python scripts/backtest.py crazytime --windows "201-230;201-230,261-290" --stakes 1,2 \\
+        --workers 4 --csv crazytime_backtest.csv --curves crazytime_curves.csv
+"""
+
+import sys
+import os
+import csv
+import time
+import argparse
+import itertools
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analytics.backtester import HAS_NUMPY, Backtester, Strategy
+
+RESULT_COLUMNS = ("strategy", "final_equity", "profit_loss", "staked", "returned", "roi",
+                  "max_drawdown", "max_drawdown_pct", "streaks_played", "wins", "stop_loss_days", "ruined",
+                  "ruined_at")
+
+def parse_floats(value: str) -> list[float]:
+    return [float(v) for v in value.split(",") if v.strip()]
+
+def parse_window_sets(value: str) -> list[tuple[tuple[int, int], ...]]:
+    sets = []
+    for group in value.split(";"):
+        windows = []
+        for item in group.split(","):
+            start, _, end = item.strip().partition("-")
+            windows.append((int(start), int(end)))
+        sets.append(tuple(windows))
+    return sets
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtesting de estrategias por ventanas")
+    parser.add_argument("pattern_id")
+    parser.add_argument("--db", type=str, default="data/db.sqlite3")
+    parser.add_argument("--windows", type=str, help="Conjuntos de ventanas separados por ';', p.ej. '61-90;61-90,121-150'")
+    parser.add_argument("--stakes", type=str, default="1")
+    parser.add_argument("--progressions", type=str, default="1", help="Multiplicador tras racha perdida (1 = plana)")
+    parser.add_argument("--max-stake", type=float, help="Tope de apuesta por tiro con progresión")
+    parser.add_argument("--stop-losses", type=str, default="0", help="Pérdida máxima por jornada (0 = sin stop)")
+    parser.add_argument("--bankroll", type=float, default=1000.0)
+    parser.add_argument("--through-id", type=int, help="Simular solo hasta este ID")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--csv", type=str, help="Exportar todos los resultados a este CSV")
+    parser.add_argument("--curves", type=str, help="Exportar las curvas de equity del top a este CSV")
+    args = parser.parse_args()
+
+    if not HAS_NUMPY:
+        raise SystemExit("❌ Se necesita numpy (pip install numpy)")
+
+    backtester = Backtester(args.db)
+    pattern = backtester.patterns.get(args.pattern_id)
+    if not pattern:
+        raise SystemExit(f"❌ Patrón desconocido: {args.pattern_id}")
+    if args.windows:
+        window_sets = parse_window_sets(args.windows)
+    else:
+        configured = [tuple(w) for w in pattern.betting_windows]
+        window_sets = [(w,) for w in configured] + ([tuple(configured)] if len(configured) > 1 else [])
+    if not window_sets or not all(window_sets):
+        raise SystemExit(f"❌ {pattern.id} no tiene betting_windows: indica --windows")
+
+    strategies = [
+        Strategy(pattern.id, windows, stake, progression, args.max_stake if progression != 1 else None,
+                 stop_loss or None, args.bankroll)
+        for windows, stake, progression, stop_loss in itertools.product(
+            window_sets, parse_floats(args.stakes), parse_floats(args.progressions), parse_floats(args.stop_losses))
+    ]
+
+    t0 = time.perf_counter()
+    results = backtester.run(strategies, through_id=args.through_id, max_workers=args.workers)
+    elapsed = time.perf_counter() - t0
+    print(f"🧪 {pattern.name}: {len(strategies)} estrategias en {elapsed:.2f}s")
+
+    ranked = sorted(results, key=lambda r: r["profit_loss"], reverse=True)
+    print(f"\n{'estrategia':<48} {'equity':>10} {'P/L':>10} {'ROI':>8} {'max DD':>9} {'DD %':>7} {'rachas':>7} {'aciertos':>8}")
+    for r in ranked[:args.top]:
+        print(f"{r['strategy'][:48]:<48} {r['final_equity']:>10.1f} {r['profit_loss']:>+10.1f} {r['roi']:>+7.1f}% "
+              f"{r['max_drawdown']:>9.1f} {r['max_drawdown_pct']:>6.1f}% {r['streaks_played']:>7} {r['wins']:>8}"
+              f"{'  💀' if r['ruined'] else ''}")
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(RESULT_COLUMNS)
+            for r in results:
+                writer.writerow([r[c] for c in RESULT_COLUMNS])
+        print(f"\n📁 Resultados exportados a {args.csv}")
+    if args.curves:
+        with open(args.curves, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["strategy", "spin_id", "equity"])
+            for r in ranked[:args.top]:
+                for spin_id, equity in r["equity_curve"]:
+                    writer.writerow([r["strategy"], spin_id, equity])
+        print(f"📁 Curvas de equity (top {args.top}) exportadas a {args.curves}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+scripts/bench_bootstrap.py - Benchmark del bootstrap vectorizado de ventanas.
+
+Genera rachas sintéticas (distancias geométricas con la probabilidad real del
+patrón y pagos del tamaño de un bonus) y compara, para varios tamaños de muestra:
+  - loop:       una réplica a la vez, recorriendo las rachas remuestreadas en Python
+                (la regla de WindowAnalyzer._analyze_window_zone)
+  - vectorized: analytics.bootstrap.bootstrap_windows (conteos @ valores por lotes)
+
+Ambos usan los mismos índices remuestreados, así que los intervalos deben coincidir.
+El bucle se mide con --loop-resamples réplicas y se extrapola al total.
+
+Uso:
+    python scripts/bench_bootstrap.py
+    python scripts/bench_bootstrap.py --sizes 50,500,5000,50000 --resamples 2000
+"""
+
+import sys
+import os
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analytics.bootstrap import (HAS_NUMPY, BATCH_ELEMENTS, DEFAULT_RESAMPLES,
+                                 bootstrap_windows, resample_count)
+from config.patterns import PACHINKO, get_window_range
+
+if HAS_NUMPY:
+    import numpy as np
+
+def loop_bootstrap(distances, payouts, windows, n_resamples: int, seed: int = 0):
+    """Referencia: mismas réplicas que bootstrap_windows, métricas en Python."""
+    n = len(distances)
+    rng = np.random.default_rng(seed)
+    batch = max(1, BATCH_ELEMENTS // n)
+    rows = []
+    for first in range(0, n_resamples, batch):
+        for sample in rng.integers(0, n, size=(min(batch, n_resamples - first), n)):
+            row = []
+            for w_start, w_end in windows:
+                entries, wins, paid = 0, 0, 0.0
+                for i in sample:
+                    d = distances[i]
+                    if d >= w_start:
+                        entries += 1
+                        if d <= w_end:
+                            wins += 1
+                            paid += payouts[i]
+                invested = entries * (w_end - w_start + 1)
+                row += [wins / entries * 100 if entries else np.nan,
+                        (paid - invested) / invested * 100 if invested else np.nan]
+            rows.append(row)
+    rows = np.array(rows)
+    return [{"win_rate_ci": [round(float(x), 2) for x in np.nanpercentile(rows[:, 2 * j], [2.5, 97.5])],
+             "roi_ci": [round(float(x), 2) for x in np.nanpercentile(rows[:, 2 * j + 1], [2.5, 97.5])]}
+            for j in range(len(windows))]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del bootstrap de ventanas")
+    parser.add_argument("--sizes", type=str, default="50,500,5000,50000", help="Número de rachas")
+    parser.add_argument("--resamples", type=int, default=DEFAULT_RESAMPLES)
+    parser.add_argument("--loop-resamples", type=int, default=200, help="Réplicas medidas en el bucle")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    if not HAS_NUMPY:
+        raise SystemExit("❌ Se necesita numpy (pip install numpy)")
+
+    rng = np.random.default_rng(args.seed)
+    windows = [get_window_range(t) for t in PACHINKO.warning_thresholds]
+    print(f"Ventanas: {windows}  réplicas pedidas: {args.resamples}")
+    print(f"{'rachas':>8} {'réplicas':>9} {'loop (s)':>10} {'vector (s)':>11} {'speedup':>8}  iguales")
+    for n in (int(s) for s in args.sizes.split(",")):
+        distances = rng.geometric(1 / 54, size=n)
+        payouts = rng.choice([5, 10, 20, 50, 100, 200], size=n).astype(float)
+        total = resample_count(n, args.resamples)
+
+        t0 = time.perf_counter()
+        fast = bootstrap_windows(distances, payouts, windows, n_resamples=total)
+        vector_s = time.perf_counter() - t0
+
+        measured = min(total, args.loop_resamples)
+        t0 = time.perf_counter()
+        slow = loop_bootstrap(distances.tolist(), payouts.tolist(), windows, measured)
+        loop_s = (time.perf_counter() - t0) * total / measured
+        # Con el mismo número de réplicas los intervalos deben coincidir exactamente
+        same = slow == [{k: c[k] for k in ("win_rate_ci", "roi_ci")}
+                        for c in bootstrap_windows(distances, payouts, windows, n_resamples=measured)]
+        print(f"{n:>8} {total:>9} {loop_s:>10.2f} {vector_s:>11.3f} {loop_s / vector_s:>7.0f}x  {'sí' if same else 'NO'}")
+        print(f"{'':>8} {fast[0]['roi_ci']} ROI IC95% ventana {windows[0]}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+scripts/bench_fanout.py - Benchmark de FanoutNotifier con cientos de suscriptores.
+
+Registra N suscriptores en una BD temporal (con filtros variados), levanta el
+stand-in local de la Bot API y entrega una ráfaga de alertas con distintos
+niveles de paralelismo, midiendo mensajes por segundo y latencia por chat.
+
+Uso:
+    python scripts/bench_fanout.py --subscribers 300 --latency-ms 30
+    python scripts/bench_fanout.py --subscribers 500 --parallel 1,16,64 --global-rate 30
+"""
+
+import sys
+import os
+import time
+import argparse
+import logging
+import tempfile
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from alerting.alert_manager import Alert, AlertType
+from alerting.fanout import FanoutNotifier
+from alerting.notification import TelegramNotifier
+from core.database import Database
+from simulation.telegram_server import TelegramStandIn
+
+TOKEN = "123456:STANDIN"
+CHAT_ID = "42"
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))] if ordered else 0.0
+
+def register_subscribers(db: Database, n: int):
+    """Un tercio recibe todo, un tercio un solo patrón y un tercio solo salidas."""
+    for i in range(n):
+        if i % 3 == 0:
+            db.upsert_subscriber(str(1000 + i), f"sub{i}")
+        elif i % 3 == 1:
+            db.upsert_subscriber(str(1000 + i), f"sub{i}", patterns=[["pachinko", "crazytime"][i % 2]])
+        else:
+            db.upsert_subscriber(str(1000 + i), f"sub{i}", alert_types=[AlertType.PATTERN_HIT.value])
+
+def make_alerts(n: int, offset: int) -> list[Alert]:
+    alerts = []
+    for i in range(n):
+        pattern_id, name = [("pachinko", "Pachinko"), ("crazytime", "Crazy Time")][i % 2]
+        alert_type = AlertType.PATTERN_HIT if i % 2 else AlertType.THRESHOLD_REACHED
+        alerts.append(Alert(alert_type, pattern_id, name, 60 + i, 60 + i, datetime.now(),
+                            {"spin_id": offset + i, "bonus_multiplier": 20}))
+    return alerts
+
+def run(standin: TelegramStandIn, db: Database, parallel: int, rounds: int, group: int,
+        chat_rate: float, global_rate: float) -> dict:
+    notifier = TelegramNotifier(TOKEN, CHAT_ID, base_url=standin.base_url, db=db,
+                                pool_size=max(8, parallel), chat_rate=chat_rate or None,
+                                global_rate=global_rate or None)
+    fanout = FanoutNotifier(notifier, db, max_parallel=parallel)
+    notifier.send_message("warmup")  # getMe y subida inicial de imágenes fuera de la medición
+    fanout.send_alert_group(make_alerts(group, offset=0))
+
+    # Latencia por chat: desde el inicio de la ronda hasta que su envío termina
+    latencies, round_start = [], [0.0]
+    send = notifier._send_message_async
+
+    async def timed_send(*args, **kwargs):
+        ok = await send(*args, **kwargs)
+        latencies.append(time.perf_counter() - round_start[0])
+        return ok
+
+    notifier._send_message_async = timed_send
+    standin.reset()
+    t0 = time.perf_counter()
+    ok = True
+    for r in range(rounds):
+        round_start[0] = time.perf_counter()
+        ok &= fanout.send_alert_group(make_alerts(group, offset=(r + 1) * 1000))
+    elapsed = time.perf_counter() - t0
+    notifier.close()
+    return {"messages": len(latencies), "seconds": elapsed, "ok": ok, "latencies": latencies,
+            "requests": standin.stats["requests"], "uploads": standin.stats["uploads"]}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de fan-out contra stand-in local")
+    parser.add_argument("--subscribers", type=int, default=300)
+    parser.add_argument("--rounds", type=int, default=3, help="Ráfagas de alertas entregadas")
+    parser.add_argument("--group", type=int, default=2, help="Alertas por ráfaga")
+    parser.add_argument("--parallel", type=str, default="1,4,16,64", help="Niveles de paralelismo")
+    parser.add_argument("--latency-ms", type=float, default=30, help="Latencia simulada de la Bot API")
+    parser.add_argument("--jitter-ms", type=float, default=10)
+    parser.add_argument("--chat-rate", type=float, default=1.0, help="Mensajes/s por chat (0 = sin límite)")
+    parser.add_argument("--global-rate", type=float, default=0, help="Mensajes/s del bot (0 = sin límite; Telegram ~30)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    print(f"{'paralelo':>8} {'msgs':>6} {'seg':>8} {'msg/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'subidas':>8} {'ok':>4}")
+    with tempfile.TemporaryDirectory() as tmp, \
+            TelegramStandIn(latency_ms=args.latency_ms, latency_jitter_ms=args.jitter_ms) as standin:
+        db = Database(os.path.join(tmp, "db.sqlite3"))
+        register_subscribers(db, args.subscribers)
+        for parallel in (int(p) for p in args.parallel.split(",")):
+            r = run(standin, db, parallel, args.rounds, args.group, args.chat_rate, args.global_rate)
+            print(f"{parallel:>8} {r['messages']:>6} {r['seconds']:>8.2f} {r['messages'] / r['seconds']:>8.1f} "
+                  f"{percentile(r['latencies'], 0.5) * 1000:>8.1f} {percentile(r['latencies'], 0.99) * 1000:>8.1f} "
+                  f"{r['uploads']:>8} {'sí' if r['ok'] else 'no':>4}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+scripts/bench_notifier.py - Benchmark de throughput de TelegramNotifier sin red.
+
+Levanta el stand-in local de la Bot API y mide mensajes por segundo en tres
+modos:
+  - legacy:     run_until_complete por mensaje en el hilo llamador y foto re-subida
+                siempre (comportamiento anterior)
+  - sync:       send_message sobre el loop persistente (uno a la vez)
+  - pipelined:  submit_message con hasta --concurrency envíos en vuelo
+
+Con --burst N encola N alertas de golpe en un outbox temporal y compara el
+dispatcher sin y con coalescing bajo el presupuesto por chat (--chat-rate).
+
+Con --backpressure N se encolan N mensajes en el dispatcher más rápido de lo
+que la API los absorbe y se mide cuántos se aceptan/descartan según --queue-size.
+
+--failure-rate/--flood-rate/--chat-limit hacen que el stand-in responda 500 y
+429 (con retry_after) para medir el coste de los reintentos en cualquier modo.
+
+Uso:
+    python scripts/bench_notifier.py --messages 500 --latency-ms 20
+    python scripts/bench_notifier.py --messages 200 --photo --concurrency 16
+    python scripts/bench_notifier.py --burst 30 --chat-rate 1
+    python scripts/bench_notifier.py --modes pipelined --flood-rate 0.05 --failure-rate 0.02
+    python scripts/bench_notifier.py --backpressure 500 --queue-size 200 --latency-ms 50
+"""
+
+import sys
+import os
+import time
+import asyncio
+import argparse
+import logging
+import tempfile
+from collections import deque
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from alerting.alert_manager import Alert, AlertType
+from alerting.coalescer import AlertCoalescer
+from alerting.dispatcher import NotificationDispatcher
+from alerting.notification import TelegramNotifier
+from core.database import Database
+from simulation.telegram_server import TelegramStandIn
+
+TOKEN = "123456:STANDIN"
+CHAT_ID = "42"
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))] if ordered else 0.0
+
+def run_legacy(notifier: TelegramNotifier, n: int, photo: str) -> list:
+    """Reproduce el wrapper anterior: cada envío bloquea el hilo con run_until_complete."""
+    notifier._get_file_id = lambda digest: None  # Sin caché de file_id
+    loop = asyncio.new_event_loop()
+    latencies = []
+    try:
+        for i in range(n):
+            t0 = time.perf_counter()
+            loop.run_until_complete(notifier._send_message_async(f"legacy {i}", "HTML", photo))
+            latencies.append(time.perf_counter() - t0)
+    finally:
+        loop.close()
+    return latencies
+
+def run_sync(notifier: TelegramNotifier, n: int, photo: str) -> list:
+    latencies = []
+    for i in range(n):
+        t0 = time.perf_counter()
+        notifier.send_message(f"sync {i}", imagen_path=photo)
+        latencies.append(time.perf_counter() - t0)
+    return latencies
+
+def run_pipelined(notifier: TelegramNotifier, n: int, photo: str, concurrency: int) -> list:
+    latencies, in_flight = [], deque()
+    for i in range(n):
+        if len(in_flight) >= concurrency:
+            t0, future = in_flight.popleft()
+            future.result()
+            latencies.append(time.perf_counter() - t0)
+        in_flight.append((time.perf_counter(), notifier.submit_message(f"pipelined {i}", imagen_path=photo)))
+    while in_flight:
+        t0, future = in_flight.popleft()
+        future.result()
+        latencies.append(time.perf_counter() - t0)
+    return latencies
+
+def burst_entries(n: int) -> list:
+    """N alertas variadas (umbrales y salidas de ambos patrones VIP) como entradas de outbox."""
+    entries = []
+    for i in range(n):
+        pattern_id, name = [("pachinko", "Pachinko"), ("crazytime", "Crazy Time")][i % 2]
+        alert_type = AlertType.THRESHOLD_REACHED if i % 3 else AlertType.PATTERN_HIT
+        alert = Alert(alert_type, pattern_id, name, 50 + i, 50 + i, datetime.now(),
+                      {"spin_id": 1000 + i, "bonus_multiplier": 20})
+        entries.append({"idempotency_key": alert.idempotency_key, "kind": alert_type.value,
+                        "payload": alert.to_payload()})
+    return entries
+
+def run_burst(standin: TelegramStandIn, n: int, chat_rate: float, coalesce: bool) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, "db.sqlite3"))
+        notifier = TelegramNotifier(TOKEN, CHAT_ID, base_url=standin.base_url, db=db,
+                                    chat_rate=chat_rate or None)
+        notifier.send_message("warmup")  # getMe + cliente inicializado fuera de la medición
+        dispatcher = NotificationDispatcher(notifier, db=db, poll_interval=0.05,
+                                            coalescer=AlertCoalescer() if coalesce else None).start()
+        standin.reset()
+        t0 = time.perf_counter()
+        db.set_state_with_outbox("bench", "burst", {}, burst_entries(n))
+        dispatcher.wake()
+        while db.get_outbox_stats()["pending"]:
+            time.sleep(0.02)
+        elapsed = time.perf_counter() - t0
+        stats = db.get_outbox_stats()
+        dispatcher.stop()
+        notifier.close()
+        return {"calls": standin.stats["requests"], "seconds": elapsed, "max_lag_s": stats["max_lag_s"],
+                "uploads": standin.stats["uploads"]}
+
+def run_backpressure(standin: TelegramStandIn, n: int, queue_size: int) -> dict:
+    """Productor más rápido que la API: la cola acotada descarta en lugar de bloquear al ciclo."""
+    notifier = TelegramNotifier(TOKEN, CHAT_ID, base_url=standin.base_url, chat_rate=None)
+    notifier.send_message("warmup")
+    dispatcher = NotificationDispatcher(notifier, maxsize=queue_size).start()
+    standin.reset()
+    t0 = time.perf_counter()
+    accepted = sum(dispatcher.submit_message(f"backpressure {i}") for i in range(n))
+    submit_s = time.perf_counter() - t0
+    dispatcher.flush(timeout=600)
+    elapsed = time.perf_counter() - t0
+    stats = dispatcher.stats()
+    dispatcher.stop()
+    notifier.close()
+    return {"accepted": accepted, "dropped": stats["dropped"], "delivered": stats["delivered"],
+            "failed": stats["failed"], "submit_ms": submit_s * 1000, "seconds": elapsed,
+            "last_lag_s": stats["last_lag_s"] or 0.0}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de TelegramNotifier contra stand-in local")
+    parser.add_argument("--messages", type=int, default=300)
+    parser.add_argument("--latency-ms", type=float, default=20, help="Latencia simulada de la Bot API")
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--concurrency", type=int, default=8, help="Envíos en vuelo en modo pipelined")
+    parser.add_argument("--photo", action="store_true", help="Enviar assets/pachinko.png en cada mensaje")
+    parser.add_argument("--modes", type=str, default="legacy,sync,pipelined")
+    parser.add_argument("--burst", type=int, default=0, help="Alertas simultáneas en el outbox (modo ráfaga)")
+    parser.add_argument("--chat-rate", type=float, default=1.0, help="Mensajes/s por chat en modo ráfaga (0 = sin límite)")
+    parser.add_argument("--backpressure", type=int, default=0, help="Mensajes encolados de golpe en el dispatcher")
+    parser.add_argument("--queue-size", type=int, default=200, help="Capacidad de la cola del dispatcher")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fracción de envíos con 500 en el stand-in")
+    parser.add_argument("--flood-rate", type=float, default=0.0, help="Fracción de envíos con 429 en el stand-in")
+    parser.add_argument("--retry-after", type=int, default=1, help="retry_after (s) de los 429")
+    parser.add_argument("--chat-limit", type=float, default=None, help="Mensajes/s por chat que tolera el stand-in")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+    faults = {"failure_rate": args.failure_rate, "flood_rate": args.flood_rate,
+              "retry_after": args.retry_after, "chat_limit": args.chat_limit}
+
+    if args.backpressure:
+        print(f"{'cola':>6} {'enviados':>9} {'aceptados':>10} {'descartados':>12} {'entregados':>11} "
+              f"{'fallidos':>9} {'encolar ms':>11} {'seg':>8} {'lag s':>7}")
+        with TelegramStandIn(latency_ms=args.latency_ms, latency_jitter_ms=args.jitter_ms, **faults) as standin:
+            r = run_backpressure(standin, args.backpressure, args.queue_size)
+            print(f"{args.queue_size:>6} {args.backpressure:>9} {r['accepted']:>10} {r['dropped']:>12} "
+                  f"{r['delivered']:>11} {r['failed']:>9} {r['submit_ms']:>11.1f} {r['seconds']:>8.2f} "
+                  f"{r['last_lag_s']:>7.2f}")
+        return
+
+    if args.burst:
+        print(f"{'dispatcher':<12} {'alertas':>8} {'llamadas':>9} {'seg':>8} {'lag máx s':>10} {'subidas':>8}")
+        with TelegramStandIn(latency_ms=args.latency_ms, latency_jitter_ms=args.jitter_ms, **faults) as standin:
+            for coalesce in (False, True):
+                r = run_burst(standin, args.burst, args.chat_rate, coalesce)
+                print(f"{'coalescing' if coalesce else 'individual':<12} {args.burst:>8} {r['calls']:>9} "
+                      f"{r['seconds']:>8.2f} {r['max_lag_s']:>10.2f} {r['uploads']:>8}")
+        return
+
+    photo = os.path.join("assets", "pachinko.png") if args.photo else None
+    print(f"{'modo':<10} {'msgs':>6} {'seg':>8} {'msg/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'subidas':>8} "
+          f"{'429':>5} {'500':>5}")
+    with TelegramStandIn(latency_ms=args.latency_ms, latency_jitter_ms=args.jitter_ms, **faults) as standin:
+        for mode in args.modes.split(","):
+            notifier = TelegramNotifier(TOKEN, CHAT_ID, base_url=standin.base_url,
+                                        pool_size=max(8, args.concurrency), chat_rate=None)
+            standin.reset()
+            t0 = time.perf_counter()
+            if mode == "legacy":
+                latencies = run_legacy(notifier, args.messages, photo)
+            elif mode == "sync":
+                latencies = run_sync(notifier, args.messages, photo)
+            else:
+                latencies = run_pipelined(notifier, args.messages, photo, args.concurrency)
+            elapsed = time.perf_counter() - t0
+            notifier.close()
+            print(f"{mode:<10} {len(latencies):>6} {elapsed:>8.2f} {len(latencies) / elapsed:>8.1f} "
+                  f"{percentile(latencies, 0.5) * 1000:>8.1f} {percentile(latencies, 0.99) * 1000:>8.1f} "
+                  f"{standin.stats['uploads']:>8} {standin.stats['floods']:>5} {standin.stats['failures']:>5}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+scripts/bench_pattern_matcher.py - Benchmark del autómata de patrones frente al bucle por patrón.
+
+Genera cientos de patrones (los configurados + secuencias aleatorias de 2 a
+--max-steps pasos) y un millón de resultados con los pesos reales de la rueda,
+y compara:
+  - loop:      recorrer todos los patrones en cada tiro comparando la cola reciente
+               (generalización del tracker anterior a N pasos)
+  - automaton: PatternMatcher, una transición por tiro
+
+Verifica que ambos producen las mismas coincidencias.
+
+Con --predicates N compara además N patrones predicado (condiciones sobre top
+slot, bonus y flappers) evaluados uno a uno frente al PredicateEvaluator
+compilado, sobre tiros completos del simulador.
+
+Uso:
+    python scripts/bench_pattern_matcher.py --patterns 300 --spins 1000000
+    python scripts/bench_pattern_matcher.py --patterns 0 --predicates 300 --spins 200000
+"""
+
+import sys
+import os
+import time
+import random
+import argparse
+import operator
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analytics.pattern_matcher import PatternMatcher, pattern_symbols
+from analytics.predicates import PredicateEvaluator
+from config.patterns import ALL_PATTERNS, PREDICATE_PATTERNS, Pattern
+from simulation.wheel import WHEEL_SEGMENTS, WheelSimulator
+
+def build_patterns(n: int, max_steps: int, rng: random.Random) -> list[Pattern]:
+    symbols = list(WHEEL_SEGMENTS)
+    patterns = [p for p in ALL_PATTERNS if p.type != "predicate"]  # Los predicados van aparte (--predicates)
+    while len(patterns) < n:
+        steps = [rng.choice(symbols) for _ in range(rng.randint(2, max_steps))]
+        patterns.append(Pattern(id=f"seq_{len(patterns)}", name="→".join(steps), type="sequence", value=steps))
+    return patterns
+
+def build_predicates(n: int, rng: random.Random) -> list[Pattern]:
+    """Los predicados configurados + condiciones aleatorias (la mayoría ligadas a un resultado)."""
+    numeric = ["top_slot_multiplier", "bonus_multiplier", "ct_flapper_blue", "ct_flapper_green", "ct_flapper_yellow"]
+    patterns = list(PREDICATE_PATTERNS)
+    while len(patterns) < n:
+        conditions = [(rng.choice(numeric), rng.choice([">=", ">", "<="]), rng.choice([2, 5, 10, 20, 50]))]
+        if rng.random() < 0.8:
+            conditions.insert(0, ("resultado", "==", rng.choice(list(WHEEL_SEGMENTS))))
+        if rng.random() < 0.3:
+            conditions.append(("is_top_slot_matched", "==", True))
+        patterns.append(Pattern(id=f"pred_{len(patterns)}", name="predicado", type="predicate", value=conditions))
+    return patterns
+
+OPS = {"==": operator.eq, "!=": operator.ne, ">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le}
+
+def run_predicates_naive(patterns: list[Pattern], spins: list[dict]) -> tuple[int, int]:
+    """Cada predicado evaluado por separado en cada tiro (condición a condición)."""
+    def holds(spin, column, op, value):
+        columns = column if isinstance(column, tuple) else (column,)
+        return any(spin.get(c) is not None and OPS[op](spin.get(c), value) for c in columns)
+
+    matches = checksum = 0
+    for spin_id, spin in enumerate(spins):
+        for index, pattern in enumerate(patterns):
+            if all(holds(spin, *condition) for condition in pattern.value):
+                matches += 1
+                checksum ^= spin_id * 1_000_003 + index
+    return matches, checksum
+
+def run_predicates_compiled(patterns: list[Pattern], spins: list[dict]) -> tuple[int, int]:
+    evaluator = PredicateEvaluator(patterns)
+    index_of = {id(p): i for i, p in enumerate(patterns)}
+    match = evaluator.match
+    matches = checksum = 0
+    for spin_id, spin in enumerate(spins):
+        for pattern in match(spin):
+            matches += 1
+            checksum ^= spin_id * 1_000_003 + index_of[id(pattern)]
+    return matches, checksum
+
+def run_loop(patterns: list[Pattern], results: list[str]) -> tuple[int, int]:
+    compiled = [(pattern_symbols(p), len(pattern_symbols(p))) for p in patterns]
+    longest = max(n for _, n in compiled)
+    recent: deque = deque(maxlen=longest)
+    matches = checksum = 0
+    for spin_id, resultado in enumerate(results):
+        recent.append(resultado)
+        history = tuple(recent)
+        for index, (symbols, n) in enumerate(compiled):
+            if history[-n:] == symbols:
+                matches += 1
+                checksum ^= spin_id * 1_000_003 + index
+    return matches, checksum
+
+def run_automaton(patterns: list[Pattern], results: list[str]) -> tuple[int, int]:
+    matcher = PatternMatcher(patterns)
+    index_of = {id(p): i for i, p in enumerate(patterns)}
+    step = matcher.step
+    matches = checksum = 0
+    for spin_id, resultado in enumerate(results):
+        for pattern in step(resultado):
+            matches += 1
+            checksum ^= spin_id * 1_000_003 + index_of[id(pattern)]
+    return matches, checksum
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de PatternMatcher")
+    parser.add_argument("--patterns", type=int, default=300)
+    parser.add_argument("--spins", type=int, default=1_000_000)
+    parser.add_argument("--max-steps", type=int, default=6, help="Longitud máxima de las secuencias aleatorias")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--modes", type=str, default="loop,automaton")
+    parser.add_argument("--predicates", type=int, default=0, help="Patrones predicado a comparar (0 = no)")
+    args = parser.parse_args()
+
+    if args.predicates:
+        run_predicate_bench(args)
+    if not args.patterns:
+        return
+
+    rng = random.Random(args.seed)
+    patterns = build_patterns(args.patterns, args.max_steps, rng)
+    results = rng.choices(list(WHEEL_SEGMENTS), weights=list(WHEEL_SEGMENTS.values()), k=args.spins)
+
+    t0 = time.perf_counter()
+    matcher = PatternMatcher(patterns)
+    compile_ms = (time.perf_counter() - t0) * 1000
+    print(f"{len(patterns)} patrones, {args.spins:,} tiros | autómata: {matcher.states} estados, "
+          f"estado acotado a {matcher.max_length} resultados, compilado en {compile_ms:.1f}ms")
+
+    print(f"{'modo':<10} {'seg':>8} {'tiros/s':>12} {'coincidencias':>14}")
+    outcomes = {}
+    for mode in args.modes.split(","):
+        run = run_loop if mode == "loop" else run_automaton
+        t0 = time.perf_counter()
+        outcomes[mode] = run(patterns, results)
+        elapsed = time.perf_counter() - t0
+        print(f"{mode:<10} {elapsed:>8.2f} {args.spins / elapsed:>12,.0f} {outcomes[mode][0]:>14,}")
+    if len(set(outcomes.values())) > 1:
+        print("❌ Los modos no coinciden")
+        sys.exit(1)
+
+def run_predicate_bench(args):
+    rng = random.Random(args.seed)
+    patterns = build_predicates(args.predicates, rng)
+    sim = WheelSimulator(seed=args.seed, gap_probability=0)
+    # Mismas columnas que las filas de `tiros` (to_row sigue WheelSimulator.ROW_COLUMNS)
+    spins = [dict(zip(WheelSimulator.ROW_COLUMNS, sim.to_row(spin, 0))) for spin in sim.iter_spins(args.spins)]
+    print(f"{len(patterns)} predicados, {len(spins):,} tiros")
+    print(f"{'modo':<10} {'seg':>8} {'tiros/s':>12} {'coincidencias':>14}")
+    outcomes = {}
+    for mode, run in (("naive", run_predicates_naive), ("compiled", run_predicates_compiled)):
+        t0 = time.perf_counter()
+        outcomes[mode] = run(patterns, spins)
+        elapsed = time.perf_counter() - t0
+        print(f"{mode:<10} {elapsed:>8.2f} {len(spins) / elapsed:>12,.0f} {outcomes[mode][0]:>14,}")
+    if len(set(outcomes.values())) > 1:
+        print("❌ Los modos no coinciden")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
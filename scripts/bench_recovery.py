@@ -0,0 +1,103 @@
+"""
+scripts/bench_recovery.py - Benchmark offline de la escalera de recuperación.
+
+Levanta el stand-in local de la API, siembra una BD temporal con historial,
+abre una brecha del tamaño indicado y mide tiempo de recuperación, número de
+peticiones y tiros perdidos.
+
+Uso:
+    python scripts/bench_recovery.py --gaps 30,120,600 --latency-ms 50 --rate-limit 0.05
+    python scripts/bench_recovery.py --gaps 600 --slow-ratio 0.05 --slow-ms 5000 --no-hedge
+"""
+
+import sys
+import os
+import time
+import argparse
+import logging
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.collector import DataCollector
+from core.database import Database
+from simulation.api_server import APIStandIn, synthetic_events, load_fixture
+
+SPIN_STEP_SECONDS = 55  # Cadencia media del simulador (tiro + latido)
+HISTORY_SPINS = 200
+
+def run_gap(events: list, history: int, args) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "db.sqlite3")
+        db = Database(db_path)
+
+        with APIStandIn(events, latency_ms=args.latency_ms, latency_jitter_ms=args.jitter_ms,
+                        slow_ratio=args.slow_ratio, slow_ms=args.slow_ms,
+                        rate_limit_ratio=args.rate_limit, error_ratio=args.error_ratio,
+                        seed=args.seed) as standin:
+            collector = DataCollector(db_path, api_base_url=standin.url)
+            if args.no_hedge:
+                collector.api.hedge_percentile = None
+
+            # Sembrar historial previo a la brecha
+            db.insertar_datos(collector._transform_batch(events[:history]))
+            expected = {t["started_at"] for t in collector._transform_batch(events[history:])}
+            standin.reset_stats()
+
+            t0 = time.perf_counter()
+            batches = collector.fetch_batches()
+            inserted = sum(db.insertar_datos(b) for b in batches)
+            elapsed = time.perf_counter() - t0
+
+            with db.get_connection(read_only=True) as conn:
+                stored = {r[0] for r in conn.execute("SELECT timestamp FROM tiros")}
+
+            stats = collector.api.latency_stats()
+            collector.close()
+            return {
+                "p50_ms": stats["p50_ms"],
+                "p99_ms": stats["p99_ms"],
+                "hedges": stats["hedges"],
+                "gap_spins": len(events) - history,
+                "pages": len(batches),
+                "requests": standin.stats["requests"],
+                "rate_limited": standin.stats["rate_limited"],
+                "inserted": inserted,
+                "missing": len(expected - stored),
+                "seconds": elapsed,
+            }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de recuperación contra API stand-in")
+    parser.add_argument("--gaps", type=str, default="30,120,600", help="Tamaños de brecha en minutos")
+    parser.add_argument("--fixture", type=str, default=None, help="Fixture JSON grabado (opcional)")
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Proporción de respuestas 429")
+    parser.add_argument("--error-ratio", type=float, default=0.0, help="Proporción de respuestas 500")
+    parser.add_argument("--slow-ratio", type=float, default=0.0, help="Proporción de respuestas lentas")
+    parser.add_argument("--slow-ms", type=float, default=0, help="Latencia extra de las respuestas lentas")
+    parser.add_argument("--no-hedge", action="store_true", help="Desactiva hedged requests")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s - %(message)s")
+
+    print(f"{'Brecha':>8} | {'Tiros':>6} | {'Lotes':>5} | {'Req':>5} | {'429':>4} | {'Hedge':>5} | "
+          f"{'Insert':>6} | {'Perdidos':>8} | {'p50':>7} | {'p99':>7} | {'Tiempo':>8}")
+    print("-" * 102)
+    for gap_minutes in [int(g) for g in args.gaps.split(",") if g.strip()]:
+        gap_spins = int(gap_minutes * 60 / SPIN_STEP_SECONDS)
+        if args.fixture:
+            events = load_fixture(args.fixture)
+            history = max(1, len(events) - gap_spins)
+        else:
+            events = synthetic_events(HISTORY_SPINS + gap_spins, seed=args.seed)
+            history = HISTORY_SPINS
+        r = run_gap(events, history, args)
+        print(f"{gap_minutes:>6}m | {r['gap_spins']:>6} | {r['pages']:>5} | {r['requests']:>5} | "
+              f"{r['rate_limited']:>4} | {r['hedges']:>5} | {r['inserted']:>6} | {r['missing']:>8} | "
+              f"{r['p50_ms'] or 0:>5.0f}ms | {r['p99_ms'] or 0:>5.0f}ms | {r['seconds']:>7.2f}s")
+
+if __name__ == "__main__":
+    main()
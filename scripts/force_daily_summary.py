@@ -26,6 +26,7 @@ def force_summary():
     # OJO: Este método usa la lógica de "23:00 ayer a 23:00 hoy"
     try:
         scheduler._send_daily_summary()
+        scheduler.close()
         logger.info("✅ Proceso finalizado. Revisa tu Telegram.")
     except Exception as e:
         logger.error(f"❌ Error forzando resumen: {e}", exc_info=True)
@@ -0,0 +1,42 @@
+"""
+scripts/generate_dataset.py - Genera un dataset reproducible de tiros simulados.
+
+Escribe directamente en la tabla `tiros` de la BD indicada usando el simulador
+sembrado de la rueda, para benchmarks y análisis de ventanas a gran escala.
+
+Uso:
+    python scripts/generate_dataset.py --db data/sim/db.sqlite3 --spins 2000000 --seed 42
+"""
+
+import sys
+import os
+import time
+import argparse
+import logging
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from simulation.wheel import WheelSimulator
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera tiros simulados en una BD SQLite")
+    parser.add_argument("--db", type=str, default="data/sim/db.sqlite3")
+    parser.add_argument("--spins", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch", type=int, default=50_000)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(message)s")
+    logger = logging.getLogger(__name__)
+
+    if os.path.abspath(args.db) == os.path.abspath("data/db.sqlite3"):
+        logger.error("❌ Negado: no se escriben tiros simulados en la BD de producción")
+        sys.exit(1)
+
+    t0 = time.perf_counter()
+    written = WheelSimulator(seed=args.seed).write_to_db(args.db, args.spins, batch_size=args.batch)
+    elapsed = time.perf_counter() - t0
+    logger.info(f"✅ {written} tiros en {elapsed:.1f}s ({written / elapsed:,.0f} tiros/s)")
+
+if __name__ == "__main__":
+    main()
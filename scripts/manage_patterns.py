@@ -0,0 +1,128 @@
+"""
+scripts/manage_patterns.py - Alta, retoque y baja de patrones en el registro (sin reiniciar).
+
+El servicio detecta los cambios en el siguiente ciclo; un patrón nuevo (o con
+otra definición) se rellena desde el historial completo de tiros antes de
+seguir en vivo.
+
+Uso:
+    python scripts/manage_patterns.py list --all
+    python scripts/manage_patterns.py add seq_1_2_1 --name "1→2→1" --type sequence --value 1,2,1
+    python scripts/manage_patterns.py add cashhunt --name "Cash Hunt" --value CashHunt --level vip \\
+        --thresholds 120,180 --windows 131-160,191-220
+    python scripts/manage_patterns.py add coinflip_ts --type predicate \\
+        --value '[["resultado", "==", "CoinFlip"], ["top_slot_multiplier", ">=", 3]]'
+    python scripts/manage_patterns.py set pachinko --thresholds 60,120 --windows 71-100,131-160
+    python scripts/manage_patterns.py disable seq_5_2
+"""
+
+import sys
+import os
+import json
+import argparse
+from dataclasses import replace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analytics.pattern_registry import PatternRegistry, pattern_from_dict
+from config.patterns import Pattern
+from core.database import Database
+
+def parse_ints(value: str) -> list[int]:
+    return [int(v) for v in value.split(",") if v.strip()] if value else []
+
+def parse_windows(value: str) -> list[tuple[int, int]]:
+    windows = []
+    for item in (value.split(",") if value else []):
+        start, _, end = item.partition("-")
+        windows.append((int(start), int(end)))
+    return windows
+
+def parse_value(kind: str, value: str):
+    if kind == "simple":
+        return value
+    if kind == "sequence":
+        return [v.strip() for v in value.split(",") if v.strip()]
+    # predicate: JSON [[columna | [columnas...], operador, valor], ...]
+    return pattern_from_dict({"id": "_", "name": "_", "type": "predicate", "value": json.loads(value)}).value
+
+def main():
+    parser = argparse.ArgumentParser(description="Gestión del registro de patrones")
+    parser.add_argument("--db", type=str, default="data/db.sqlite3")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    add = sub.add_parser("add", help="Alta de un patrón (se rellena su historial)")
+    add.add_argument("pattern_id")
+    add.add_argument("--name", type=str)
+    add.add_argument("--type", choices=["simple", "sequence", "predicate"], default="simple")
+    add.add_argument("--value", type=str, required=True, help="Resultado, secuencia separada por comas o JSON de condiciones")
+    add.add_argument("--level", choices=["vip", "tracking"], default="tracking")
+    add.add_argument("--thresholds", type=str, help="Umbrales de aviso separados por coma")
+    add.add_argument("--windows", type=str, help="Ventanas de apuesta, p.ej. 61-90,121-150")
+    add.add_argument("--description", type=str, default="")
+
+    tune = sub.add_parser("set", help="Retoca umbrales/ventanas/nivel de un patrón existente")
+    tune.add_argument("pattern_id")
+    tune.add_argument("--name", type=str)
+    tune.add_argument("--level", choices=["vip", "tracking"])
+    tune.add_argument("--thresholds", type=str)
+    tune.add_argument("--windows", type=str)
+
+    for command in ("enable", "disable"):
+        sub.add_parser(command, help=f"{'Reactiva' if command == 'enable' else 'Desactiva'} un patrón").add_argument("pattern_id")
+
+    listing = sub.add_parser("list", help="Lista los patrones del registro")
+    listing.add_argument("--all", action="store_true", help="Incluir inactivos")
+    args = parser.parse_args()
+
+    db = Database(args.db)
+    registry = PatternRegistry(db)
+    registry.seed()
+    rows = {r["id"]: r for r in db.get_patterns(active_only=False)}
+
+    try:
+        if args.command == "add":
+            if args.pattern_id in rows:
+                raise SystemExit(f"❌ El patrón {args.pattern_id} ya existe (usa 'set' para retocarlo)")
+            pattern = Pattern(
+                id=args.pattern_id, name=args.name or args.pattern_id, type=args.type,
+                value=parse_value(args.type, args.value),
+                warning_thresholds=parse_ints(args.thresholds), betting_windows=parse_windows(args.windows),
+                alert_level=args.level, description=args.description,
+            )
+            registry.save(pattern)
+            print(f"✅ Patrón {pattern.id} registrado; el servicio rellenará su historial en el próximo ciclo")
+        elif args.command == "set":
+            if args.pattern_id not in rows:
+                raise SystemExit(f"❌ El patrón {args.pattern_id} no existe")
+            pattern = pattern_from_dict(rows[args.pattern_id]["definition"])
+            changes = {}
+            if args.name:
+                changes["name"] = args.name
+            if args.level:
+                changes["alert_level"] = args.level
+            if args.thresholds is not None:
+                changes["warning_thresholds"] = parse_ints(args.thresholds)
+            if args.windows is not None:
+                changes["betting_windows"] = parse_windows(args.windows)
+            registry.save(replace(pattern, **changes), active=rows[args.pattern_id]["active"])
+            print(f"✅ Patrón {args.pattern_id} actualizado")
+        elif args.command in ("enable", "disable"):
+            if not db.set_pattern_active(args.pattern_id, args.command == "enable"):
+                raise SystemExit(f"❌ El patrón {args.pattern_id} no existe")
+            print(f"✅ Patrón {args.pattern_id} {'activado' if args.command == 'enable' else 'desactivado'}")
+        else:
+            print(f"{'id':<24} {'tipo':<10} {'nivel':<9} {'activo':<7} {'umbrales':<12} valor")
+            for row in rows.values():
+                if not (row["active"] or args.all):
+                    continue
+                d = row["definition"]
+                print(f"{row['id']:<24} {d['type']:<10} {d.get('alert_level', 'tracking'):<9} "
+                      f"{'sí' if row['active'] else 'no':<7} "
+                      f"{','.join(map(str, d.get('warning_thresholds', []))) or '-':<12} {json.dumps(d['value'])}")
+            print(f"\nVersión del registro: {db.get_pattern_registry_version()}")
+    except ValueError as e:
+        raise SystemExit(f"❌ {e}")
+
+if __name__ == "__main__":
+    main()
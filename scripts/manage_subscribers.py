@@ -0,0 +1,70 @@
+"""
+scripts/manage_subscribers.py - Alta, baja y listado de suscriptores de alertas.
+
+Uso:
+    python scripts/manage_subscribers.py add 123456789 --name Ana --patterns pachinko
+    python scripts/manage_subscribers.py add 123456789 --types pattern_hit
+    python scripts/manage_subscribers.py remove 123456789
+    python scripts/manage_subscribers.py list --all
+"""
+
+import sys
+import os
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from alerting.alert_manager import AlertType
+from config.patterns import VIP_PATTERNS
+from core.database import Database
+
+def parse_list(value: str, allowed: list[str], label: str) -> list[str] | None:
+    if not value:
+        return None  # Todos
+    items = [v.strip() for v in value.split(",") if v.strip()]
+    unknown = [v for v in items if v not in allowed]
+    if unknown:
+        raise SystemExit(f"❌ {label} desconocidos: {', '.join(unknown)} (válidos: {', '.join(allowed)})")
+    return items
+
+def main():
+    parser = argparse.ArgumentParser(description="Gestión de suscriptores de alertas de Telegram")
+    parser.add_argument("--db", type=str, default="data/db.sqlite3")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    add = sub.add_parser("add", help="Alta o actualización de un suscriptor")
+    add.add_argument("chat_id")
+    add.add_argument("--name", type=str)
+    add.add_argument("--patterns", type=str, help="IDs separados por coma (vacío = todos los VIP)")
+    add.add_argument("--types", type=str, help="Tipos de alerta separados por coma (vacío = todos)")
+    add.add_argument("--inactive", action="store_true", help="Registrar pausado")
+
+    remove = sub.add_parser("remove", help="Elimina un suscriptor")
+    remove.add_argument("chat_id")
+
+    listing = sub.add_parser("list", help="Lista suscriptores")
+    listing.add_argument("--all", action="store_true", help="Incluir inactivos")
+    args = parser.parse_args()
+
+    db = Database(args.db)
+    if args.command == "add":
+        patterns = parse_list(args.patterns, [p.id for p in VIP_PATTERNS], "Patrones")
+        alert_types = parse_list(args.types, [t.value for t in AlertType], "Tipos")
+        db.upsert_subscriber(args.chat_id, args.name, patterns, alert_types, active=not args.inactive)
+        print(f"✅ Suscriptor {args.chat_id} guardado")
+    elif args.command == "remove":
+        if db.delete_subscriber(args.chat_id):
+            print(f"🗑️ Suscriptor {args.chat_id} eliminado")
+        else:
+            print(f"⚠️ Suscriptor {args.chat_id} no existe")
+    else:
+        subscribers = db.get_subscribers(active_only=not args.all)
+        print(f"{'chat_id':<16} {'nombre':<16} {'activo':<7} {'patrones':<24} tipos")
+        for s in subscribers:
+            print(f"{s['chat_id']:<16} {s['name'] or '-':<16} {'sí' if s['active'] else 'no':<7} "
+                  f"{','.join(s['patterns']) if s['patterns'] is not None else 'todos':<24} "
+                  f"{','.join(s['alert_types']) if s['alert_types'] is not None else 'todos'}")
+        print(f"\n{len(subscribers)} suscriptores")
+
+if __name__ == "__main__":
+    main()
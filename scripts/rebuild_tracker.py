@@ -0,0 +1,70 @@
+"""
+scripts/rebuild_tracker.py - Verifica (y repara) el estado del tracker recalculándolo desde tiros.
+
+Recalcula last_id / last_distance / prev_distance de todos los patrones y la
+cola del autómata con operaciones vectorizadas sobre el historial completo,
+y lo compara con system_state. Con --repair sobrescribe las claves que
+difieran (detener antes el servicio: el tracker guarda su espejo en memoria).
+
+Uso:
+    python scripts/rebuild_tracker.py
+    python scripts/rebuild_tracker.py --repair
+    python scripts/rebuild_tracker.py --through-id 150000 --occurrences
+"""
+
+import sys
+import os
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analytics.tracker_rebuild import (
+    HAS_NUMPY, rebuild_tracker_state, diff_tracker_state, repair_tracker_state,
+)
+from core.database import Database
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconstrucción vectorizada del estado del tracker")
+    parser.add_argument("--db", type=str, default="data/db.sqlite3")
+    parser.add_argument("--through-id", type=int, help="Reconstruir hasta este ID (por defecto, el último procesado)")
+    parser.add_argument("--repair", action="store_true", help="Escribir en system_state las claves que difieran")
+    parser.add_argument("--occurrences", action="store_true", help="Mostrar número de apariciones por patrón")
+    args = parser.parse_args()
+
+    if not HAS_NUMPY:
+        raise SystemExit("❌ Se necesita numpy (pip install numpy)")
+    if not os.path.exists(args.db):
+        raise SystemExit(f"❌ No existe la base de datos: {args.db}")
+
+    db = Database(args.db)
+    t0 = time.perf_counter()
+    rebuilt = rebuild_tracker_state(db, through_id=args.through_id)
+    elapsed = time.perf_counter() - t0
+    print(f"🧮 Estado reconstruido hasta ID {rebuilt['through_id']} en {elapsed:.2f}s")
+
+    if args.occurrences:
+        print(f"\n{'patrón':<24} {'apariciones':>12} {'last_id':>10} {'last_dist':>10} {'prev_dist':>10}")
+        for pattern_id, state in rebuilt["patterns"].items():
+            print(f"{pattern_id:<24} {len(rebuilt['occurrences'][pattern_id]):>12,} {state['last_id'] or '-':>10} "
+                  f"{state['last_distance']:>10} {state['prev_distance']:>10}")
+
+    diffs = diff_tracker_state(db, rebuilt)
+    if not diffs:
+        print("\n✅ system_state coincide con el historial")
+        return
+
+    print(f"\n⚠️ {len(diffs)} diferencias:")
+    print(f"{'clave':<24} {'campo':<18} {'guardado':>20} {'reconstruido':>20}")
+    for d in diffs:
+        print(f"{d['key']:<24} {d['field']:<18} {str(d['stored']):>20} {str(d['rebuilt']):>20}")
+
+    if args.repair:
+        written = repair_tracker_state(db, rebuilt, diffs)
+        print(f"\n🔧 {written} claves reparadas")
+    else:
+        print("\nEjecuta con --repair para corregirlas")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -13,7 +13,9 @@ async def test_bot():
         print("❌ Error: Credenciales no encontradas en .env")
         return
 
-    bot = Bot(token=token)
+    # Con TELEGRAM_API_URL (p.ej. python -m simulation.telegram_server) se prueba sin red
+    api_url = os.getenv("TELEGRAM_API_URL", "").rstrip("/")
+    bot = Bot(token=token, base_url=f"{api_url}/bot") if api_url else Bot(token=token)
     try:
         await bot.send_message(chat_id=chat_id, text="✅ **CRAZYTIME MONITOR**\n\nConexión establecida con éxito. Las alertas están activas.", parse_mode="Markdown")
         print("✅ Mensaje enviado con éxito a Telegram")
@@ -0,0 +1,66 @@
+"""
+scripts/window_grid.py - Explora todas las ventanas de apuesta de un patrón y exporta la rejilla.
+
+Uso:
+    python scripts/window_grid.py pachinko
+    python scripts/window_grid.py crazytime --max-start 400 --max-width 120 --min-entries 50 --csv crazytime_grid.csv
+"""
+
+import sys
+import os
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analytics.window_analyzer import WindowAnalyzer
+from analytics.window_grid import (HAS_NUMPY, best_windows, window_cell, grid_to_csv,
+                                   DEFAULT_MAX_START, DEFAULT_MAX_WIDTH)
+
+def print_cells(title: str, cells: list[dict]):
+    print(f"\n{title}")
+    print(f"{'ventana':<12} {'entradas':>9} {'aciertos':>9} {'win rate':>9} {'ROI':>9} {'P/L':>10}")
+    for c in cells:
+        print(f"{c['start']:>4}-{c['end']:<7} {c['entries']:>9} {c['wins']:>9} "
+              f"{c['win_rate'] if c['win_rate'] is not None else '-':>8}% "
+              f"{c['roi'] if c['roi'] is not None else '-':>8}% {c['profit_loss']:>+10.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Búsqueda de ventanas de apuesta (rejilla completa)")
+    parser.add_argument("pattern_id")
+    parser.add_argument("--db", type=str, default="data/db.sqlite3")
+    parser.add_argument("--max-start", type=int, default=DEFAULT_MAX_START)
+    parser.add_argument("--max-width", type=int, default=DEFAULT_MAX_WIDTH)
+    parser.add_argument("--min-entries", type=int, default=30, help="Entradas mínimas para el ranking")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--csv", type=str, help="Exportar la rejilla completa a este CSV")
+    args = parser.parse_args()
+
+    if not HAS_NUMPY:
+        raise SystemExit("❌ Se necesita numpy (pip install numpy)")
+
+    analyzer = WindowAnalyzer(args.db)
+    pattern = next((p for p in analyzer.patterns if p.id == args.pattern_id), None)
+    if not pattern:
+        raise SystemExit(f"❌ Patrón desconocido: {args.pattern_id}")
+
+    t0 = time.perf_counter()
+    grid = analyzer.window_grid(pattern, args.max_start, args.max_width)
+    elapsed = time.perf_counter() - t0
+    print(f"🔍 {pattern.name}: {int(grid['entries'][0]):,} rachas, "
+          f"{args.max_start * args.max_width:,} ventanas en {elapsed:.2f}s")
+
+    configured = [window_cell(grid, s, e) for s, e in pattern.betting_windows
+                  if s <= args.max_start and e - s + 1 <= args.max_width]
+    if configured:
+        print_cells("Ventanas configuradas", configured)
+    print_cells(f"Mejores {args.top} por ROI (≥{args.min_entries} entradas)",
+                best_windows(grid, args.min_entries, args.top))
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            f.write(grid_to_csv(grid))
+        print(f"\n📁 Rejilla exportada a {args.csv}")
+
+if __name__ == "__main__":
+    main()
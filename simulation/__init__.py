@@ -0,0 +1,3 @@
+from .api_server import APIStandIn, load_fixture, record_fixture, synthetic_events
+from .wheel import WheelSimulator, SimSpin
+from .telegram_server import TelegramStandIn
@@ -0,0 +1,182 @@
+"""
+simulation/api_server.py - Stand-in HTTP local de la API de CasinoScores.
+
+Sirve el mismo contrato `page/size/sort` que consume `APIClient` a partir de un
+stream grabado (fixture JSON) o sintético, con inyección de latencia, 429 y
+huecos, además de respuestas lentas ocasionales (cola de latencia). Pensado para medir recuperación y throughput del collector sin red.
+"""
+
+import json
+import random
+import logging
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, List, Tuple
+from urllib.parse import urlparse, parse_qs
+
+logger = logging.getLogger(__name__)
+
+API_PATH = "/svc-evolution-game-events/api/crazytime"
+
+def synthetic_events(count: int, seed: int = 0, end: Optional[datetime] = None) -> List[dict]:
+    """Genera un stream sembrado con la forma de la API (orden cronológico) que termina en `end`."""
+    from simulation.wheel import WheelSimulator
+    return WheelSimulator(seed=seed).generate_events(count, end=end)
+
+def load_fixture(path: str) -> List[dict]:
+    """Carga un stream grabado (lista de eventos crudos de la API)."""
+    with open(path, "r", encoding="utf-8") as f:
+        events = json.load(f)
+    return sorted(events, key=lambda e: e.get("data", {}).get("settledAt", ""))
+
+def record_fixture(path: str, pages: int = 10, size: int = 24, base_url: Optional[str] = None) -> int:
+    """Graba páginas reales de la API a un fixture JSON reproducible."""
+    from core.api_client import APIClient
+    api = APIClient(base_url=base_url)
+    seen, events = set(), []
+    for page in range(pages):
+        for entry in api.fetch(page=page, size=size):
+            key = entry.get("id") or entry.get("data", {}).get("id") or entry.get("data", {}).get("startedAt")
+            if key in seen:
+                continue
+            seen.add(key)
+            events.append(entry)
+    api.close()
+    events.sort(key=lambda e: e.get("data", {}).get("settledAt", ""))
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(events, f)
+    logger.info(f"💾 Fixture grabado: {len(events)} eventos en {path}")
+    return len(events)
+
+
+class APIStandIn:
+    """Servidor local que imita la API paginada (page 0 = más reciente)."""
+
+    def __init__(self, events: List[dict], host: str = "127.0.0.1", port: int = 0,
+                 latency_ms: float = 0, latency_jitter_ms: float = 0,
+                 slow_ratio: float = 0.0, slow_ms: float = 0,
+                 rate_limit_ratio: float = 0.0, retry_after: Optional[int] = 1,
+                 error_ratio: float = 0.0, drop_ranges: Optional[List[Tuple[int, int]]] = None,
+                 seed: int = 0):
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.slow_ratio = slow_ratio
+        self.slow_ms = slow_ms
+        self.rate_limit_ratio = rate_limit_ratio
+        self.retry_after = retry_after
+        self.error_ratio = error_ratio
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._events: List[dict] = []
+        self._drop_ranges = drop_ranges or []
+        self.stats = {"requests": 0, "ok": 0, "rate_limited": 0, "errors": 0}
+        self.set_events(events)
+
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                standin._handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}{API_PATH}"
+
+    def set_events(self, events: List[dict]):
+        """Reemplaza el stream servido (orden cronológico ascendente)."""
+        with self._lock:
+            visible = [e for i, e in enumerate(events)
+                       if not any(a <= i < b for a, b in self._drop_ranges)]
+            # La API ordena por settledAt descendente
+            self._events = list(reversed(visible))
+
+    def append_events(self, events: List[dict]):
+        """Añade tiros nuevos al frente del stream (simula tiempo real)."""
+        with self._lock:
+            self._events = list(reversed(events)) + self._events
+
+    def reset_stats(self):
+        with self._lock:
+            for k in self.stats:
+                self.stats[k] = 0
+
+    def start(self) -> "APIStandIn":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="api-standin", daemon=True)
+        self._thread.start()
+        logger.info(f"🧪 API stand-in escuchando en {self.url}")
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _handle(self, handler: BaseHTTPRequestHandler):
+        parsed = urlparse(handler.path)
+        if parsed.path != API_PATH:
+            self._respond(handler, 404, {"error": "not found"})
+            return
+
+        with self._lock:
+            self.stats["requests"] += 1
+            roll_429 = self._rng.random()
+            roll_err = self._rng.random()
+            delay = self.latency_ms + self._rng.uniform(0, self.latency_jitter_ms)
+            if self._rng.random() < self.slow_ratio:
+                delay += self.slow_ms  # Cola de latencia (respuestas lentas ocasionales)
+
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+        if roll_429 < self.rate_limit_ratio:
+            with self._lock:
+                self.stats["rate_limited"] += 1
+            headers = {"Retry-After": str(self.retry_after)} if self.retry_after is not None else {}
+            self._respond(handler, 429, {"error": "Too Many Requests"}, headers)
+            return
+        if roll_err < self.error_ratio:
+            with self._lock:
+                self.stats["errors"] += 1
+            self._respond(handler, 500, {"error": "Internal Server Error"})
+            return
+
+        query = parse_qs(parsed.query)
+        try:
+            page = int(query.get("page", ["0"])[0])
+            size = int(query.get("size", ["10"])[0])
+        except ValueError:
+            self._respond(handler, 400, {"error": "bad page/size"})
+            return
+
+        with self._lock:
+            body = self._events[page * size:(page + 1) * size]
+            self.stats["ok"] += 1
+        self._respond(handler, 200, body)
+
+    @staticmethod
+    def _respond(handler: BaseHTTPRequestHandler, status: int, payload, headers: Optional[dict] = None):
+        raw = json.dumps(payload).encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(raw)))
+        for k, v in (headers or {}).items():
+            handler.send_header(k, v)
+        handler.end_headers()
+        handler.wfile.write(raw)
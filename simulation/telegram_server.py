@@ -0,0 +1,303 @@
+"""
+simulation/telegram_server.py - Stand-in HTTP local de la Bot API de Telegram.
+
+Implementa lo mínimo que usa `TelegramNotifier` (getMe, sendMessage,
+sendPhoto y sendMediaGroup, por subida o por file_id emitido) con el mismo formato de
+respuesta que la API real, para medir
+throughput del notificador sin red ni credenciales. Apuntar el notificador a
+`standin.base_url` (o a la variable TELEGRAM_API_URL).
+
+Para probar reintentos y contrapresión admite latencia configurable, errores
+500 aleatorios (`failure_rate`), 429 aleatorios con retry_after (`flood_rate`)
+y un límite real de mensajes por chat (`chat_limit`/s) que responde 429 con el
+retry_after que faltaría, como el flood control de Telegram. Los chats de
+`blocked_chats` responden 403, como un usuario que bloqueó al bot.
+
+Uso suelto:
+    python -m simulation.telegram_server --port 8081 --latency-ms 50 --flood-rate 0.05
+"""
+
+import re
+import json
+import math
+import time
+import argparse
+import hashlib
+import random
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from collections import deque
+from typing import Optional
+from urllib.parse import parse_qs
+
+logger = logging.getLogger(__name__)
+
+class _Server(ThreadingHTTPServer):
+    # El backlog por defecto (5) descarta SYN cuando el fan-out abre decenas de conexiones a la vez
+    request_queue_size = 256
+    daemon_threads = True
+
+
+def _parse_body(content_type: str, raw: bytes) -> tuple[dict, dict]:
+    """Devuelve (campos, archivos) de un cuerpo urlencoded, JSON o multipart."""
+    if content_type.startswith("application/json"):
+        return json.loads(raw or b"{}"), {}
+    if content_type.startswith("multipart/form-data"):
+        # Split directo por boundary: los PNG de assets pesan ~2.5MB y el parser MIME es lento
+        boundary = content_type.split("boundary=", 1)[1].strip('"').encode("latin-1")
+        fields, files = {}, {}
+        for part in raw.split(b"--" + boundary)[1:]:
+            if part.startswith(b"--"):
+                break
+            head, _, body = part[2:-2].partition(b"\r\n\r\n")
+            disposition = head.decode("utf-8", "replace")
+            name = re.search(r'name="([^"]*)"', disposition)
+            if not name:
+                continue
+            if 'filename="' in disposition:
+                files[name.group(1)] = body
+            else:
+                fields[name.group(1)] = body.decode("utf-8")
+        return fields, files
+    return {k: v[0] for k, v in parse_qs(raw.decode("utf-8")).items()}, {}
+
+
+class TelegramStandIn:
+    """Servidor local que imita `https://api.telegram.org/bot<token>/<método>`."""
+
+    SEND_METHODS = ("sendMessage", "sendPhoto", "sendMediaGroup")
+    TEXT_LIMIT = 4096  # Caracteres de un sendMessage; más largo responde 400 como la API real
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 latency_ms: float = 0, latency_jitter_ms: float = 0, seed: int = 0,
+                 failure_rate: float = 0.0, flood_rate: float = 0.0, retry_after: int = 1,
+                 chat_limit: Optional[float] = None, blocked_chats: Optional[set] = None):
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.failure_rate = failure_rate
+        self.flood_rate = flood_rate
+        self.retry_after = retry_after
+        self.chat_limit = chat_limit
+        self.blocked_chats = {str(c) for c in blocked_chats or ()}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._message_id = 0
+        self._chat_sends: dict = {}  # chat_id -> deque de instantes de envío (último segundo)
+        self.file_ids: set = set()
+        self.messages: list[dict] = []
+        self.stats = {"requests": 0, "ok": 0, "errors": 0, "uploads": 0, "media_groups": 0,
+                      "failures": 0, "floods": 0}
+
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive: el cliente reutiliza conexiones
+            disable_nagle_algorithm = True  # cabeceras y cuerpo van en escrituras separadas
+
+            def do_POST(self):
+                standin._handle(self)
+
+            do_GET = do_POST
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = _Server((host, port), Handler)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def reset(self):
+        with self._lock:
+            self.messages.clear()
+            self._chat_sends.clear()
+            for k in self.stats:
+                self.stats[k] = 0
+
+    def invalidate_file_ids(self):
+        """Olvida los file_id emitidos (simula ids caducados en Telegram)."""
+        with self._lock:
+            self.file_ids.clear()
+
+    def start(self) -> "TelegramStandIn":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="telegram-standin", daemon=True)
+        self._thread.start()
+        logger.info(f"🧪 Telegram stand-in escuchando en {self.base_url}")
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ============== Manejo de peticiones ==============
+
+    def _handle(self, handler: BaseHTTPRequestHandler):
+        # /bot<token>/<método>
+        parts = handler.path.split("?")[0].strip("/").split("/")
+        if len(parts) != 2 or not parts[0].startswith("bot"):
+            self._respond(handler, 404, {"ok": False, "error_code": 404, "description": "Not Found"})
+            return
+        method = parts[1]
+        length = int(handler.headers.get("Content-Length") or 0)
+        raw = handler.rfile.read(length) if length else b""
+        try:
+            fields, files = _parse_body(handler.headers.get("Content-Type", ""), raw)
+        except Exception as e:
+            self._respond(handler, 400, {"ok": False, "error_code": 400, "description": f"Bad Request: {e}"})
+            return
+
+        with self._lock:
+            self.stats["requests"] += 1
+            delay = self.latency_ms + self._rng.uniform(0, self.latency_jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+        fault = self._inject_fault(method, fields)
+        status, payload = fault or self._dispatch(method, fields, files)
+        with self._lock:
+            self.stats["ok" if status == 200 else "errors"] += 1
+        self._respond(handler, status, payload)
+
+    def _inject_fault(self, method: str, fields: dict) -> Optional[tuple[int, dict]]:
+        """403 a chats bloqueados, error 500, 429 aleatorio o 429 por superar chat_limit; None si procede."""
+        if method not in self.SEND_METHODS:
+            return None
+        if str(fields.get("chat_id")) in self.blocked_chats:
+            return 403, {"ok": False, "error_code": 403, "description": "Forbidden: bot was blocked by the user"}
+        with self._lock:
+            roll = self._rng.random()
+            if roll < self.failure_rate:
+                self.stats["failures"] += 1
+                return 500, {"ok": False, "error_code": 500, "description": "Internal Server Error"}
+            retry_after = None
+            if roll < self.failure_rate + self.flood_rate:
+                retry_after = self.retry_after
+            elif self.chat_limit:
+                now = time.monotonic()
+                sends = self._chat_sends.setdefault(str(fields.get("chat_id", "0")), deque())
+                while sends and now - sends[0] >= 1.0:
+                    sends.popleft()
+                if len(sends) >= self.chat_limit:
+                    retry_after = max(1, math.ceil(1.0 - (now - sends[0])))
+                else:
+                    sends.append(now)
+            if retry_after is None:
+                return None
+            self.stats["floods"] += 1
+        return 429, {"ok": False, "error_code": 429,
+                     "description": f"Too Many Requests: retry after {retry_after}",
+                     "parameters": {"retry_after": retry_after}}
+
+    def _dispatch(self, method: str, fields: dict, files: dict) -> tuple[int, dict]:
+        if method == "getMe":
+            return 200, {"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "StandIn",
+                                                "username": "standin_bot"}}
+        if method == "sendMessage":
+            if len(fields.get("text") or "") > self.TEXT_LIMIT:
+                return 400, {"ok": False, "error_code": 400, "description": "Bad Request: message is too long"}
+            return 200, {"ok": True, "result": self._record(fields, text=fields.get("text"))}
+        if method == "sendPhoto":
+            file_id = self._resolve_photo(files.get("photo"), fields.get("photo", ""))
+            if file_id is None:
+                return self._bad_file_id()
+            return 200, {"ok": True, "result": self._record(
+                fields, caption=fields.get("caption"), photo=self._photo_sizes(file_id)
+            )}
+        if method == "sendMediaGroup":
+            media = json.loads(fields.get("media", "[]"))
+            resolved = []
+            for item in media:
+                ref = item.get("media", "")
+                upload = files.get(ref[len("attach://"):]) if ref.startswith("attach://") else None
+                file_id = self._resolve_photo(upload, ref)
+                if file_id is None:
+                    return self._bad_file_id()
+                resolved.append((file_id, item.get("caption")))
+            with self._lock:
+                self.stats["media_groups"] += 1
+            return 200, {"ok": True, "result": [
+                self._record(fields, caption=caption, photo=self._photo_sizes(file_id))
+                for file_id, caption in resolved
+            ]}
+        return 400, {"ok": False, "error_code": 400, "description": f"Bad Request: method {method} not implemented"}
+
+    def _resolve_photo(self, upload: Optional[bytes], reference: str) -> Optional[str]:
+        """file_id de una foto subida (se emite uno nuevo) o referenciada (debe existir)."""
+        with self._lock:
+            if upload is not None:
+                file_id = f"standin-{hashlib.sha1(upload).hexdigest()[:16]}"
+                self.stats["uploads"] += 1
+                self.file_ids.add(file_id)
+                return file_id
+            return reference if reference in self.file_ids else None
+
+    @staticmethod
+    def _photo_sizes(file_id: str) -> list:
+        return [{"file_id": file_id, "file_unique_id": file_id[-8:], "width": 512, "height": 512}]
+
+    @staticmethod
+    def _bad_file_id() -> tuple[int, dict]:
+        return 400, {"ok": False, "error_code": 400,
+                     "description": "Bad Request: wrong file identifier/HTTP URL specified"}
+
+    def _record(self, fields: dict, **content) -> dict:
+        chat_id = fields.get("chat_id", "0")
+        with self._lock:
+            self._message_id += 1
+            message = {
+                "message_id": self._message_id,
+                "date": int(time.time()),
+                "chat": {"id": int(chat_id) if str(chat_id).lstrip("-").isdigit() else 0, "type": "private"},
+                **{k: v for k, v in content.items() if v is not None},
+            }
+            self.messages.append(message)
+        return message
+
+    @staticmethod
+    def _respond(handler: BaseHTTPRequestHandler, status: int, payload: dict):
+        raw = json.dumps(payload).encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(raw)))
+        handler.end_headers()
+        handler.wfile.write(raw)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in local de la Bot API de Telegram")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fracción de envíos que responden 500")
+    parser.add_argument("--flood-rate", type=float, default=0.0, help="Fracción de envíos que responden 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="retry_after (s) de los 429 aleatorios")
+    parser.add_argument("--chat-limit", type=float, default=None, help="Mensajes/s por chat antes de responder 429")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
+
+    standin = TelegramStandIn(args.host, args.port, args.latency_ms, args.jitter_ms,
+                              failure_rate=args.failure_rate, flood_rate=args.flood_rate,
+                              retry_after=args.retry_after, chat_limit=args.chat_limit).start()
+    print(f"TELEGRAM_API_URL={standin.base_url}")
+    try:
+        while True:
+            time.sleep(10)
+            logger.info(f"📊 {standin.stats}")
+    except KeyboardInterrupt:
+        standin.stop()
+
+if __name__ == "__main__":
+    main()
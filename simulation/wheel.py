@@ -0,0 +1,222 @@
+"""
+simulation/wheel.py - Simulador determinista de la rueda Crazy Time.
+
+Genera eventos con la forma exacta del payload de la API (la que consume
+`DataCollector._transform`) o filas listas para la tabla `tiros`, a partir de
+una semilla. Permite construir datasets reproducibles de millones de tiros.
+"""
+
+import time
+import random
+import logging
+import sqlite3
+from datetime import datetime, timezone
+from typing import Iterator, List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+# 54 segmentos físicos de la rueda
+WHEEL_SEGMENTS = {
+    "1": 21, "2": 13, "5": 7, "10": 4,
+    "CoinFlip": 4, "Pachinko": 2, "CashHunt": 2, "CrazyBonus": 1,
+}
+
+TOP_SLOT_MULTIPLIERS = [2, 3, 4, 5, 6, 7, 10, 15, 20, 25, 50]
+TOP_SLOT_WEIGHTS = [30, 20, 12, 12, 6, 4, 8, 3, 2, 2, 1]
+
+PACHINKO_MULTIPLIERS = [5, 7, 10, 15, 20, 25, 50, 100, 200, 500, 1000]
+PACHINKO_WEIGHTS = [16, 16, 18, 14, 12, 8, 8, 4, 2, 1, 1]
+
+COINFLIP_MULTIPLIERS = [2, 3, 4, 5, 6, 7, 8, 10, 15, 20, 25, 50]
+COINFLIP_WEIGHTS = [18, 16, 14, 12, 10, 8, 6, 6, 4, 3, 2, 1]
+
+FLAPPER_MULTIPLIERS = [10, 15, 20, 25, 50, 75, 100, 200, 500]
+FLAPPER_WEIGHTS = [20, 18, 18, 14, 12, 6, 6, 4, 2]
+
+# Duración (segundos) entre startedAt y settledAt por sector
+SPIN_DURATION = {
+    "1": (40, 50), "2": (40, 50), "5": (40, 50), "10": (40, 50),
+    "CoinFlip": (55, 70), "CashHunt": (70, 90), "Pachinko": (70, 120), "CrazyBonus": (120, 200),
+}
+
+PERU_OFFSET_SECONDS = 5 * 3600
+
+class SimSpin(NamedTuple):
+    """Tiro simulado en forma compacta (tiempos en epoch UTC)."""
+    seq: int
+    sector: str
+    started: float
+    settled: float
+    top_slot_sector: str
+    top_slot_multiplier: int
+    is_top_slot_matched: bool
+    bonus_multiplier: Optional[int]
+    flapper_top: Optional[int]
+    flapper_left: Optional[int]
+    flapper_right: Optional[int]
+
+def _utc_iso_z(epoch: float) -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(epoch)) + ".000Z"
+
+def _peru_iso(epoch: float) -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(epoch - PERU_OFFSET_SECONDS))
+
+
+class WheelSimulator:
+    """Rueda Crazy Time sembrada: misma semilla -> mismo stream de tiros."""
+
+    # Columnas de `tiros` que rellena to_row, en su orden
+    ROW_COLUMNS = ("resultado", "timestamp", "settled_at", "latido",
+                   "top_slot_result", "top_slot_multiplier", "is_top_slot_matched",
+                   "bonus_multiplier", "ct_flapper_blue", "ct_flapper_green", "ct_flapper_yellow")
+
+    def __init__(self, seed: int = 0, gap_probability: float = 0.002,
+                 outage_probability: float = 0.0002):
+        self.seed = seed
+        self.gap_probability = gap_probability
+        self.outage_probability = outage_probability
+        self._rng = random.Random(seed)
+        self._sectors = list(WHEEL_SEGMENTS.keys())
+        self._sector_weights = list(WHEEL_SEGMENTS.values())
+        self._top_slot_sectors = list(WHEEL_SEGMENTS.keys())
+
+    def reset(self):
+        self._rng = random.Random(self.seed)
+
+    def _latido(self) -> float:
+        """Pausa entre el fin de un tiro y el inicio del siguiente."""
+        r = self._rng.random()
+        if r < self.outage_probability:
+            return self._rng.uniform(600, 3 * 3600)   # Caída larga del stream
+        if r < self.outage_probability + self.gap_probability:
+            return self._rng.uniform(12, 300)         # Brecha ocasional
+        if r < 0.85:
+            return 5
+        if r < 0.90:
+            return self._rng.randint(0, 4)
+        return self._rng.randint(6, 11)
+
+    def iter_spins(self, count: int, start: Optional[float] = None) -> Iterator[SimSpin]:
+        """Itera `count` tiros compactos desde `start` (epoch UTC)."""
+        rng = self._rng
+        choices = rng.choices
+        sectors, weights = self._sectors, self._sector_weights
+        t = start if start is not None else datetime(2025, 1, 1, tzinfo=timezone.utc).timestamp()
+
+        for seq in range(count):
+            sector = choices(sectors, weights)[0]
+            lo, hi = SPIN_DURATION[sector]
+            settled = t + rng.randint(lo, hi)
+
+            ts_sector = rng.choice(self._top_slot_sectors)
+            ts_mult = choices(TOP_SLOT_MULTIPLIERS, TOP_SLOT_WEIGHTS)[0]
+            matched = ts_sector == sector
+
+            bonus = blue = green = yellow = None
+            if sector == "Pachinko":
+                bonus = choices(PACHINKO_MULTIPLIERS, PACHINKO_WEIGHTS)[0]
+            elif sector == "CoinFlip":
+                bonus = choices(COINFLIP_MULTIPLIERS, COINFLIP_WEIGHTS)[0]
+            elif sector == "CrazyBonus":
+                blue, green, yellow = choices(FLAPPER_MULTIPLIERS, FLAPPER_WEIGHTS, k=3)
+
+            yield SimSpin(seq, sector, t, settled, ts_sector, ts_mult, matched, bonus, blue, green, yellow)
+            t = settled + self._latido()
+
+    def iter_events(self, count: int, start: Optional[float] = None) -> Iterator[dict]:
+        """Itera eventos con la forma exacta del payload de la API (orden cronológico)."""
+        for spin in self.iter_spins(count, start):
+            yield self.to_event(spin)
+
+    def generate_events(self, count: int, end: Optional[datetime] = None) -> List[dict]:
+        """Genera `count` eventos cuyo último settledAt coincide con `end` (por defecto ahora)."""
+        spins = list(self.iter_spins(count, start=0.0))
+        if not spins:
+            return []
+        end_epoch = (end or datetime.now(timezone.utc)).timestamp()
+        shift = end_epoch - spins[-1].settled
+        return [self.to_event(s._replace(started=s.started + shift, settled=s.settled + shift)) for s in spins]
+
+    def to_event(self, spin: SimSpin) -> dict:
+        event_id = f"sim-{self.seed}-{spin.seq}"
+        wheel_result = {
+            "type": "BonusRound" if spin.sector in ("CoinFlip", "CashHunt", "Pachinko", "CrazyBonus") else "Number",
+            "wheelSector": spin.sector,
+        }
+        if spin.sector in ("Pachinko", "CoinFlip"):
+            wheel_result["bonus"] = {"bonusMultiplier": {"value": spin.bonus_multiplier}}
+        elif spin.sector == "CrazyBonus":
+            wheel_result["bonus"] = {"flapperResult": {
+                "top": {"bonusMultiplier": spin.flapper_top},
+                "left": {"bonusMultiplier": spin.flapper_left},
+                "right": {"bonusMultiplier": spin.flapper_right},
+            }}
+        elif spin.sector == "CashHunt":
+            wheel_result["bonus"] = {}
+
+        return {
+            "id": event_id,
+            "data": {
+                "id": event_id,
+                "startedAt": _utc_iso_z(spin.started),
+                "settledAt": _utc_iso_z(spin.settled),
+                "result": {"outcome": {
+                    "wheelResult": wheel_result,
+                    "topSlot": {"wheelSector": spin.top_slot_sector, "multiplier": spin.top_slot_multiplier},
+                    "isTopSlotMatchedToWheelResult": spin.is_top_slot_matched,
+                }},
+            },
+        }
+
+    @staticmethod
+    def to_row(spin: SimSpin, latido: int) -> tuple:
+        """Fila de `tiros` equivalente a `_transform` + `insertar_datos`."""
+        resultado = "CrazyTime" if spin.sector == "CrazyBonus" else spin.sector
+        return (
+            resultado, _peru_iso(spin.started), _peru_iso(spin.settled), latido,
+            spin.top_slot_sector, spin.top_slot_multiplier, spin.is_top_slot_matched,
+            spin.bonus_multiplier, spin.flapper_top, spin.flapper_left, spin.flapper_right,
+        )
+
+    def write_to_db(self, db_path: str, count: int, batch_size: int = 50_000) -> int:
+        """
+        Escribe `count` tiros directamente en `tiros`, continuando tras el último
+        tiro existente. Usa inserción por lotes (sin el filtro de duplicados de
+        `insertar_datos`, innecesario para un stream sintético monótono).
+        """
+        from core.database import Database
+        db = Database(db_path)
+        conn = db.get_connection(read_only=False)
+        try:
+            row = conn.execute("SELECT settled_at FROM tiros ORDER BY id DESC LIMIT 1").fetchone()
+            prev_settled = None
+            start = None
+            if row and row["settled_at"]:
+                prev_local = datetime.fromisoformat(row["settled_at"]).replace(tzinfo=timezone.utc)
+                prev_settled = prev_local.timestamp() + PERU_OFFSET_SECONDS
+                start = prev_settled + 5
+
+            written = 0
+            batch = []
+            for spin in self.iter_spins(count, start):
+                latido = int(spin.started - prev_settled) if prev_settled is not None else 0
+                batch.append(self.to_row(spin, latido))
+                prev_settled = spin.settled
+                if len(batch) >= batch_size:
+                    written += self._flush(conn, batch)
+                    batch = []
+            if batch:
+                written += self._flush(conn, batch)
+            logger.info(f"🎡 Simulador: {written} tiros escritos en {db_path}")
+            return written
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _flush(conn: sqlite3.Connection, rows: List[tuple]) -> int:
+        conn.executemany(f"""
+            INSERT INTO tiros ({", ".join(WheelSimulator.ROW_COLUMNS)})
+            VALUES ({", ".join("?" * len(WheelSimulator.ROW_COLUMNS))})
+        """, rows)
+        conn.commit()
+        return len(rows)